@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from config import *
+from src.api import robinhood
+from src.backtest import data
+from src.backtest import engine
+from src.backtest import sweep
+from src.utils import logger
+
+# Run with:
+#   python backtest.py generate --symbols 20 --sessions 60
+#   python backtest.py record --symbols AAPL,MSFT,NVDA
+#   python backtest.py run --cash 1000
+#   python backtest.py sweep --grid PORTFOLIO_LIMIT=5,10 --grid MAX_BUYING_AMOUNT_USD=10,50
+
+
+# Generate a synthetic dataset
+def generate(args):
+    symbols = data.generate_dataset(args.data, args.symbols, args.sessions, seed=args.seed, start_date=args.start_date)
+    logger.info(f"Generated {args.sessions} session(s) of 5-minute candles for {len(symbols)} stock(s) in {args.data}")
+    return 0
+
+
+# Record the latest market data from Robinhood
+def record(args):
+    login_resp = asyncio.run(robinhood.login_to_robinhood())
+    if not login_resp:
+        logger.error("Failed to login to Robinhood")
+        return 1
+    symbols = data.record_dataset(args.data, [symbol.strip().upper() for symbol in args.symbols.split(",") if symbol.strip()])
+    logger.info(f"Recorded market data for {len(symbols)} stock(s) in {args.data}")
+    return 0
+
+
+# Run a backtest over a dataset
+def run(args):
+    logger.LOG_LEVEL = args.log_level
+    dataset = data.load_dataset(args.data, args.symbols.split(",") if args.symbols else None)
+    ai_responses = engine.load_ai_responses(args.ai_responses) if args.ai == "replay" else None
+
+    simulation, results = engine.run_backtest(
+        dataset,
+        args.cash,
+        run_interval_seconds=args.interval,
+        ai=args.ai,
+        ai_responses=ai_responses,
+        slippage_bps=args.slippage_bps,
+        start_date=args.start_date,
+        end_date=args.end_date,
+    )
+    if args.ai == "live" and args.ai_responses:
+        engine.save_ai_responses(args.ai_responses, simulation["recorded_ai_responses"])
+
+    logger.flush()
+    print(f"Stocks: {len(dataset['symbols'])}, sessions: {results['sessions']}, cycles: {results['cycles']}")
+    print(f"Equity:      {results['initial_equity']} -> {results['final_equity']} USD (PnL {results['pnl']} USD, {results['pnl_percent']}%)")
+    print(f"Drawdown:    {results['max_drawdown_percent']}%")
+    print(f"Trades:      {results['trades']} ({results['buys']} buys, {results['sells']} sells), turnover {results['turnover']} USD")
+    print(f"Throughput:  {results['cycles_per_second']} cycles/s ({results['wall_seconds']}s wall time)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results, "trades": simulation["trades"], "equity_curve": simulation["equity_curve"]}, f, indent=1)
+    return 1 if results["errors"] > 0 else 0
+
+
+# Run backtests for a grid of config values in parallel
+def run_sweep(args):
+    grid = sweep.parse_grid(args.grid)
+    sweep_results = sweep.run_sweep(
+        args.data,
+        grid,
+        args.cash,
+        symbols=args.symbols.split(",") if args.symbols else None,
+        max_workers=args.workers,
+        ai=args.ai,
+        ai_responses=engine.load_ai_responses(args.ai_responses) if args.ai == "replay" else None,
+        slippage_bps=args.slippage_bps,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        log_level=args.log_level,
+    )
+    logger.flush()
+    print(sweep.format_results_table(sweep_results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(sweep_results, f, indent=1)
+    return 1 if any(result["results"]["errors"] > 0 for result in sweep_results) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded market data through the trading bot pipeline")
+    parser.add_argument("--data", default=".cache/backtest", help="Dataset directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Generate a synthetic dataset")
+    generate_parser.add_argument("--symbols", type=int, default=20)
+    generate_parser.add_argument("--sessions", type=int, default=60)
+    generate_parser.add_argument("--seed", type=int, default=42)
+    generate_parser.add_argument("--start-date", default="2025-01-02")
+    generate_parser.set_defaults(func=generate)
+
+    record_parser = subparsers.add_parser("record", help="Record the latest market data from Robinhood")
+    record_parser.add_argument("--symbols", required=True, help="Comma-separated stock symbols")
+    record_parser.set_defaults(func=record)
+
+    run_parser = subparsers.add_parser("run", help="Run a backtest")
+    run_parser.add_argument("--symbols", help="Comma-separated stock symbols (default - all stocks of the dataset)")
+    run_parser.add_argument("--cash", type=float, default=1000.0, help="Initial buying power in USD")
+    run_parser.add_argument("--interval", type=int, default=RUN_INTERVAL_SECONDS, help="Trading interval in seconds")
+    run_parser.add_argument("--ai", choices=["stub", "replay", "live"], default="stub", help="AI decisions: local stub strategy, recorded responses or the live model")
+    run_parser.add_argument("--ai-responses", help="Recorded AI responses file (read in replay mode, appended to in live mode)")
+    run_parser.add_argument("--slippage-bps", type=float, default=0.0)
+    run_parser.add_argument("--start-date", help="First session date (YYYY-MM-DD)")
+    run_parser.add_argument("--end-date", help="Last session date (YYYY-MM-DD)")
+    run_parser.add_argument("--log-level", default="WARNING", help="Log level during the backtest")
+    run_parser.add_argument("--output", help="JSON file for results, trades and equity curve")
+    run_parser.set_defaults(func=run)
+
+    sweep_parser = subparsers.add_parser("sweep", help="Run backtests for a grid of config values in parallel")
+    sweep_parser.add_argument("--grid", action="append", required=True, help=f"Config values to sweep, e.g. PORTFOLIO_LIMIT=5,10 (repeatable, one of: {', '.join(sweep.SWEEP_PARAMETERS)})")
+    sweep_parser.add_argument("--workers", type=int, help="Number of worker processes (default - number of CPUs)")
+    sweep_parser.add_argument("--symbols", help="Comma-separated stock symbols (default - all stocks of the dataset)")
+    sweep_parser.add_argument("--cash", type=float, default=1000.0, help="Initial buying power in USD")
+    sweep_parser.add_argument("--ai", choices=["stub", "replay"], default="stub", help="AI decisions: local stub strategy or recorded responses")
+    sweep_parser.add_argument("--ai-responses", help="Recorded AI responses file (replay mode)")
+    sweep_parser.add_argument("--slippage-bps", type=float, default=0.0)
+    sweep_parser.add_argument("--start-date", help="First session date (YYYY-MM-DD)")
+    sweep_parser.add_argument("--end-date", help="Last session date (YYYY-MM-DD)")
+    sweep_parser.add_argument("--log-level", default="ERROR", help="Log level of the worker processes")
+    sweep_parser.add_argument("--output", help="JSON file for results of all runs")
+    sweep_parser.set_defaults(func=run_sweep)
+
+    args = parser.parse_args()
+    if args.command in ("run", "sweep") and args.ai == "replay" and not args.ai_responses:
+        parser.error("--ai-responses is required in replay mode")
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+# This empty file marks benchmarks as a Python package
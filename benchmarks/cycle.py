@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import main
+from benchmarks.indicators import best_time, generate_historical_data
+from src.api import fixtures
+from src.api import robinhood
+from src.utils import decision_cache
+from src.utils import ledger
+from src.utils import pdt
+from src.utils import indicator_state
+from src.utils import indicators
+from src.utils import logger
+from src.utils import prompt
+from src.utils import rate_limiter
+
+# Run with: python -m benchmarks.cycle --sizes 10,100,1000 --repeat 3
+# Robinhood and AI calls are answered by the fixtures stand-ins, with optional injected latency and throttling
+
+BENCHMARK_ACCOUNT_URL = "https://api.robinhood.com/accounts/BENCHMARK/"
+BENCHMARK_WATCHLIST_NAME = "Benchmark"
+BENCHMARK_BUYING_POWER = "1000.00"
+
+
+# Generate synthetic market data for a number of stocks (a tenth of them are in the portfolio)
+def generate_market(rng, count):
+    symbols = [f"S{i:04d}" for i in range(count)]
+    historical_data_day = {symbol: generate_historical_data(rng, symbol, 78, timedelta(minutes=5)) for symbol in symbols}
+    historical_data_year = {symbol: generate_historical_data(rng, symbol, 251, timedelta(days=1)) for symbol in symbols}
+    return {
+        "symbols": symbols,
+        "portfolio": symbols[:max(1, count // 10)],
+        "historical_data_day": historical_data_day,
+        "historical_data_year": historical_data_year,
+        "prices": {symbol: historical_data_day[symbol][-1]["close_price"] for symbol in symbols},
+    }
+
+
+# Get synthetic analyst ratings of a stock (same format as rh.stocks.get_ratings)
+def get_synthetic_ratings(symbol):
+    return {
+        "summary": {"num_buy_ratings": 5, "num_hold_ratings": 3, "num_sell_ratings": 1},
+        "ratings": [{"published_at": "2025-01-02T00:00:00Z", "type": "buy", "text": f"Synthetic analyst rating for {symbol} with a sentence of typical length.".encode("utf-8")}],
+        "instrument_id": f"id{symbol}",
+    }
+
+
+# Make a responder answering robin_stocks calls from synthetic market data
+def make_responder(market):
+    def responder(name, args, kwargs):
+        if name == "load_account_profile":
+            return {"buying_power": BENCHMARK_BUYING_POWER, "url": BENCHMARK_ACCOUNT_URL}
+        if name == "build_holdings":
+            return {symbol: {"price": market["prices"][symbol], "quantity": "1.5", "average_buy_price": market["prices"][symbol], "equity": market["prices"][symbol]} for symbol in market["portfolio"]}
+        if name == "get_watchlist_by_name":
+            return {"results": [{"symbol": symbol, "price": market["prices"][symbol], "name": symbol} for symbol in market["symbols"]]}
+        if name == "get_quotes":
+            return [{"symbol": symbol, "instrument": f"https://api.robinhood.com/instruments/id{symbol}/", "last_trade_price": market["prices"][symbol]} for symbol in args[0]]
+        if name == "get_stock_historicals":
+            symbols = [args[0]] if isinstance(args[0], str) else args[0]
+            if kwargs.get("interval") == "5minute":
+                return [item for symbol in symbols for item in market["historical_data_day"][symbol]]
+            count = 5 if kwargs.get("span") == "week" else None
+            return [item for symbol in symbols for item in market["historical_data_year"][symbol][-count if count else 0:]]
+        if name == "get_ratings":
+            return get_synthetic_ratings(args[0])
+        if name == "id_for_stock":
+            return f"id{args[0]}"
+        if name == "request_get" and "day_trade_checks" in args[0]:
+            return {"buy": None, "buy_extended": None, "sell": None, "sell_extended": None}
+        if name == "request_get" and args[0] == robinhood.RATINGS_BATCH_URL:
+            instrument_ids = args[2]["ids"].split(",")
+            return [{**get_synthetic_ratings(instrument_id[2:]), "ratings": [{**rating, "text": rating["text"].decode("utf-8")} for rating in get_synthetic_ratings(instrument_id[2:])["ratings"]]} for instrument_id in instrument_ids]
+        raise Exception(f"No synthetic response for {name}")
+    return responder
+
+
+# Make an AI responder (holds the first stocks of the prompt, so no orders are placed)
+def make_ai_responder(market):
+    def ai_responder(ai_prompt):
+        return json.dumps([{"symbol": symbol, "decision": "hold", "quantity": 0} for symbol in market["symbols"][:3]])
+    return ai_responder
+
+
+# Configure the trading bot for a benchmark (no disk caches, watchlist with all synthetic stocks)
+def configure_bot(market):
+    main.WATCHLIST_NAMES = [BENCHMARK_WATCHLIST_NAME]
+    main.WATCHLIST_OVERVIEW_LIMIT = len(market["symbols"])
+    main.INDICATOR_STATE_FILE = ""
+    main.AI_SHARD_SIZE = False
+    robinhood.CANDLES_CACHE_DIR = ""
+    robinhood.INSTRUMENT_IDS_CACHE_FILE = ""
+
+
+# Clear in-memory caches, indicator state, cached AI decisions, ledgers and day trade records (next cycle fetches and computes everything)
+def reset_caches():
+    for wrapper in robinhood.cache_registry.values():
+        wrapper.cache_clear()
+    indicator_state.reset_indicator_states()
+    decision_cache.reset()
+    ledger.reset()
+    pdt.reset()
+
+
+# Run a cold trading cycle
+def run_cold_cycle():
+    reset_caches()
+    return main.trading_bot()
+
+
+# Enrich all stocks with one enrichment function
+def run_enrichment(enrich, stocks_args):
+    for args in stocks_args:
+        enrich({}, *args)
+
+
+# Benchmark a full cycle, the enrichment functions and prompt construction for a number of stocks (name -> seconds)
+def run_size(rng, count, repeat):
+    market = generate_market(rng, count)
+    fixtures.fixtures["responder"] = make_responder(market)
+    fixtures.fixtures["ai_responder"] = make_ai_responder(market)
+    configure_bot(market)
+    timings = {}
+
+    timings["cycle_cold"], _ = best_time(run_cold_cycle, repeat)
+    timings["cycle_warm"], _ = best_time(main.trading_bot, repeat)
+
+    symbols = market["symbols"]
+    day, year = market["historical_data_day"], market["historical_data_year"]
+    symbols_indicators = indicators.compute_indicators_batch(day, year)
+    ratings = {symbol: get_synthetic_ratings(symbol) for symbol in symbols}
+    timings["indicators_batch"], _ = best_time(indicators.compute_indicators_batch, repeat, day, year)
+    timings["enrich_with_rsi"], _ = best_time(run_enrichment, repeat, robinhood.enrich_with_rsi, [(day[symbol], symbol) for symbol in symbols])
+    timings["enrich_with_vwap"], _ = best_time(run_enrichment, repeat, robinhood.enrich_with_vwap, [(day[symbol], symbol) for symbol in symbols])
+    timings["enrich_with_moving_averages"], _ = best_time(run_enrichment, repeat, robinhood.enrich_with_moving_averages, [(year[symbol], symbol) for symbol in symbols])
+    timings["enrich_with_indicators"], _ = best_time(run_enrichment, repeat, robinhood.enrich_with_indicators, [(symbols_indicators[symbol], symbol) for symbol in symbols])
+    timings["enrich_with_analyst_ratings"], _ = best_time(run_enrichment, repeat, robinhood.enrich_with_analyst_ratings, [(ratings[symbol],) for symbol in symbols])
+    timings["enrich_with_pdt_restrictions"], _ = best_time(run_enrichment, repeat, robinhood.enrich_with_pdt_restrictions, [(symbol,) for symbol in symbols])
+
+    account_info = robinhood.get_account_info()
+    market_data = main.get_market_data(symbols)
+    portfolio_overview = main.get_stocks_overview(robinhood.get_portfolio_stocks(), robinhood.extract_my_stocks_data, market_data)
+    watchlist_stocks = {stock["symbol"]: stock for stock in robinhood.get_watchlist_stocks(BENCHMARK_WATCHLIST_NAME) if stock["symbol"] not in portfolio_overview}
+    watchlist_overview = main.get_stocks_overview(watchlist_stocks, robinhood.extract_watchlist_data, market_data)
+    prompt_tokens = {}
+    encoding = main.PROMPT_ENCODING
+    for main.PROMPT_ENCODING in prompt.ENCODERS:
+        timings[f"build_ai_prompt_{main.PROMPT_ENCODING}"], ai_prompt = best_time(main.build_ai_prompt, repeat, account_info, portfolio_overview, watchlist_overview)
+        prompt_tokens[main.PROMPT_ENCODING] = prompt.estimate_tokens(ai_prompt)
+    main.PROMPT_ENCODING = encoding
+
+    return {
+        "symbols": count,
+        "seconds": {name: round(seconds, 6) for name, seconds in timings.items()},
+        "prompt_tokens": prompt_tokens,
+    }
+
+
+# Get current version of the code (git commit, "unknown" outside of a git checkout)
+def get_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# Print results (and the change against previous results, if given)
+def print_results(results, previous_results=None):
+    logger.flush()
+    previous_sizes = {str(size_results["symbols"]): size_results for size_results in (previous_results or {}).get("results", [])}
+    for size_results in results["results"]:
+        print(f"Stocks: {size_results['symbols']}")
+        previous_seconds = previous_sizes.get(str(size_results["symbols"]), {}).get("seconds", {})
+        for name, seconds in size_results["seconds"].items():
+            change = f" ({(seconds / previous_seconds[name] - 1) * 100:+.1f}% vs {previous_results['version']})" if previous_seconds.get(name) else ""
+            print(f"  {name:32} {seconds * 1000:10.2f} ms{change}")
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark trading cycles, enrichment and prompt construction on recorded-fixture stand-ins")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma-separated numbers of stocks")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fixtures", help="Recorded fixtures file to replay (calls missing from it are answered with synthetic data)")
+    parser.add_argument("--rh-latency-ms", type=float, default=0.0, help="Injected latency per Robinhood call")
+    parser.add_argument("--ai-latency-ms", type=float, default=0.0, help="Injected latency per AI request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of Robinhood calls answered with HTTP 429")
+    parser.add_argument("--retry-after-seconds", type=float, help="Retry-After of throttled calls (default - exponential backoff)")
+    parser.add_argument("--rh-rate", type=float, default=0.0, help="Robinhood requests per second (0 - no rate limit)")
+    parser.add_argument("--output", help="JSON results file (default - .cache/benchmarks/cycle-<version>.json)")
+    parser.add_argument("--compare", help="Previous JSON results file to compare with")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logger.LOG_LEVEL = args.log_level
+    rate_limiter.configure(args.rh_rate or 10 ** 9, max(1, args.rh_rate * 2) if args.rh_rate else 10 ** 9)
+    fixtures.install(
+        "replay",
+        args.fixtures,
+        rh_latency_seconds=args.rh_latency_ms / 1000,
+        ai_latency_seconds=args.ai_latency_ms / 1000,
+        throttle_rate=args.throttle_rate,
+        retry_after_seconds=args.retry_after_seconds,
+        seed=args.seed,
+    )
+
+    rng = random.Random(args.seed)
+    version = get_version()
+    results = {
+        "version": version,
+        "created_at": datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "log_level")},
+        "results": [],
+    }
+    for size in [int(size) for size in args.sizes.split(",")]:
+        started_at = time.perf_counter()
+        results["results"].append(run_size(rng, size, args.repeat))
+        logger.info(f"Benchmarked {size} stock(s) in {time.perf_counter() - started_at:.1f}s")
+    results["fixtures"] = fixtures.get_stats()
+    fixtures.uninstall()
+
+    previous_results = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous_results = json.load(f)
+    print_results(results, previous_results)
+
+    output = args.output or os.path.join(".cache", "benchmarks", f"cycle-{version}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"Results saved to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_benchmark())
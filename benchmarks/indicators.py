@@ -0,0 +1,170 @@
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+
+from src.utils import indicators
+
+# Run with: python -m benchmarks.indicators --symbols 100 --repeat 5
+
+
+# Round money (same as robinhood.round_money)
+def round_money(price, decimals=2):
+    if price is None:
+        return None
+    return round(float(price), decimals)
+
+
+# Legacy pandas RSI calculation (reference implementation)
+def legacy_rsi(historical_data):
+    if len(historical_data) < 14:
+        return None
+    prices = [round_money(day['close_price']) for day in historical_data]
+    delta = pd.Series(prices).diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.rolling(window=14).mean().iloc[-1]
+    avg_loss = loss.rolling(window=14).mean().iloc[-1]
+    if avg_loss == 0:
+        rs = 100
+    else:
+        rs = avg_gain / avg_loss
+    rsi = 100 - (100 / (1 + rs))
+    return round(float(rsi), 2)
+
+
+# Legacy pandas VWAP calculation (reference implementation)
+def legacy_vwap(historical_data):
+    if len(historical_data) < 1:
+        return None
+    stock_history_df = pd.DataFrame(historical_data)
+    stock_history_df["close_price"] = pd.to_numeric(stock_history_df["close_price"], errors="coerce")
+    stock_history_df["high_price"] = pd.to_numeric(stock_history_df["high_price"], errors="coerce")
+    stock_history_df["low_price"] = pd.to_numeric(stock_history_df["low_price"], errors="coerce")
+    stock_history_df["volume"] = pd.to_numeric(stock_history_df["volume"], errors="coerce")
+    stock_history_df = stock_history_df[stock_history_df["volume"] > 0]
+    stock_history_df["typical_price"] = (stock_history_df["high_price"] + stock_history_df["low_price"] + stock_history_df["close_price"]) / 3
+    sum_of_volumes = stock_history_df["volume"].sum()
+    dot_product = stock_history_df["volume"].dot(stock_history_df["typical_price"])
+    if sum_of_volumes == 0:
+        return None
+    return round_money(dot_product / sum_of_volumes)
+
+
+# Legacy pandas moving averages calculation (reference implementation)
+def legacy_moving_averages(historical_data):
+    if len(historical_data) < 200:
+        return None, None
+    prices = [round_money(day['close_price']) for day in historical_data]
+    moving_avg_50 = pd.Series(prices).rolling(window=50).mean().iloc[-1]
+    moving_avg_200 = pd.Series(prices).rolling(window=200).mean().iloc[-1]
+    return round_money(moving_avg_50), round_money(moving_avg_200)
+
+
+# Generate random candles in the Robinhood historicals format
+def generate_historical_data(rng, symbol, count, step):
+    price = rng.uniform(5, 500)
+    begins_at = datetime(2025, 1, 2, 14, 30)
+    historical_data = []
+    for i in range(count):
+        open_price = price
+        price = max(0.01, price * (1 + rng.gauss(0, 0.01)))
+        historical_data.append({
+            "begins_at": (begins_at + step * i).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "open_price": f"{open_price:.6f}",
+            "close_price": f"{price:.6f}",
+            "high_price": f"{max(open_price, price) * (1 + abs(rng.gauss(0, 0.003))):.6f}",
+            "low_price": f"{min(open_price, price) * (1 - abs(rng.gauss(0, 0.003))):.6f}",
+            "volume": rng.choice([0, rng.randint(1, 100000)]),
+            "session": "reg",
+            "interpolated": False,
+            "symbol": symbol,
+        })
+    return historical_data
+
+
+# Calculate indicators for all symbols with the legacy pandas functions
+def run_legacy(historical_data_day, historical_data_year):
+    results = {}
+    for symbol in historical_data_day:
+        short_ma, long_ma = legacy_moving_averages(historical_data_year[symbol])
+        results[symbol] = {
+            "rsi": legacy_rsi(historical_data_day[symbol]),
+            "vwap": legacy_vwap(historical_data_day[symbol]),
+            "short_moving_average": short_ma,
+            "long_moving_average": long_ma,
+        }
+    return results
+
+
+# Calculate indicators for all symbols with the batched NumPy engine
+def run_batch(historical_data_day, historical_data_year):
+    results = {}
+    for symbol, symbol_indicators in indicators.compute_indicators_batch(historical_data_day, historical_data_year).items():
+        results[symbol] = {
+            "rsi": round(symbol_indicators["rsi"], 2) if "rsi" in symbol_indicators else None,
+            "vwap": round_money(symbol_indicators.get("vwap")),
+            "short_moving_average": round_money(symbol_indicators.get("short_moving_average")),
+            "long_moving_average": round_money(symbol_indicators.get("long_moving_average")),
+        }
+    return results
+
+
+# Time a function (best of N runs)
+def best_time(func, repeat, *args):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started_at)
+    return min(timings), result
+
+
+# Compare legacy and batched results (exact match, or within one cent for exact half-cent ties of the legacy rolling sums)
+def compare_results(legacy_results, batch_results):
+    exact, within_cent, mismatches = 0, 0, []
+    for symbol, legacy_values in legacy_results.items():
+        for name, legacy_value in legacy_values.items():
+            batch_value = batch_results[symbol][name]
+            if legacy_value == batch_value:
+                exact += 1
+            elif legacy_value is not None and batch_value is not None and abs(legacy_value - batch_value) <= 0.010000001:
+                within_cent += 1
+            else:
+                mismatches.append((symbol, name, legacy_value, batch_value))
+    return exact, within_cent, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark legacy pandas indicators against the batched NumPy engine")
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--day-candles", type=int, default=78)
+    parser.add_argument("--year-candles", type=int, default=251)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    symbols = [f"S{i:04d}" for i in range(args.symbols)]
+    historical_data_day = {symbol: generate_historical_data(rng, symbol, args.day_candles, timedelta(minutes=5)) for symbol in symbols}
+    historical_data_year = {symbol: generate_historical_data(rng, symbol, args.year_candles, timedelta(days=1)) for symbol in symbols}
+
+    legacy_seconds, legacy_results = best_time(run_legacy, args.repeat, historical_data_day, historical_data_year)
+    batch_seconds, batch_results = best_time(run_batch, args.repeat, historical_data_day, historical_data_year)
+    exact, within_cent, mismatches = compare_results(legacy_results, batch_results)
+
+    print(f"Symbols: {args.symbols}, day candles: {args.day_candles}, year candles: {args.year_candles}")
+    print(f"Legacy pandas:  {legacy_seconds * 1000:9.2f} ms ({legacy_seconds / args.symbols * 1e6:8.1f} us/symbol)")
+    print(f"Batched NumPy:  {batch_seconds * 1000:9.2f} ms ({batch_seconds / args.symbols * 1e6:8.1f} us/symbol)")
+    print(f"Speedup:        {legacy_seconds / batch_seconds:9.2f}x")
+    print(f"Equivalence:    {exact} exact, {within_cent} within one cent (half-cent ties), {len(mismatches)} mismatches")
+    for mismatch in mismatches[:10]:
+        print(f"  Mismatch: {mismatch}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
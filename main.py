@@ -1,12 +1,54 @@
 import time
-from datetime import datetime
-import json
+from datetime import datetime, timedelta
 import asyncio
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 from config import *
+from src.api import fixtures
 from src.api import robinhood
 from src.api import openai
+from src.utils import decision_cache
+from src.utils import indicator_state
+from src.utils import journal
+from src.utils import ledger
+from src.utils import pdt
 from src.utils import logger
+from src.utils import market_calendar
+from src.utils import metrics
+from src.utils import prompt
+from src.utils import triggers
+
+# Config parameters that can be set per profile
+PROFILE_PARAMETERS = [
+    "MODE",
+    "TRADE_EXCEPTIONS",
+    "WATCHLIST_NAMES",
+    "WATCHLIST_OVERVIEW_LIMIT",
+    "PORTFOLIO_LIMIT",
+    "MIN_SELLING_AMOUNT_USD",
+    "MAX_SELLING_AMOUNT_USD",
+    "MIN_BUYING_AMOUNT_USD",
+    "MAX_BUYING_AMOUNT_USD",
+    "PROMPT_ENCODING",
+    "PROMPT_RATINGS_TEXT_LIMIT",
+    "PROMPT_TOKEN_BUDGET",
+    "AI_SHARD_SIZE",
+    "AI_CHANGE_TOLERANCES",
+    "AI_DECISIONS_MAX_AGE_SECONDS",
+    "ORDER_MAX_WORKERS",
+]
+
+# Robinhood account parameters of a profile (profiles without them trade the account of the config)
+PROFILE_ACCOUNT_PARAMETERS = ["ROBINHOOD_USERNAME", "ROBINHOOD_PASSWORD", "ROBINHOOD_MFA_SECRET", "OP_ITEM_NAME"]
+
+# Profile of the trading cycle in progress (None - bot without profiles)
+active_profile = {"name": None}
+
+# Guards sells submitted while AI responses are streaming (shards stream concurrently)
+streamed_orders_lock = threading.Lock()
 
 
 # Get AI amount guidelines
@@ -28,12 +70,15 @@ def get_ai_amount_guidelines():
     return sell_guidelines, buy_guidelines
 
 
-# Make AI-based decisions on stock portfolio and watchlist
-def make_ai_decisions(account_info, portfolio_overview, watchlist_overview):
+# Build AI prompt for making decisions on stock portfolio and watchlist
+# Stocks left out to fit the token budget are added to dropped_symbols (if given)
+def build_ai_prompt(account_info, portfolio_overview, watchlist_overview, dropped_symbols=None):
     constraints = [
         f"- Initial budget: {account_info['buying_power']} USD",
         f"- Max portfolio size: {PORTFOLIO_LIMIT} stocks",
     ]
+    if "portfolio_size" in account_info:
+        constraints.append(f"- Current portfolio size: {account_info['portfolio_size']} stocks (stocks not listed below are held, but not analyzed now)")
     sell_guidelines, buy_guidelines = get_ai_amount_guidelines()
     if sell_guidelines:
         constraints.append(f"- Sell Amounts Guidelines: {sell_guidelines}")
@@ -42,7 +87,7 @@ def make_ai_decisions(account_info, portfolio_overview, watchlist_overview):
     if len(TRADE_EXCEPTIONS) > 0:
         constraints.append(f"- Excluded stocks: {', '.join(TRADE_EXCEPTIONS)}")
 
-    ai_prompt = (
+    ai_prompt_head = (
         "**Context:**\n"
         f"Today is {datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')}.{chr(10)}"
         f"You are a short-term investment advisor managing a stock portfolio.{chr(10)}"
@@ -51,9 +96,9 @@ def make_ai_decisions(account_info, portfolio_overview, watchlist_overview):
         f"{chr(10).join(constraints)}"
         "\n\n"
         "**Stock Data:**\n"
-        "```json\n"
-        f"{json.dumps({**portfolio_overview, **watchlist_overview}, indent=1)}{chr(10)}"
-        "```\n\n"
+    )
+    ai_prompt_tail = (
+        "\n\n"
         "**Response Format:**\n"
         "Return your decisions in a JSON array with this structure:\n"
         "```json\n"
@@ -69,51 +114,248 @@ def make_ai_decisions(account_info, portfolio_overview, watchlist_overview):
         "- Provide only the JSON output with no additional text.\n"
         "- Return an empty array if no actions are necessary."
     )
-    logger.debug(f"AI making-decisions prompt:{chr(10)}{ai_prompt}")
-    ai_response = openai.make_ai_request(ai_prompt)
-    logger.debug(f"AI making-decisions response:{chr(10)}{ai_response.choices[0].message.content.strip()}")
-    decisions = openai.parse_ai_response(ai_response)
+
+    stock_data, trim_steps = prompt.encode_stocks_data(
+        {**portfolio_overview, **watchlist_overview},
+        encoding=PROMPT_ENCODING,
+        ratings_text_limit=PROMPT_RATINGS_TEXT_LIMIT,
+        token_budget=PROMPT_TOKEN_BUDGET,
+        reserved_tokens=prompt.estimate_tokens(ai_prompt_head + ai_prompt_tail),
+        dropped_symbols=dropped_symbols,
+    )
+    if len(trim_steps) > 0:
+        logger.warning(f"AI prompt trimmed to fit token budget of {PROMPT_TOKEN_BUDGET}: {', '.join(trim_steps)}")
+    return ai_prompt_head + stock_data + ai_prompt_tail
+
+
+# Request AI decisions for a prompt (returns decisions and the response content)
+# With AI_STREAMING, the response is parsed as it streams and each valid decision is passed to on_decision (if given) as soon as it closes;
+# decisions completed before a truncated or malformed part of the response are kept, stocks without a decision are added to failed_symbols
+def request_ai_decisions(ai_prompt, portfolio_overview, watchlist_overview, failed_symbols=None, on_decision=None):
+    if not AI_STREAMING:
+        ai_response = openai.make_ai_request(ai_prompt)
+        return openai.parse_ai_response(ai_response), ai_response.choices[0].message.content.strip()
+
+    decisions = []
+    content_chunks = []
+    started_at = time.perf_counter()
+    try:
+        for decision in openai.parse_ai_response_stream(openai.make_ai_stream_request(ai_prompt), content_chunks):
+            if len(decisions) == 0:
+                logger.debug(f"First AI decision streamed in {time.perf_counter() - started_at:.2f}s")
+            # Only the first decision of a symbol may be executed early, reconciliation drops later ones
+            is_first_decision = decision.get('symbol') not in {streamed_decision.get('symbol') for streamed_decision in decisions}
+            decisions.append(decision)
+            if on_decision is not None and is_first_decision and get_hallucination_reason(portfolio_overview, watchlist_overview, decision) is None:
+                on_decision(decision)
+    except Exception as e:
+        if len(decisions) == 0:
+            raise
+        logger.error(f"Error streaming AI response, keeping {len(decisions)} decision(s) completed before it: {e}")
+        if failed_symbols is not None:
+            decided_symbols = {decision.get('symbol') for decision in decisions}
+            failed_symbols.extend([symbol for symbol in [*portfolio_overview.keys(), *watchlist_overview.keys()] if symbol not in decided_symbols])
+    return decisions, "".join(content_chunks).strip()
+
+
+# Make AI-based decisions on stock portfolio and watchlist
+# Symbols of failed shard requests and of stocks left out of the prompt by the token budget are added to failed_symbols, hashes of the sent prompts to prompt_hashes (if given)
+# Valid decisions are passed to on_decision as soon as they are streamed (with AI_STREAMING)
+def make_ai_decisions(account_info, portfolio_overview, watchlist_overview, failed_symbols=None, prompt_hashes=None, on_decision=None):
+    if AI_SHARD_SIZE and len(portfolio_overview) + len(watchlist_overview) > AI_SHARD_SIZE:
+        return make_sharded_ai_decisions(account_info, portfolio_overview, watchlist_overview, failed_symbols, prompt_hashes, on_decision)
+
+    ai_prompt = build_ai_prompt(account_info, portfolio_overview, watchlist_overview, failed_symbols)
+    if prompt_hashes is not None:
+        prompt_hashes.append(journal.get_prompt_hash(ai_prompt))
+    logger.info(f"AI prompt size: {len(ai_prompt)} characters, ~{prompt.estimate_tokens(ai_prompt)} tokens ({PROMPT_ENCODING} encoding)")
+    logger.debug(lambda: f"AI making-decisions prompt:{chr(10)}{ai_prompt}")
+    decisions, ai_content = request_ai_decisions(ai_prompt, portfolio_overview, watchlist_overview, failed_symbols, on_decision)
+    logger.debug(lambda: f"AI making-decisions response:{chr(10)}{ai_content}")
     return decisions
 
 
-# Filter AI hallucinations
-def filter_ai_hallucinations(account_info, portfolio_overview, watchlist_overview, decisions_data):
-    filtered_decisions = []
+# Make AI-based decisions for a shard of stocks (returns decisions, prompt tokens, prompt hash and stocks without a decision of a broken stream or left out of the prompt)
+def make_shard_ai_decisions(shard_index, account_info, portfolio_overview, watchlist_overview, on_decision=None):
+    failed_symbols = []
+    ai_prompt = build_ai_prompt(account_info, portfolio_overview, watchlist_overview, failed_symbols)
+    logger.debug(lambda: f"AI making-decisions prompt (shard {shard_index + 1}):{chr(10)}{ai_prompt}")
+    started_at = time.perf_counter()
+    decisions, ai_content = request_ai_decisions(ai_prompt, portfolio_overview, watchlist_overview, failed_symbols, on_decision)
+    request_seconds = time.perf_counter() - started_at
+    logger.debug(lambda: f"AI making-decisions response (shard {shard_index + 1}, {request_seconds:.2f}s):{chr(10)}{ai_content}")
+    # Keep only decisions for stocks of this shard
+    shard_symbols = {*portfolio_overview.keys(), *watchlist_overview.keys()}
+    decisions = [decision for decision in decisions if decision.get('symbol') in shard_symbols]
+    return decisions, prompt.estimate_tokens(ai_prompt), journal.get_prompt_hash(ai_prompt), failed_symbols
+
+
+# Make AI-based decisions by splitting stocks into shards and requesting them concurrently
+def make_sharded_ai_decisions(account_info, portfolio_overview, watchlist_overview, failed_symbols=None, prompt_hashes=None, on_decision=None):
+    symbols = [*portfolio_overview.keys(), *watchlist_overview.keys()]
+    shards = [symbols[i:i + AI_SHARD_SIZE] for i in range(0, len(symbols), AI_SHARD_SIZE)]
+    logger.info(f"Making AI-based decisions in {len(shards)} shard(s) of up to {AI_SHARD_SIZE} stocks...")
+
+    shard_decisions = [[] for _ in shards]
+    prompt_tokens = 0
+    with ThreadPoolExecutor(max_workers=max(1, AI_MAX_CONCURRENT_REQUESTS)) as executor:
+        futures = [
+            executor.submit(
+                make_shard_ai_decisions,
+                shard_index,
+                account_info,
+                {symbol: portfolio_overview[symbol] for symbol in shard if symbol in portfolio_overview},
+                {symbol: watchlist_overview[symbol] for symbol in shard if symbol in watchlist_overview},
+                on_decision,
+            )
+            for shard_index, shard in enumerate(shards)
+        ]
+        for shard_index, future in enumerate(futures):
+            try:
+                shard_decisions[shard_index], shard_prompt_tokens, shard_prompt_hash, shard_failed_symbols = future.result()
+                prompt_tokens += shard_prompt_tokens
+                if prompt_hashes is not None:
+                    prompt_hashes.append(shard_prompt_hash)
+                if failed_symbols is not None:
+                    failed_symbols.extend(shard_failed_symbols)
+            except Exception as e:
+                logger.error(f"Error making AI-based decisions for shard {shard_index + 1} ({', '.join(shards[shard_index])}): {e}")
+                if failed_symbols is not None:
+                    failed_symbols.extend(shards[shard_index])
+
+    logger.info(f"AI prompt size: ~{prompt_tokens} tokens in {len(shards)} shard(s) ({PROMPT_ENCODING} encoding)")
+    return [decision for decisions in shard_decisions for decision in decisions]
+
+
+# Make AI-based decisions, requesting only stocks whose data changed materially since their last AI request
+# Hold decisions of unchanged stocks are reused, the AI request is skipped if no stock changed (merged decisions are reconciled in trade_stocks)
+def make_cached_ai_decisions(account_info, portfolio_overview, watchlist_overview, prompt_hashes=None, on_decision=None):
+    now = datetime.now().timestamp()
+    stocks_overview = {**portfolio_overview, **watchlist_overview}
+    changed_symbols = decision_cache.get_changed_symbols(account_info, stocks_overview, AI_CHANGE_TOLERANCES, AI_DECISIONS_MAX_AGE_SECONDS, now)
+    reused_symbols = [symbol for symbol in stocks_overview if symbol not in changed_symbols]
+    decision_cache.record_cycle(datetime.now().strftime('%Y-%m-%d'), len(reused_symbols), len(stocks_overview))
+    reused_decisions = decision_cache.get_cached_decisions(reused_symbols)
+    if len(changed_symbols) == 0:
+        logger.info("No material changes since the last AI request, reusing its decisions")
+        return reused_decisions
+
+    failed_symbols = []
+    decisions = make_ai_decisions(
+        account_info,
+        {symbol: stock_data for symbol, stock_data in portfolio_overview.items() if symbol in changed_symbols},
+        {symbol: stock_data for symbol, stock_data in watchlist_overview.items() if symbol in changed_symbols},
+        failed_symbols,
+        prompt_hashes,
+        on_decision,
+    )
+    requested_overview = {symbol: stocks_overview[symbol] for symbol in changed_symbols if symbol not in failed_symbols}
+    # Scoped runs (their account info has the portfolio size) analyze only some stocks, they never snapshot the account
+    is_full_request = "portfolio_size" not in account_info and len(requested_overview) == len(stocks_overview)
+    decision_cache.update(account_info, requested_overview, decisions, AI_CHANGE_TOLERANCES, now, is_full_request)
+    if len(reused_symbols) == 0:
+        return decisions
+
+    # Keep only decisions for requested stocks, reused decisions cover the others
+    decisions = [decision for decision in decisions if decision.get('symbol') in changed_symbols]
+    return [*reused_decisions, *decisions]
+
+
+# Get quantity of an AI decision (None if it is not a positive number, e.g. null or "5 shares")
+def get_decision_quantity(decision):
+    try:
+        quantity = float(decision.get('quantity', 0))
+    except (TypeError, ValueError):
+        return None
+    return quantity if quantity > 0 and quantity != float("inf") else None
+
+
+# Reconcile AI decisions with portfolio-level constraints (budget and portfolio limit), decisions merged from several AI requests
+# included (decisions must be filtered with filter_ai_hallucinations first, every buy and sell has a valid quantity)
+def reconcile_ai_decisions(account_info, portfolio_overview, watchlist_overview, decisions_data):
+    reconciled_decisions = []
+    seen_symbols = set()
+    budget = float(account_info['buying_power'])
+    # Scoped runs leave held stocks out of the overview, their account info has the size of the whole portfolio
+    portfolio_size = account_info.get("portfolio_size", len([symbol for symbol, stock_data in portfolio_overview.items() if stock_data.get("my_quantity", 0) > 0]))
+
+    # Full sells free up portfolio slots for new stocks (first decision of each symbol, duplicates are reconciled out below)
+    for symbol, decision in {decision.get('symbol'): decision for decision in reversed(decisions_data)}.items():
+        stock_data = portfolio_overview.get(symbol)
+        if decision.get('decision') == "sell" and stock_data and get_decision_quantity(decision) >= stock_data.get("my_quantity", 0) > 0:
+            portfolio_size -= 1
 
     for decision in decisions_data:
         symbol = decision.get('symbol')
-        decision_type = decision.get('decision')
-        quantity = decision.get('quantity', 0)
-
-        # Filter decisions for stocks in TRADE_EXCEPTIONS
-        if symbol in TRADE_EXCEPTIONS:
-            logger.debug(f"Filtering out {decision_type} decision for {symbol} - in TRADE_EXCEPTIONS")
+        if symbol in seen_symbols:
+            logger.debug(f"Reconciling out duplicate {decision.get('decision')} decision for {symbol}")
             continue
+        seen_symbols.add(symbol)
 
-        # Filter sell decisions with 0 quantity
-        if decision_type == "sell" and quantity == 0:
-            logger.debug(f"Filtering out sell decision for {symbol} with 0 quantity")
-            continue
+        if decision.get('decision') == "buy":
+            stock_data = portfolio_overview.get(symbol) or watchlist_overview.get(symbol) or {}
+            cost = get_decision_quantity(decision) * float(stock_data.get("current_price") or 0)
+            if cost > budget:
+                logger.debug(f"Reconciling out buy decision for {symbol} - cost {round(cost, 2)} USD exceeds remaining budget {round(budget, 2)} USD")
+                continue
+            if symbol not in portfolio_overview or portfolio_overview[symbol].get("my_quantity", 0) == 0:
+                if portfolio_size >= PORTFOLIO_LIMIT:
+                    logger.debug(f"Reconciling out buy decision for {symbol} - portfolio limit of {PORTFOLIO_LIMIT} stocks reached")
+                    continue
+                portfolio_size += 1
+            budget -= cost
 
-        # Filter buy decisions with 0 quantity
-        if decision_type == "buy" and quantity == 0:
-            logger.debug(f"Filtering out buy decision for {symbol} with 0 quantity")
-            continue
+        reconciled_decisions.append(decision)
 
-        # Get stock data from either portfolio or watchlist
-        stock_data = portfolio_overview.get(symbol) or watchlist_overview.get(symbol)
-        if not stock_data:
-            logger.debug(f"Filtering out decision for {symbol} - not found in portfolio or watchlist")
-            continue
+    logger.debug(f"Reconciled out {len(decisions_data) - len(reconciled_decisions)} decision(s)")
+    return reconciled_decisions
 
-        # Filter buy decisions with is_buy_pdt_restricted == True
-        if decision_type == "buy" and stock_data.get("is_buy_pdt_restricted", False):
-            logger.debug(f"Filtering out buy decision for {symbol} due to PDT restriction")
-            continue
 
-        # Filter sell decisions with is_sell_pdt_restricted == True
-        if decision_type == "sell" and stock_data.get("is_sell_pdt_restricted", False):
-            logger.debug(f"Filtering out sell decision for {symbol} due to PDT restriction")
+# Get reason to filter out an AI decision as a hallucination (None if the decision is valid)
+def get_hallucination_reason(portfolio_overview, watchlist_overview, decision):
+    symbol = decision.get('symbol')
+    decision_type = decision.get('decision')
+    quantity = decision.get('quantity', 0)
+
+    # Filter decisions for stocks in TRADE_EXCEPTIONS
+    if symbol in TRADE_EXCEPTIONS:
+        return f"{decision_type} decision for {symbol} - in TRADE_EXCEPTIONS"
+
+    # Filter sell decisions with 0 quantity
+    if decision_type == "sell" and quantity == 0:
+        return f"sell decision for {symbol} with 0 quantity"
+
+    # Filter buy decisions with 0 quantity
+    if decision_type == "buy" and quantity == 0:
+        return f"buy decision for {symbol} with 0 quantity"
+
+    # Filter buy and sell decisions without a valid quantity
+    if decision_type in ("buy", "sell") and get_decision_quantity(decision) is None:
+        return f"{decision_type} decision for {symbol} with invalid quantity {quantity!r}"
+
+    # Get stock data from either portfolio or watchlist
+    stock_data = portfolio_overview.get(symbol) or watchlist_overview.get(symbol)
+    if not stock_data:
+        return f"decision for {symbol} - not found in portfolio or watchlist"
+
+    # Filter buy decisions with is_buy_pdt_restricted == True
+    if decision_type == "buy" and stock_data.get("is_buy_pdt_restricted", False):
+        return f"buy decision for {symbol} due to PDT restriction"
+
+    # Filter sell decisions with is_sell_pdt_restricted == True
+    if decision_type == "sell" and stock_data.get("is_sell_pdt_restricted", False):
+        return f"sell decision for {symbol} due to PDT restriction"
+    return None
+
+
+# Filter AI hallucinations
+def filter_ai_hallucinations(account_info, portfolio_overview, watchlist_overview, decisions_data):
+    filtered_decisions = []
+
+    for decision in decisions_data:
+        hallucination_reason = get_hallucination_reason(portfolio_overview, watchlist_overview, decision)
+        if hallucination_reason is not None:
+            logger.debug(f"Filtering out {hallucination_reason}")
             continue
 
         filtered_decisions.append(decision)
@@ -144,13 +386,280 @@ def limit_watchlist_stocks(watchlist_stocks, limit):
     return watchlist_stocks[start_index:end_index]
 
 
-# Main trading bot function
-def trading_bot():
+# Get market data for all stocks of the trading cycle in batches
+def get_market_data(symbols):
+    timings = {}
+
+    started_at = time.perf_counter()
+    historical_data_day = robinhood.get_historical_data_batch(symbols, interval="5minute", span="day")
+    timings["historicals_day"] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    historical_data_year = robinhood.get_daily_historical_data_batch(symbols)
+    timings["historicals_year"] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    ratings_data = robinhood.get_ratings_batch(symbols)
+    timings["ratings"] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    indicators_data = indicator_state.update_indicators(historical_data_day, historical_data_year)
+    timings["indicators"] = time.perf_counter() - started_at
+
+    if INDICATOR_STATE_FILE:
+        try:
+            indicator_state.save_indicator_states(INDICATOR_STATE_FILE)
+        except OSError as e:
+            logger.warning(f"Error saving indicator state to {INDICATOR_STATE_FILE}: {e}")
+
+    for name, seconds in timings.items():
+        metrics.observe("trading_bot_stage_duration_seconds", seconds, stage=f"market_data_{name}")
+    logger.debug(lambda: f"Market data timings for {len(symbols)} stock(s): {', '.join([f'{name} {seconds:.3f}s' for name, seconds in timings.items()])}, total {sum(timings.values()):.3f}s")
+    return {
+        "historical_data_day": historical_data_day,
+        "historical_data_year": historical_data_year,
+        "ratings": ratings_data,
+        "indicators": indicators_data,
+    }
+
+
+# Prepare stock overview for AI analysis
+def get_stock_overview(symbol, stock_data, extract_data_func, market_data):
+    stock_overview = extract_data_func(stock_data)
+    stock_overview = robinhood.enrich_with_indicators(stock_overview, market_data["indicators"][symbol], symbol)
+    stock_overview = robinhood.enrich_with_analyst_ratings(stock_overview, market_data["ratings"][symbol])
+
+    # With local PDT tracking, restrictions of all stocks are added in one pass (see enrich_with_pdt_restrictions)
+    if not PDT_LOCAL_TRACKING:
+        started_at = time.perf_counter()
+        stock_overview = robinhood.enrich_with_pdt_restrictions(stock_overview, symbol)
+        logger.debug(f"{symbol} > PDT restrictions timing: {time.perf_counter() - started_at:.3f}s")
+    return stock_overview
+
+
+# Prepare stocks overview concurrently (keeps the order of the given stocks)
+def get_stocks_overview(stocks, extract_data_func, market_data):
+    stocks_overview = {}
+    if len(stocks) == 0:
+        return stocks_overview
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, FETCH_MAX_WORKERS)) as executor:
+        futures = {symbol: executor.submit(get_stock_overview, symbol, stock_data, extract_data_func, market_data) for symbol, stock_data in stocks.items()}
+        try:
+            for symbol, future in futures.items():
+                stocks_overview[symbol] = future.result()
+        except Exception:
+            for future in futures.values():
+                future.cancel()
+            raise
+
+    logger.debug(f"Prepared overview for {len(stocks_overview)} stock(s) in {time.perf_counter() - started_at:.3f}s")
+    return stocks_overview
+
+
+# Enrich stocks overview with PDT restrictions of the active account in one pass
+# day_trade_checks is requested only for stocks traded today and stocks not confirmed unrestricted in the last PDT_FULL_CHECK_SECONDS,
+# other stocks are not restricted since PDT restrictions only change when the account trades
+def enrich_with_pdt_restrictions(stocks_overview):
+    username = robinhood.active_account["username"]
+    now = datetime.now()
+    day = now.strftime('%Y-%m-%d')
+    symbols = list(stocks_overview.keys())
+    checked_symbols = pdt.get_symbols_to_check(username, symbols, day, now.timestamp(), PDT_FULL_CHECK_SECONDS)
+
+    started_at = time.perf_counter()
+    checked_flags = {}
+    if len(checked_symbols) > 0:
+        with ThreadPoolExecutor(max_workers=max(1, FETCH_MAX_WORKERS)) as executor:
+            futures = {symbol: executor.submit(robinhood.get_stock_pdt_flags, symbol) for symbol in checked_symbols}
+            for symbol, future in futures.items():
+                checked_flags[symbol] = future.result()
+
+    for symbol, (is_buy_pdt_restricted, is_sell_pdt_restricted) in pdt.get_restrictions(username, symbols, checked_flags, day, now.timestamp()).items():
+        stocks_overview[symbol]["is_buy_pdt_restricted"] = is_buy_pdt_restricted
+        stocks_overview[symbol]["is_sell_pdt_restricted"] = is_sell_pdt_restricted
+    logger.debug(f"PDT restrictions of {len(symbols)} stock(s) with {len(checked_symbols)} day trade check(s) in {time.perf_counter() - started_at:.3f}s, {pdt.get_day_trade_count(username, day)} day trade(s) in the last {pdt.DAY_TRADE_WINDOW_DAYS} business days")
+
+
+# Record orders of a trading cycle in the local day trade record of the active account
+# Failed orders may have been executed, so restrictions of their stocks are requested from Robinhood for the rest of the day
+def update_pdt_record(trading_results):
+    username = robinhood.active_account["username"]
+    day = datetime.now().strftime('%Y-%m-%d')
+    for trading_result in trading_results.values():
+        if trading_result['result'] == "error":
+            pdt.flag_uncertain(username, day, trading_result['symbol'])
+        elif trading_result['result'] == "success" and isinstance(trading_result['details'], dict):
+            pdt.record_order(username, trading_result['symbol'], trading_result['decision'], day)
+
+
+# Execute an AI decision (returns its trading result, None for hold decisions)
+def execute_decision(decision_data):
+    symbol = decision_data['symbol']
+    decision = decision_data['decision']
+    quantity = decision_data['quantity']
+    logger.info(f"{symbol} > Decision: {decision} of {quantity}")
+
+    trading_result = None
+    submitted_at = time.perf_counter()
+    if decision == "sell":
+        try:
+            sell_resp = robinhood.sell_stock(symbol, quantity)
+            logger.debug(f"{symbol} > Sell order acknowledged in {time.perf_counter() - submitted_at:.3f}s")
+            if sell_resp and 'id' in sell_resp:
+                if sell_resp['id'] == "demo":
+                    trading_result = {"symbol": symbol, "quantity": quantity, "decision": "sell", "result": "success", "details": "Demo mode"}
+                    logger.info(f"{symbol} > Demo > Sold {quantity} stocks")
+                elif sell_resp['id'] == "cancelled":
+                    trading_result = {"symbol": symbol, "quantity": quantity, "decision": "sell", "result": "cancelled", "details": "Cancelled by user"}
+                    logger.info(f"{symbol} > Sell cancelled by user")
+                else:
+                    details = robinhood.extract_sell_response_data(sell_resp)
+                    trading_result = {"symbol": symbol, "quantity": quantity, "decision": "sell", "result": "success", "details": details}
+                    logger.info(f"{symbol} > Sold {quantity} stocks")
+            else:
+                details = sell_resp['detail'] if 'detail' in sell_resp else sell_resp
+                trading_result = {"symbol": symbol, "quantity": quantity, "decision": "sell", "result": "error", "details": details}
+                logger.error(f"{symbol} > Error selling: {details}")
+        except Exception as e:
+            trading_result = {"symbol": symbol, "quantity": quantity, "decision": "sell", "result": "error", "details": str(e)}
+            logger.error(f"{symbol} > Error selling: {e}")
+
+    elif decision == "buy":
+        try:
+            buy_resp = robinhood.buy_stock(symbol, quantity)
+            logger.debug(f"{symbol} > Buy order acknowledged in {time.perf_counter() - submitted_at:.3f}s")
+            if buy_resp and 'id' in buy_resp:
+                if buy_resp['id'] == "demo":
+                    trading_result = {"symbol": symbol, "quantity": quantity, "decision": "buy", "result": "success", "details": "Demo mode"}
+                    logger.info(f"{symbol} > Demo > Bought {quantity} stocks")
+                elif buy_resp['id'] == "cancelled":
+                    trading_result = {"symbol": symbol, "quantity": quantity, "decision": "buy", "result": "cancelled", "details": "Cancelled by user"}
+                    logger.info(f"{symbol} > Buy cancelled by user")
+                else:
+                    details = robinhood.extract_buy_response_data(buy_resp)
+                    trading_result = {"symbol": symbol, "quantity": quantity, "decision": "buy", "result": "success", "details": details}
+                    logger.info(f"{symbol} > Bought {quantity} stocks")
+            else:
+                details = buy_resp['detail'] if 'detail' in buy_resp else buy_resp
+                trading_result = {"symbol": symbol, "quantity": quantity, "decision": "buy", "result": "error", "details": details}
+                logger.error(f"{symbol} > Error buying: {details}")
+        except Exception as e:
+            trading_result = {"symbol": symbol, "quantity": quantity, "decision": "buy", "result": "error", "details": str(e)}
+            logger.error(f"{symbol} > Error buying: {e}")
+    return trading_result
+
+
+# Submit a streamed sell decision for execution while the AI response is still streaming (id of the decision -> decision and future)
+# Only the first sell of each symbol is submitted, buys wait for execute_decisions to keep sells before buys
+def submit_streamed_decision(order_executor, streamed_orders, decision):
+    if decision.get('decision') != "sell":
+        return
+    with streamed_orders_lock:
+        if any(streamed_decision.get('symbol') == decision.get('symbol') for streamed_decision, _ in streamed_orders.values()):
+            return
+        streamed_orders[id(decision)] = (decision, order_executor.submit(execute_decision, decision))
+
+
+# Execute AI decisions, sells before buys so freed buying power is available for buys
+# Orders of each side are submitted concurrently (one by one in manual mode, every order is confirmed by the user)
+# Decisions already submitted while the AI response was streaming (streamed_orders) are not submitted again
+def execute_decisions(decisions_data, streamed_orders=None):
+    streamed_orders = streamed_orders or {}
+    results = {}
+    for decision_data in decisions_data:
+        if decision_data['decision'] not in ("sell", "buy"):
+            execute_decision(decision_data)
+
+    max_workers = 1 if MODE == "manual" else max(1, ORDER_MAX_WORKERS)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for decision in ["sell", "buy"]:
+            futures = {}
+            for index, decision_data in enumerate(decisions_data):
+                if decision_data['decision'] != decision:
+                    continue
+                if id(decision_data) in streamed_orders:
+                    futures[index] = streamed_orders[id(decision_data)][1]
+                else:
+                    futures[index] = executor.submit(execute_decision, decision_data)
+            for index, future in futures.items():
+                results[index] = future.result()
+
+    # Collect trading results in the order of decisions
+    trading_results = {}
+    for index, decision_data in enumerate(decisions_data):
+        if index in results:
+            trading_results[decision_data['symbol']] = results[index]
+
+    # Streamed orders of decisions that did not make it to the final decisions (e.g. the AI request failed after them) are executed anyway
+    decision_ids = {id(decision_data) for decision_data in decisions_data}
+    for decision_id, (streamed_decision, future) in streamed_orders.items():
+        if decision_id not in decision_ids:
+            trading_results[streamed_decision['symbol']] = future.result()
+
+    if LEDGER_RECONCILE_SECONDS:
+        update_ledger(trading_results)
+    if PDT_LOCAL_TRACKING:
+        update_pdt_record(trading_results)
+    return trading_results
+
+
+# Get account info and portfolio stocks of the active Robinhood account
+# With LEDGER_RECONCILE_SECONDS set, both come from the local ledger between reconciliations and only prices are refreshed
+# (one batched quotes request instead of the profile request and rh.build_holdings fanning out per position)
+def get_account_state():
+    username = robinhood.active_account["username"]
+    now = time.time()
+    reason = ledger.get_reconcile_reason(username, LEDGER_RECONCILE_SECONDS, now) if LEDGER_RECONCILE_SECONDS else None
+    if LEDGER_RECONCILE_SECONDS and reason is None:
+        logger.info("Getting account info and portfolio stocks from ledger...")
+        with metrics.stage("ledger"):
+            held_symbols = ledger.get_symbols(username)
+            if len(held_symbols) > 0:
+                ledger.update_prices(username, robinhood.get_latest_prices(held_symbols))
+            return ledger.get_state(username)
+
     logger.info("Getting account info...")
-    account_info = robinhood.get_account_info()
+    with metrics.stage("account_info"):
+        account_info = robinhood.get_account_info()
 
     logger.info("Getting portfolio stocks...")
-    portfolio_stocks = robinhood.get_portfolio_stocks()
+    with metrics.stage("portfolio"):
+        portfolio_stocks = robinhood.get_portfolio_stocks()
+
+    if LEDGER_RECONCILE_SECONDS:
+        if reason == "discrepancy":
+            logger.info(f"Reconciled ledger with Robinhood account after a discrepancy: {ledger.get_discrepancy(username)}")
+        differences = ledger.get_differences(username, account_info, portfolio_stocks)
+        if len(differences) > 0:
+            logger.warning(f"Ledger differed from Robinhood account ({reason} reconciliation): {', '.join(differences)}")
+            # The account traded outside the bot or an order did not fill as acknowledged, so local day trade tracking can no longer be trusted either
+            pdt.flag_uncertain(username, datetime.now().strftime('%Y-%m-%d'))
+        metrics.increment("trading_bot_ledger_reconciliations_total", reason=reason)
+        ledger.seed(username, account_info, portfolio_stocks, now)
+    return account_info, portfolio_stocks
+
+
+# Apply orders of a trading cycle to the ledger of the active account (the next cycle reconciles it with a full fetch)
+# Orders are assumed to fill at the acknowledged price, failed orders force a reconciliation, demo and cancelled orders are left out
+def update_ledger(trading_results):
+    username = robinhood.active_account["username"]
+    for trading_result in trading_results.values():
+        symbol, decision, details = trading_result['symbol'], trading_result['decision'], trading_result['details']
+        if trading_result['result'] == "error":
+            ledger.flag_discrepancy(username, f"{symbol} {decision} order failed")
+        elif trading_result['result'] == "success" and isinstance(details, dict):
+            if details.get('quantity') is None or details.get('price') is None:
+                ledger.flag_discrepancy(username, f"{symbol} {decision} order acknowledged without quantity or price")
+            else:
+                ledger.apply_order(username, symbol, decision, details['quantity'], details['price'])
+
+
+# Get account info, portfolio and watchlist stocks of a trading cycle (of the active Robinhood account)
+# Stocks can be scoped to some symbols (e.g. stocks that crossed a trigger), other stocks are left out of the cycle
+def get_cycle_stocks(symbols=None):
+    account_info, portfolio_stocks = get_account_state()
 
     logger.debug(f"Portfolio stocks total: {len(portfolio_stocks)}")
 
@@ -159,170 +668,407 @@ def trading_bot():
         portfolio_stocks_value += float(stock['price']) * float(stock['quantity'])
     portfolio = [f"{symbol} ({round(float(stock['price']) * float(stock['quantity']) / portfolio_stocks_value * 100, 2)}%)" for symbol, stock in portfolio_stocks.items()]
     logger.info(f"Portfolio stocks to proceed: {'None' if len(portfolio) == 0 else ', '.join(portfolio)}")
-
-    logger.info("Prepare portfolio stocks for AI analysis...")
-    portfolio_overview = {}
-    for symbol, stock_data in portfolio_stocks.items():
-        historical_data_day = robinhood.get_historical_data(symbol, interval="5minute", span="day")
-        historical_data_year = robinhood.get_historical_data(symbol, interval="day", span="year")
-        ratings_data = robinhood.get_ratings(symbol)
-        portfolio_overview[symbol] = robinhood.extract_my_stocks_data(stock_data)
-        portfolio_overview[symbol] = robinhood.enrich_with_rsi(portfolio_overview[symbol], historical_data_day, symbol)
-        portfolio_overview[symbol] = robinhood.enrich_with_vwap(portfolio_overview[symbol], historical_data_day, symbol)
-        portfolio_overview[symbol] = robinhood.enrich_with_moving_averages(portfolio_overview[symbol], historical_data_year, symbol)
-        portfolio_overview[symbol] = robinhood.enrich_with_analyst_ratings(portfolio_overview[symbol], ratings_data)
-        portfolio_overview[symbol] = robinhood.enrich_with_pdt_restrictions(portfolio_overview[symbol], symbol)
+    held_symbols = set(portfolio_stocks.keys())
+    if symbols is not None:
+        # Only the stocks in scope are analyzed, the portfolio limit still counts every held stock (in the prompt and in reconciliation)
+        logger.info(f"Analysis scoped to: {', '.join(symbols)}")
+        account_info = {**account_info, "portfolio_size": len(portfolio_stocks)}
+        portfolio_stocks = {symbol: stock for symbol, stock in portfolio_stocks.items() if symbol in symbols}
 
     logger.info("Getting watchlist stocks...")
+    started_at = time.perf_counter()
     watchlist_stocks = []
     for watchlist_name in WATCHLIST_NAMES:
         try:
             watchlist_stocks.extend(robinhood.get_watchlist_stocks(watchlist_name))
-            watchlist_stocks = [dict(t) for t in {tuple(d.items()) for d in watchlist_stocks}]
+            watchlist_stocks = [dict(t) for t in dict.fromkeys(tuple(d.items()) for d in watchlist_stocks)]
         except Exception as e:
             logger.error(f"Error getting watchlist stocks for {watchlist_name}: {e}")
 
     logger.debug(f"Watchlist stocks total: {len(watchlist_stocks)}")
 
-    watchlist_overview = {}
     if len(watchlist_stocks) > 0:
         logger.debug(f"Limiting watchlist stocks to overview limit of {WATCHLIST_OVERVIEW_LIMIT}...")
         watchlist_stocks = limit_watchlist_stocks(watchlist_stocks, WATCHLIST_OVERVIEW_LIMIT)
 
         logger.debug(f"Removing portfolio stocks from watchlist...")
-        watchlist_stocks = [stock for stock in watchlist_stocks if stock['symbol'] not in portfolio_stocks.keys()]
+        watchlist_stocks = [stock for stock in watchlist_stocks if stock['symbol'] not in held_symbols]
+        if symbols is not None:
+            watchlist_stocks = [stock for stock in watchlist_stocks if stock['symbol'] in symbols]
 
         logger.info(f"Watchlist stocks to proceed: {', '.join([stock['symbol'] for stock in watchlist_stocks])}")
 
+        # Watchlists may be served from cache, so refresh their prices with a single batched quotes request
+        if len(watchlist_stocks) > 0:
+            latest_prices = robinhood.get_latest_prices([stock['symbol'] for stock in watchlist_stocks])
+            watchlist_stocks = [{**stock, "price": latest_prices.get(stock['symbol'], stock['price'])} for stock in watchlist_stocks]
+
+    watchlist_stocks = {stock['symbol']: stock for stock in watchlist_stocks}
+    metrics.observe("trading_bot_stage_duration_seconds", time.perf_counter() - started_at, stage="watchlist")
+    return account_info, portfolio_stocks, watchlist_stocks
+
+
+# Get market data of a trading cycle (empty if there are no stocks)
+def get_cycle_market_data(symbols):
+    market_data = {"historical_data_day": {}, "historical_data_year": {}, "ratings": {}, "indicators": {}}
+    if len(symbols) > 0:
+        logger.info("Getting market data...")
+        with metrics.stage("market_data"):
+            market_data = get_market_data(symbols)
+    return market_data
+
+
+# Analyze stocks of a trading cycle with AI and execute its decisions
+def trade_stocks(account_info, portfolio_stocks, watchlist_stocks, market_data):
+    logger.info("Prepare portfolio stocks for AI analysis...")
+    with metrics.stage("portfolio_overview"):
+        portfolio_overview = get_stocks_overview(portfolio_stocks, robinhood.extract_my_stocks_data, market_data)
+
+    watchlist_overview = {}
+    if len(watchlist_stocks) > 0:
         logger.info("Prepare watchlist overview for AI analysis...")
-        for stock_data in watchlist_stocks:
-            symbol = stock_data['symbol']
-            historical_data_day = robinhood.get_historical_data(symbol, interval="5minute", span="day")
-            historical_data_year = robinhood.get_historical_data(symbol, interval="day", span="year")
-            ratings_data = robinhood.get_ratings(symbol)
-            watchlist_overview[symbol] = robinhood.extract_watchlist_data(stock_data)
-            watchlist_overview[symbol] = robinhood.enrich_with_rsi(watchlist_overview[symbol], historical_data_day, symbol)
-            watchlist_overview[symbol] = robinhood.enrich_with_vwap(watchlist_overview[symbol], historical_data_day, symbol)
-            watchlist_overview[symbol] = robinhood.enrich_with_moving_averages(watchlist_overview[symbol], historical_data_year, symbol)
-            watchlist_overview[symbol] = robinhood.enrich_with_analyst_ratings(watchlist_overview[symbol], ratings_data)
-            watchlist_overview[symbol] = robinhood.enrich_with_pdt_restrictions(watchlist_overview[symbol], symbol)
+        with metrics.stage("watchlist_overview"):
+            watchlist_overview = get_stocks_overview(watchlist_stocks, robinhood.extract_watchlist_data, market_data)
+    if PDT_LOCAL_TRACKING:
+        with metrics.stage("pdt_restrictions"):
+            enrich_with_pdt_restrictions({**portfolio_overview, **watchlist_overview})
+    if TRIGGER_MODE:
+        for symbol, stock_overview in {**portfolio_overview, **watchlist_overview}.items():
+            triggers.set_reference(symbol, stock_overview["current_price"], TRIGGER_RSI_BANDS)
+    metrics.set_gauge("trading_bot_stocks", len(portfolio_overview), list="portfolio")
+    metrics.set_gauge("trading_bot_stocks", len(watchlist_overview), list="watchlist")
+
+    logger.debug(lambda: f"Cache stats: {robinhood.get_cache_stats()}")
+    logger.debug(lambda: f"Robinhood API metrics: {robinhood.get_api_metrics()}")
 
     if len(portfolio_overview) == 0 and len(watchlist_overview) == 0:
         logger.warning("No stocks to analyze, skipping AI-based decision-making...")
         return {}
 
-    decisions_data = []
+    ai_decisions = []
+    prompt_hashes = []
     trading_results = {}
 
+    # With AI_STREAMING, valid sells are executed as soon as they are streamed (not in manual mode, every order is confirmed by the user)
+    streamed_orders = {}
+    order_executor = None
+    on_decision = None
+    if AI_STREAMING and MODE != "manual":
+        order_executor = ThreadPoolExecutor(max_workers=max(1, ORDER_MAX_WORKERS))
+        on_decision = partial(submit_streamed_decision, order_executor, streamed_orders)
+
+    # Streamed orders run on their own executor, shut down even if executing decisions fails
     try:
-        logger.info("Making AI-based decision...")
-        decisions_data = make_ai_decisions(account_info, portfolio_overview, watchlist_overview)
-    except Exception as e:
-        logger.error(f"Error making AI-based decision: {e}")
+        try:
+            logger.info("Making AI-based decision...")
+            with metrics.stage("ai_decisions"):
+                if AI_CHANGE_TOLERANCES:
+                    ai_decisions = make_cached_ai_decisions(account_info, portfolio_overview, watchlist_overview, prompt_hashes, on_decision)
+                else:
+                    ai_decisions = make_ai_decisions(account_info, portfolio_overview, watchlist_overview, prompt_hashes=prompt_hashes, on_decision=on_decision)
+        except Exception as e:
+            logger.error(f"Error making AI-based decision: {e}")
 
-    logger.info("Filtering AI hallucinations...")
-    decisions_data = filter_ai_hallucinations(account_info, portfolio_overview, watchlist_overview, decisions_data)
+        logger.info("Filtering AI hallucinations...")
+        decisions_data = filter_ai_hallucinations(account_info, portfolio_overview, watchlist_overview, ai_decisions)
+        # Reconciled after filtering, so filtered out decisions neither free up portfolio slots nor use up the budget
+        decisions_data = reconcile_ai_decisions(account_info, portfolio_overview, watchlist_overview, decisions_data)
+        for decision_data in decisions_data:
+            metrics.increment("trading_bot_decisions_total", decision=decision_data.get('decision'))
 
-    if len(decisions_data) == 0:
-        logger.info("No decisions to execute")
-        return trading_results
+        if len(decisions_data) == 0 and len(streamed_orders) == 0:
+            logger.info("No decisions to execute")
+        else:
+            logger.info("Executing decisions...")
 
-    logger.info("Executing decisions...")
+            started_at = time.perf_counter()
+            trading_results = execute_decisions(decisions_data, streamed_orders)
+            metrics.observe("trading_bot_stage_duration_seconds", time.perf_counter() - started_at, stage="orders")
+    finally:
+        if order_executor is not None:
+            order_executor.shutdown()
 
-    for decision_data in decisions_data:
-        symbol = decision_data['symbol']
-        decision = decision_data['decision']
-        quantity = decision_data['quantity']
-        logger.info(f"{symbol} > Decision: {decision} of {quantity}")
+    journal.record_cycle(active_profile["name"], MODE, account_info, portfolio_overview, watchlist_overview, prompt_hashes, ai_decisions, decisions_data, trading_results)
+    return trading_results
 
-        if decision == "sell":
-            try:
-                sell_resp = robinhood.sell_stock(symbol, quantity)
-                if sell_resp and 'id' in sell_resp:
-                    if sell_resp['id'] == "demo":
-                        trading_results[symbol] = {"symbol": symbol, "quantity": quantity, "decision": "sell", "result": "success", "details": "Demo mode"}
-                        logger.info(f"{symbol} > Demo > Sold {quantity} stocks")
-                    elif sell_resp['id'] == "cancelled":
-                        trading_results[symbol] = {"symbol": symbol, "quantity": quantity, "decision": "sell", "result": "cancelled", "details": "Cancelled by user"}
-                        logger.info(f"{symbol} > Sell cancelled by user")
-                    else:
-                        details = robinhood.extract_sell_response_data(sell_resp)
-                        trading_results[symbol] = {"symbol": symbol, "quantity": quantity, "decision": "sell", "result": "success", "details": details}
-                        logger.info(f"{symbol} > Sold {quantity} stocks")
-                else:
-                    details = sell_resp['detail'] if 'detail' in sell_resp else sell_resp
-                    trading_results[symbol] = {"symbol": symbol, "quantity": quantity, "decision": "sell", "result": "error", "details": details}
-                    logger.error(f"{symbol} > Error selling: {details}")
-            except Exception as e:
-                trading_results[symbol] = {"symbol": symbol, "quantity": quantity, "decision": "sell", "result": "error", "details": str(e)}
-                logger.error(f"{symbol} > Error selling: {e}")
 
-        if decision == "buy":
-            try:
-                buy_resp = robinhood.buy_stock(symbol, quantity)
-                if buy_resp and 'id' in buy_resp:
-                    if buy_resp['id'] == "demo":
-                        trading_results[symbol] = {"symbol": symbol, "quantity": quantity, "decision": "buy", "result": "success", "details": "Demo mode"}
-                        logger.info(f"{symbol} > Demo > Bought {quantity} stocks")
-                    elif buy_resp['id'] == "cancelled":
-                        trading_results[symbol] = {"symbol": symbol, "quantity": quantity, "decision": "buy", "result": "cancelled", "details": "Cancelled by user"}
-                        logger.info(f"{symbol} > Buy cancelled by user")
-                    else:
-                        details = robinhood.extract_buy_response_data(buy_resp)
-                        trading_results[symbol] = {"symbol": symbol, "quantity": quantity, "decision": "buy", "result": "success", "details": details}
-                        logger.info(f"{symbol} > Bought {quantity} stocks")
-                else:
-                    details = buy_resp['detail'] if 'detail' in buy_resp else buy_resp
-                    trading_results[symbol] = {"symbol": symbol, "quantity": quantity, "decision": "buy", "result": "error", "details": details}
-                    logger.error(f"{symbol} > Error buying: {details}")
-            except Exception as e:
-                trading_results[symbol] = {"symbol": symbol, "quantity": quantity, "decision": "buy", "result": "error", "details": str(e)}
-                logger.error(f"{symbol} > Error buying: {e}")
+# Main trading bot function
+# Analysis can be scoped to some stocks (e.g. stocks that crossed a trigger), other stocks are left out of the cycle
+def trading_bot(symbols=None):
+    account_info, portfolio_stocks, watchlist_stocks = get_cycle_stocks(symbols)
+    market_data = get_cycle_market_data([*portfolio_stocks.keys(), *watchlist_stocks.keys()])
+    return trade_stocks(account_info, portfolio_stocks, watchlist_stocks, market_data)
 
-    return trading_results
+
+# Get trading modes of the bot (of every profile if profiles are set)
+def get_modes():
+    if len(PROFILES) == 0:
+        return [MODE]
+    return list(dict.fromkeys(profile_config.get("MODE", MODE) for profile_config in PROFILES))
+
+
+# Load profiles of the config (name, Robinhood account and config overrides), accounts of profiles are added to Robinhood accounts
+def load_profiles():
+    profiles = []
+    for index, profile_config in enumerate(PROFILES):
+        name = str(profile_config.get("NAME", index + 1))
+        unknown_parameters = [parameter for parameter in profile_config if parameter != "NAME" and parameter not in PROFILE_PARAMETERS + PROFILE_ACCOUNT_PARAMETERS]
+        if len(unknown_parameters) > 0:
+            raise Exception(f"Unknown parameter(s) of profile {name}: {', '.join(unknown_parameters)} (available: {', '.join(PROFILE_PARAMETERS + PROFILE_ACCOUNT_PARAMETERS)})")
+        if name in [profile["name"] for profile in profiles]:
+            raise Exception(f"Duplicate profile name: {name}")
+
+        username = profile_config.get("ROBINHOOD_USERNAME", ROBINHOOD_USERNAME)
+        if username != ROBINHOOD_USERNAME:
+            robinhood.add_account(username, profile_config.get("ROBINHOOD_PASSWORD", ""), profile_config.get("ROBINHOOD_MFA_SECRET", ""), profile_config.get("OP_ITEM_NAME", ""))
+        profiles.append({
+            "name": name,
+            "username": username,
+            "config": {parameter: value for parameter, value in profile_config.items() if parameter in PROFILE_PARAMETERS},
+        })
+    return profiles
+
+
+# Temporarily apply config overrides and cached AI decisions of a profile (originals are restored on exit)
+@contextlib.contextmanager
+def apply_profile(profile):
+    config = globals()
+    originals = {parameter: config[parameter] for parameter in profile["config"]}
+    robinhood_mode = robinhood.MODE
+    try:
+        config.update(profile["config"])
+        robinhood.MODE = config["MODE"]
+        decision_cache.activate(profile["name"])
+        active_profile["name"] = profile["name"]
+        yield
+    finally:
+        config.update(originals)
+        robinhood.MODE = robinhood_mode
+        decision_cache.activate(None)
+        active_profile["name"] = None
+
+
+# Run a blocking function for a profile in a worker thread (with the config and Robinhood session of the profile)
+# robin_stocks keeps one session for all accounts, so profiles take turns on it under the session lock
+async def run_for_profile(profile, func, *args, margin_seconds=300):
+    await robinhood.ensure_session(margin_seconds, profile["username"])
+    async with robinhood.session_lock:
+        robinhood.activate_account(profile["username"])
+        with apply_profile(profile):
+            return await asyncio.to_thread(func, *args)
+
+
+# Run a blocking function in a worker thread (keeps the event loop free) with a valid Robinhood session
+# Session is renewed ahead of expiry in the background, login here only if that failed (or is still in progress)
+# New session tokens are swapped in under the session lock, so the token does not change while the function runs
+async def run_with_session(func, *args, margin_seconds=300):
+    await robinhood.ensure_session(margin_seconds)
+    async with robinhood.session_lock:
+        return await asyncio.to_thread(func, *args)
+
+
+# Run a trading cycle for every profile, market data of the union of their stocks is fetched once and shared
+# Each profile makes its own AI decisions and orders, a failing profile does not stop the others (profile name -> trading results)
+async def run_profiles_cycle(profiles, symbols=None):
+    profiles_stocks = {}
+    for profile in profiles:
+        try:
+            logger.info(f"Profile {profile['name']} > Getting account and stocks...")
+            profiles_stocks[profile["name"]] = await run_for_profile(profile, get_cycle_stocks, symbols)
+        except Exception as e:
+            logger.error(f"Profile {profile['name']} > Error getting account and stocks: {e}")
+
+    cycle_symbols = list(dict.fromkeys(symbol for _, portfolio_stocks, watchlist_stocks in profiles_stocks.values() for symbol in [*portfolio_stocks.keys(), *watchlist_stocks.keys()]))
+    logger.info(f"Shared market data for {len(cycle_symbols)} stock(s) of {len(profiles_stocks)} profile(s)")
+    async with robinhood.session_lock:
+        market_data = await asyncio.to_thread(get_cycle_market_data, cycle_symbols)
+
+    profiles_results = {}
+    for profile in profiles:
+        if profile["name"] not in profiles_stocks:
+            continue
+        try:
+            logger.info(f"Profile {profile['name']} > Making decisions...")
+            profiles_results[profile["name"]] = await run_for_profile(profile, trade_stocks, *profiles_stocks[profile["name"]], market_data)
+        except Exception as e:
+            logger.error(f"Profile {profile['name']} > Error making decisions: {e}")
+    return profiles_results
+
+
+# Run a trading cycle, of every profile if profiles are set (profile name -> trading results, None - bot without profiles)
+async def run_trading_cycle(profiles, symbols=None):
+    if len(profiles) > 0:
+        return await run_profiles_cycle(profiles, symbols)
+
+    return {None: await run_with_session(trading_bot, symbols)}
+
+
+# Record totals of a trading cycle
+def record_cycle_metrics(result, cycle_started_at):
+    cycle_seconds = time.monotonic() - cycle_started_at
+    metrics.increment("trading_bot_cycles_total", result=result)
+    metrics.observe("trading_bot_stage_duration_seconds", cycle_seconds, stage="cycle")
+    metrics.set_gauge("trading_bot_last_cycle_duration_seconds", cycle_seconds)
+    metrics.set_gauge("trading_bot_last_cycle_timestamp_seconds", time.time())
+    logger.debug(f"Trading cycle took {cycle_seconds:.3f}s")
+
+
+# Log results of a trading cycle (profile name -> trading results, None - bot without profiles)
+def log_trading_results(profiles_results):
+    for profile_name, trading_results in profiles_results.items():
+        prefix = "" if profile_name is None else f"Profile {profile_name} > "
+        sold_stocks = [f"{result['symbol']} ({result['quantity']})" for result in trading_results.values() if result['decision'] == "sell" and result['result'] == "success"]
+        bought_stocks = [f"{result['symbol']} ({result['quantity']})" for result in trading_results.values() if result['decision'] == "buy" and result['result'] == "success"]
+        errors = [f"{result['symbol']} ({result['details']})" for result in trading_results.values() if result['result'] == "error"]
+        logger.info(f"{prefix}Sold: {'None' if len(sold_stocks) == 0 else ', '.join(sold_stocks)}")
+        logger.info(f"{prefix}Bought: {'None' if len(bought_stocks) == 0 else ', '.join(bought_stocks)}")
+        logger.info(f"{prefix}Errors: {'None' if len(errors) == 0 else ', '.join(errors)}")
+
+    if FIXTURES_MODE == "record":
+        fixtures.save(FIXTURES_FILE)
+
+
+# Check if a full trading cycle is due in trigger mode (first cycle of a session, then every TRIGGER_FULL_CYCLE_SECONDS)
+def is_full_cycle_due(last_full_cycle_at, now):
+    if last_full_cycle_at is None or last_full_cycle_at.date() != now.date():
+        return True
+    return bool(TRIGGER_FULL_CYCLE_SECONDS) and (now - last_full_cycle_at).total_seconds() >= TRIGGER_FULL_CYCLE_SECONDS
+
+
+# Poll latest prices of analyzed stocks in a single batched request and get stocks that crossed a trigger (symbol -> reasons)
+def poll_triggers():
+    symbols = triggers.get_symbols()
+    if len(symbols) == 0:
+        return {}
+    latest_prices = robinhood.get_latest_prices(symbols)
+    triggered = triggers.check_triggers({symbol: float(price) for symbol, price in latest_prices.items()}, TRIGGER_PRICE_CHANGE_PERCENT, TRIGGER_RSI_BANDS, TRIGGER_VWAP_CROSS)
+    for symbol, reasons in triggered.items():
+        logger.info(f"{symbol} > Triggered: {', '.join(reasons)}")
+        metrics.increment("trading_bot_triggered_stocks_total")
+    logger.debug(f"Polled latest prices of {len(latest_prices)} stock(s), {len(triggered)} triggered")
+    return triggered
+
+
+# Prefetch market data of the next trading cycle (daily candles, ratings and instrument IDs are served from cache at the open)
+def warm_up():
+    _, portfolio_stocks = get_account_state()
+    symbols = list(portfolio_stocks.keys())
+    watchlist_stocks = []
+    for watchlist_name in WATCHLIST_NAMES:
+        try:
+            watchlist_stocks.extend(robinhood.get_watchlist_stocks(watchlist_name))
+        except Exception as e:
+            logger.error(f"Error getting watchlist stocks for {watchlist_name}: {e}")
+    if len(watchlist_stocks) > 0:
+        watchlist_stocks = [dict(t) for t in dict.fromkeys(tuple(d.items()) for d in watchlist_stocks)]
+        symbols.extend(stock['symbol'] for stock in limit_watchlist_stocks(watchlist_stocks, WATCHLIST_OVERVIEW_LIMIT) if stock['symbol'] not in symbols)
+    if len(symbols) > 0:
+        robinhood.get_daily_historical_data_batch(symbols)
+        robinhood.get_ratings_batch(symbols)
+    return symbols
+
+
+# Sleep until a wall-clock time (in steps, so long sleeps follow the wall clock after system suspend or clock changes)
+async def sleep_until(run_at, quiet=False):
+    wait_seconds = (run_at - datetime.now(market_calendar.MARKET_TIMEZONE)).total_seconds()
+    (logger.debug if quiet else logger.info)(f"Waiting for {round(max(0, wait_seconds))} seconds...")
+    while wait_seconds > 0:
+        await asyncio.sleep(min(wait_seconds, 3600))
+        wait_seconds = (run_at - datetime.now(market_calendar.MARKET_TIMEZONE)).total_seconds()
 
 
 # Run trading bot in a loop
 async def main():
-    robinhood_token_expiry = 0
+    if FIXTURES_MODE:
+        fixtures.install(FIXTURES_MODE, FIXTURES_FILE)
+        logger.warning(f"Fixtures {FIXTURES_MODE} mode, Robinhood and AI responses are {'recorded to' if FIXTURES_MODE == 'record' else 'replayed from'} {FIXTURES_FILE}")
+    robinhood.load_instrument_ids()
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+        logger.info(f"Serving metrics on port {METRICS_PORT} (/metrics)")
+    if JOURNAL_FILE:
+        journal.open_journal(JOURNAL_FILE)
+        logger.debug(f"Journaling trading cycles to {JOURNAL_FILE}")
+    if INDICATOR_STATE_FILE:
+        try:
+            logger.debug(f"Loaded indicator state for {indicator_state.load_indicator_states(INDICATOR_STATE_FILE)} stock(s)")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Error loading indicator state from {INDICATOR_STATE_FILE}: {e}")
 
+    profiles = load_profiles()
+    if len(profiles) > 0:
+        robinhood.activate_account(profiles[0]["username"])
+        profile_names = [f"{profile['name']} ({profile['config'].get('MODE', MODE)})" for profile in profiles]
+        logger.info(f"Running {len(profiles)} profile(s): {', '.join(profile_names)}")
+
+    # Robinhood sessions are renewed in the background, the first logins start right away (keep references to the tasks)
+    usernames = list(dict.fromkeys(profile["username"] for profile in profiles)) or [ROBINHOOD_USERNAME]
+    session_refreshers = [asyncio.create_task(robinhood.run_session_refresher(username=username)) for username in usernames]
+
+    last_full_cycle_at = None
     while True:
+        # Next cycle time is computed from the cycle start, so the cadence does not drift by the cycle duration
+        cycle_started_at = time.monotonic()
+        now = datetime.now(market_calendar.MARKET_TIMEZONE)
+        is_quiet_poll = False
         try:
-            # Check if Robinhood token needs refresh (refresh 5 minutes before expiry)
-            if time.time() >= robinhood_token_expiry - 300:
-                logger.info("Login to Robinhood...")
-                login_resp = await robinhood.login_to_robinhood()
-                if not login_resp or 'expires_in' not in login_resp:
-                    raise Exception("Failed to login to Robinhood")
-                robinhood_token_expiry = time.time() + login_resp['expires_in']
-                logger.info(f"Successfully logged in. Token expires in {login_resp['expires_in']} seconds")
-
-            if robinhood.is_market_open():
-                run_interval_seconds = RUN_INTERVAL_SECONDS
-                logger.info(f"Market is open, running trading bot in {MODE} mode...")
-
-                trading_results = trading_bot()
-
-                sold_stocks = [f"{result['symbol']} ({result['quantity']})" for result in trading_results.values() if result['decision'] == "sell" and result['result'] == "success"]
-                bought_stocks = [f"{result['symbol']} ({result['quantity']})" for result in trading_results.values() if result['decision'] == "buy" and result['result'] == "success"]
-                errors = [f"{result['symbol']} ({result['details']})" for result in trading_results.values() if result['result'] == "error"]
-                logger.info(f"Sold: {'None' if len(sold_stocks) == 0 else ', '.join(sold_stocks)}")
-                logger.info(f"Bought: {'None' if len(bought_stocks) == 0 else ', '.join(bought_stocks)}")
-                logger.info(f"Errors: {'None' if len(errors) == 0 else ', '.join(errors)}")
+            if market_calendar.is_market_open(now) and TRIGGER_MODE and not is_full_cycle_due(last_full_cycle_at, now):
+                # Trigger mode polls the latest prices between full cycles and analyzes only stocks that crossed a trigger
+                with metrics.stage("trigger_poll"):
+                    triggered = await run_with_session(poll_triggers)
+                if len(triggered) > 0:
+                    logger.info(f"Market is open, running trading bot for {len(triggered)} triggered stock(s) in {'/'.join(get_modes())} mode...")
+                    trading_results = await run_trading_cycle(profiles, list(triggered.keys()))
+                    record_cycle_metrics("success", cycle_started_at)
+                    log_trading_results(trading_results)
+                else:
+                    is_quiet_poll = True
+                next_run_at = market_calendar.get_next_cycle_time(now, TRIGGER_POLL_SECONDS, ALIGN_CYCLES_TO_CLOCK)
+            elif market_calendar.is_market_open(now):
+                logger.info(f"Market is open, running trading bot in {'/'.join(get_modes())} mode...")
+                triggers.reset()
+                trading_results = await run_trading_cycle(profiles)
+                last_full_cycle_at = now
+                record_cycle_metrics("success", cycle_started_at)
+                log_trading_results(trading_results)
+                next_run_at = market_calendar.get_next_cycle_time(now, TRIGGER_POLL_SECONDS if TRIGGER_MODE else RUN_INTERVAL_SECONDS, ALIGN_CYCLES_TO_CLOCK)
             else:
-                run_interval_seconds = 60
                 logger.info("Market is closed, waiting for next run...")
+                next_run_at = market_calendar.get_next_cycle_time(now, RUN_INTERVAL_SECONDS, ALIGN_CYCLES_TO_CLOCK)
         except Exception as e:
-            run_interval_seconds = 60
+            next_run_at = now + timedelta(seconds=60)
             logger.error(f"Trading bot error: {e}")
+            record_cycle_metrics("error", cycle_started_at)
+
+        if METRICS_FILE:
+            try:
+                metrics.write_metrics_file(METRICS_FILE)
+            except OSError as e:
+                logger.warning(f"Error writing metrics to {METRICS_FILE}: {e}")
+
+        # Log in and prefetch market data before the session opens, so the first cycle fires right at the open
+        if PRE_OPEN_WARMUP_SECONDS and market_calendar.is_session_open(next_run_at):
+            logger.info(f"Next session opens at {next_run_at.strftime('%Y-%m-%d %H:%M %Z')}, warming up {PRE_OPEN_WARMUP_SECONDS} seconds before")
+            await sleep_until(next_run_at - timedelta(seconds=PRE_OPEN_WARMUP_SECONDS))
+            try:
+                logger.info("Warming up before the market opens...")
+                if len(profiles) > 0:
+                    symbols = set()
+                    for profile in profiles:
+                        symbols.update(await run_for_profile(profile, warm_up, margin_seconds=300 + PRE_OPEN_WARMUP_SECONDS))
+                else:
+                    symbols = await run_with_session(warm_up, margin_seconds=300 + PRE_OPEN_WARMUP_SECONDS)
+                logger.info(f"Prefetched market data for {len(symbols)} stock(s)")
+            except Exception as e:
+                logger.error(f"Pre-open warm-up error: {e}")
 
-        logger.info(f"Waiting for {run_interval_seconds} seconds...")
-        time.sleep(run_interval_seconds)
+        await sleep_until(next_run_at, quiet=is_quiet_poll)
 
 
 # Run the main function
 if __name__ == '__main__':
-    confirm = input(f"Are you sure you want to run the bot in {MODE} mode? (yes/no): ")
+    logger.flush()
+    confirm = input(f"Are you sure you want to run the bot in {'/'.join(get_modes())} mode? (yes/no): ")
     if confirm.lower() != "yes":
         logger.warning("Exiting the bot...")
         exit()
@@ -0,0 +1,282 @@
+import base64
+import functools
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import types
+import robin_stocks.robinhood as rh
+
+from . import openai
+from ..utils import logger
+from ..utils import rate_limiter
+
+# robin_stocks functions called by the robinhood module (module, function name)
+RH_FUNCTIONS = [
+    (rh.profiles, "load_account_profile"),
+    (rh, "build_holdings"),
+    (rh, "get_watchlist_by_name"),
+    (rh.stocks, "get_ratings"),
+    (rh.stocks, "get_stock_historicals"),
+    (rh.stocks, "get_quotes"),
+    (rh.helper, "id_for_stock"),
+    (rh, "request_get"),
+    (rh.orders, "order_buy_market"),
+    (rh.orders, "order_sell_market"),
+]
+
+# Characters per chunk of replayed streamed AI responses
+AI_STREAM_CHUNK_SIZE = 16
+
+# Login response in replay mode (logins are never recorded, they contain tokens)
+REPLAY_LOGIN_RESPONSE = {"access_token": "replay", "token_type": "Bearer", "expires_in": 86400, "detail": "Replayed login"}
+
+# Record/replay state of Robinhood and LLM calls
+# Replayed calls can be slowed down and throttled to measure their cost without hitting the real APIs
+fixtures = {
+    "mode": None,
+    "responses": {},
+    "replay_positions": {},
+    "responder": None,
+    "ai_responder": None,
+    "rh_latency_seconds": 0.0,
+    "ai_latency_seconds": 0.0,
+    "throttle_rate": 0.0,
+    "retry_after_seconds": None,
+    "random": random.Random(0),
+    "stats": {"calls": 0, "recorded": 0, "replayed": 0, "generated": 0, "throttled": 0},
+}
+fixtures_lock = threading.Lock()
+
+# Original functions replaced by stand-ins ((module, function name) -> function)
+originals = {}
+
+
+# Encode a value for JSON (bytes, e.g. rating texts, are kept as base64)
+def encode_value(value):
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, dict):
+        return {key: encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    return value
+
+
+# Decode a value encoded by encode_value
+def decode_value(value):
+    if isinstance(value, dict):
+        if set(value.keys()) == {"__bytes__"}:
+            return base64.b64decode(value["__bytes__"])
+        return {key: decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    return value
+
+
+# Make a fixture key from a function name and its arguments
+def make_call_key(name, args, kwargs):
+    return json.dumps([name, encode_value(list(args)), encode_value(kwargs)], sort_keys=True, default=str)
+
+
+# Make a fixture key of an LLM request (the current time in the prompt is ignored, so recorded prompts match on replay)
+def make_ai_key(model, messages):
+    messages = [{**message, "content": re.sub(r"Today is [^\n]*", "", message["content"])} for message in messages]
+    return "chat.completions.create:" + hashlib.sha256(json.dumps([model, messages], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Update fixture stats
+def update_stats(**increments):
+    with fixtures_lock:
+        for key, value in increments.items():
+            fixtures["stats"][key] += value
+
+
+# Get fixture stats (calls, recorded, replayed, generated and throttled responses)
+def get_stats():
+    with fixtures_lock:
+        return dict(fixtures["stats"])
+
+
+# Store a recorded response
+def add_response(key, result):
+    with fixtures_lock:
+        fixtures["responses"].setdefault(key, []).append(encode_value(result))
+
+
+# Get the next replayed response (responses of a key are replayed in order, the last one repeats)
+def get_replay_response(key):
+    with fixtures_lock:
+        responses = fixtures["responses"].get(key)
+        if not responses:
+            return False, None
+        position = fixtures["replay_positions"].get(key, 0)
+        fixtures["replay_positions"][key] = position + 1
+        return True, decode_value(responses[min(position, len(responses) - 1)])
+
+
+# Simulate a replayed Robinhood request: rate limiter token, injected latency and throttling (returns True if throttled)
+def simulate_request():
+    wait_seconds = rate_limiter.acquire()
+    if fixtures["rh_latency_seconds"] > 0:
+        time.sleep(fixtures["rh_latency_seconds"])
+    with fixtures_lock:
+        is_throttled = fixtures["random"].random() < fixtures["throttle_rate"]
+    rate_limiter.track_response(429 if is_throttled else 200, wait_seconds, fixtures["retry_after_seconds"])
+    return is_throttled
+
+
+# Make a stand-in for a robin_stocks function (records real responses or replays them)
+def make_rh_stand_in(name, func):
+    @functools.wraps(func)
+    def stand_in(*args, **kwargs):
+        update_stats(calls=1)
+        key = make_call_key(name, args, kwargs)
+        if fixtures["mode"] == "record":
+            result = func(*args, **kwargs)
+            add_response(key, result)
+            update_stats(recorded=1)
+            return result
+
+        # Throttled robin_stocks calls return no data, same as the real functions on HTTP errors
+        if simulate_request():
+            update_stats(throttled=1)
+            return None
+        found, result = get_replay_response(key)
+        if found:
+            update_stats(replayed=1)
+            return result
+        if fixtures["responder"] is not None:
+            update_stats(generated=1)
+            return fixtures["responder"](name, args, kwargs)
+        raise Exception(f"No recorded response for {name} with arguments {args} {kwargs}")
+    return stand_in
+
+
+# Make a stand-in for client.chat.completions.create (records real responses or replays them)
+def make_ai_stand_in(func):
+    @functools.wraps(func)
+    def stand_in(model=None, messages=None, **kwargs):
+        update_stats(calls=1)
+        key = make_ai_key(model, messages)
+        if fixtures["mode"] == "record":
+            ai_response = func(model=model, messages=messages, **kwargs)
+            if kwargs.get("stream"):
+                return record_ai_stream(key, ai_response)
+            add_response(key, ai_response.choices[0].message.content)
+            update_stats(recorded=1)
+            return ai_response
+
+        if fixtures["ai_latency_seconds"] > 0:
+            time.sleep(fixtures["ai_latency_seconds"])
+        found, content = get_replay_response(key)
+        if found:
+            update_stats(replayed=1)
+        elif fixtures["ai_responder"] is not None:
+            update_stats(generated=1)
+            content = fixtures["ai_responder"](messages[-1]["content"])
+        else:
+            raise Exception(f"No recorded AI response for {key}")
+        if kwargs.get("stream"):
+            return make_ai_stream_chunks(content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+    return stand_in
+
+
+# Record a streamed AI response once it is complete (chunks are passed through as they arrive)
+def record_ai_stream(key, ai_stream):
+    content_chunks = []
+    for chunk in ai_stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            content_chunks.append(chunk.choices[0].delta.content)
+        yield chunk
+    add_response(key, "".join(content_chunks))
+    update_stats(recorded=1)
+
+
+# Split a replayed AI response into stream chunks
+def make_ai_stream_chunks(content, chunk_size=AI_STREAM_CHUNK_SIZE):
+    return [
+        types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=content[i:i + chunk_size]))], usage=None)
+        for i in range(0, len(content), chunk_size)
+    ]
+
+
+# Make a stand-in for rh.login (passes through when recording, never touches the network when replaying)
+def make_login_stand_in(func):
+    @functools.wraps(func)
+    def stand_in(*args, **kwargs):
+        if fixtures["mode"] == "record":
+            return func(*args, **kwargs)
+        return dict(REPLAY_LOGIN_RESPONSE)
+    return stand_in
+
+
+# Replace a module attribute with a stand-in (the original is kept for uninstall)
+def replace(module, name, make_stand_in):
+    if (module, name) not in originals:
+        originals[(module, name)] = getattr(module, name)
+    setattr(module, name, make_stand_in(originals[(module, name)]))
+
+
+# Install record/replay stand-ins for Robinhood and LLM calls
+# Unknown calls in replay mode are answered by the responders (name, args, kwargs -> result and prompt -> content) when given
+def install(mode, path=None, responder=None, ai_responder=None, rh_latency_seconds=0.0, ai_latency_seconds=0.0, throttle_rate=0.0, retry_after_seconds=None, seed=0):
+    if mode not in ("record", "replay"):
+        raise Exception(f"Unknown fixtures mode: {mode} (available: record, replay)")
+    fixtures.update({
+        "mode": mode,
+        "responses": load(path) if mode == "replay" and path else {},
+        "replay_positions": {},
+        "responder": responder,
+        "ai_responder": ai_responder,
+        "rh_latency_seconds": rh_latency_seconds,
+        "ai_latency_seconds": ai_latency_seconds,
+        "throttle_rate": throttle_rate,
+        "retry_after_seconds": retry_after_seconds,
+        "random": random.Random(seed),
+        "stats": {"calls": 0, "recorded": 0, "replayed": 0, "generated": 0, "throttled": 0},
+    })
+    for module, name in RH_FUNCTIONS:
+        replace(module, name, lambda func, name=name: make_rh_stand_in(name, func))
+    replace(rh, "login", make_login_stand_in)
+    replace(openai.client.chat.completions, "create", make_ai_stand_in)
+    logger.debug(f"Fixtures installed in {mode} mode ({sum(len(responses) for responses in fixtures['responses'].values())} recorded response(s))")
+
+
+# Restore the original Robinhood and LLM functions
+def uninstall():
+    for (module, name), func in originals.items():
+        setattr(module, name, func)
+    originals.clear()
+    fixtures["mode"] = None
+
+
+# Load recorded responses (JSON lines of fixture key and response)
+def load(path):
+    responses = {}
+    if not os.path.exists(path):
+        raise Exception(f"Fixtures file not found: {path}")
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                responses.setdefault(record["key"], []).append(record["response"])
+    return responses
+
+
+# Save recorded responses (atomically replaces the file)
+def save(path):
+    fixtures_dir = os.path.dirname(path)
+    if fixtures_dir:
+        os.makedirs(fixtures_dir, exist_ok=True)
+    with fixtures_lock:
+        records = [{"key": key, "response": response} for key, responses in fixtures["responses"].items() for response in responses]
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    os.replace(tmp_path, path)
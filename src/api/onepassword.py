@@ -4,26 +4,45 @@ from onepassword.client import Client
 from config import OP_SERVICE_ACCOUNT_NAME, OP_SERVICE_ACCOUNT_TOKEN, OP_VAULT_NAME, OP_ITEM_NAME
 from ..utils import logger
 
+# 1Password client (authenticated once and reused for every MFA code)
+op_client = {"client": None}
+
+
+# Get 1Password client (authenticated on first use)
+async def get_client():
+    if op_client["client"] is None:
+        logger.debug("Attempting to login to 1Password...")
 
-# Get MFA code from 1Password
-async def get_mfa_code_from_1password():
-    try:
-        logger.debug("Attempting to login to 1Password to get MFA code...")
-        
         # Create client with service account token
-        client = await Client.authenticate(
+        op_client["client"] = await Client.authenticate(
             auth=OP_SERVICE_ACCOUNT_TOKEN,
             integration_name=OP_SERVICE_ACCOUNT_NAME,
             integration_version="v1.0.0",
         )
-        
+    return op_client["client"]
+
+
+# Get MFA code from 1Password (of the item of the config by default)
+async def get_mfa_code_from_1password(item_name=OP_ITEM_NAME):
+    try:
+        logger.debug("Attempting to get MFA code from 1Password...")
+
         # Resolve the OTP secret using the op:// URI format
-        secret_reference = f"op://{OP_VAULT_NAME}/{OP_ITEM_NAME}/one-time password?attribute=otp"
-        mfa_code = await client.secrets.resolve(secret_reference)
-        
+        secret_reference = f"op://{OP_VAULT_NAME}/{item_name}/one-time password?attribute=otp"
+        client = await get_client()
+        try:
+            mfa_code = await client.secrets.resolve(secret_reference)
+        except Exception as e:
+            # The client session may have expired, so authenticate again once
+            logger.debug(f"Failed to resolve MFA code with the existing 1Password client, authenticating again: {e}")
+            op_client["client"] = None
+            client = await get_client()
+            mfa_code = await client.secrets.resolve(secret_reference)
+
         logger.debug("Successfully retrieved MFA code from 1Password")
         return mfa_code
-        
+
     except Exception as e:
+        op_client["client"] = None
         logger.error(f"Failed to get MFA code from 1Password: {e}")
-        return None
\ No newline at end of file
+        return None
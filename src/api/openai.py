@@ -1,6 +1,9 @@
 from openai import OpenAI
 import re
 import json
+from ..utils import logger
+from ..utils import metrics
+from ..utils import prompt
 from config import OPENAI_API_KEY, OPENAI_MODEL_NAME
 
 
@@ -12,14 +15,41 @@ client = OpenAI(
 
 
 # Make AI request to OpenAI API
-def make_ai_request(prompt):
-    ai_resp = client.chat.completions.create(
-        model=OPENAI_MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}]
-    )
+def make_ai_request(ai_prompt):
+    metrics.observe("trading_bot_ai_prompt_tokens", prompt.estimate_tokens(ai_prompt))
+    with metrics.span("trading_bot_ai_request_duration_seconds", model=OPENAI_MODEL_NAME):
+        ai_resp = client.chat.completions.create(
+            model=OPENAI_MODEL_NAME,
+            messages=[{"role": "user", "content": ai_prompt}]
+        )
+    record_usage(getattr(ai_resp, "usage", None))
     return ai_resp
 
 
+# Make streaming AI request to OpenAI API (yields content chunks as they arrive)
+def make_ai_stream_request(ai_prompt):
+    metrics.observe("trading_bot_ai_prompt_tokens", prompt.estimate_tokens(ai_prompt))
+    with metrics.span("trading_bot_ai_request_duration_seconds", model=OPENAI_MODEL_NAME):
+        ai_stream = client.chat.completions.create(
+            model=OPENAI_MODEL_NAME,
+            messages=[{"role": "user", "content": ai_prompt}],
+            stream=True,
+            # Usage is only reported in streams when asked for, in a last chunk without choices
+            stream_options={"include_usage": True},
+        )
+        for chunk in ai_stream:
+            record_usage(getattr(chunk, "usage", None))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+# Record token usage reported by the API (not all OpenAI-compatible endpoints report it)
+def record_usage(usage):
+    if usage is not None:
+        metrics.increment("trading_bot_ai_tokens_total", getattr(usage, "prompt_tokens", 0) or 0, kind="prompt")
+        metrics.increment("trading_bot_ai_tokens_total", getattr(usage, "completion_tokens", 0) or 0, kind="completion")
+
+
 # Parse AI response
 def parse_ai_response(ai_response):
     try:
@@ -28,3 +58,75 @@ def parse_ai_response(ai_response):
     except json.JSONDecodeError:
         raise Exception("Invalid JSON response from OpenAI: " + ai_response.choices[0].message.content.strip())
     return decisions
+
+
+# Parse streamed AI response incrementally (yields each object of the JSON array as soon as it closes)
+# Content chunks are added to content_chunks (if given); objects parsed before a truncated or malformed part of the response are kept,
+# the exception comes after them
+def parse_ai_response_stream(chunks, content_chunks=None):
+    buffer = ""
+    position = 0
+    object_start = None
+    depth = 0
+    in_string = False
+    is_escaped = False
+    is_array_open = False
+    is_array_closed = False
+    parsed_count = 0
+    errors = []
+
+    for chunk in chunks:
+        if content_chunks is not None:
+            content_chunks.append(chunk)
+        buffer += chunk
+        while position < len(buffer) and not is_array_closed:
+            char = buffer[position]
+            if object_start is not None:
+                # Inside an object, track strings and nesting until its closing brace
+                if in_string:
+                    if is_escaped:
+                        is_escaped = False
+                    elif char == "\\":
+                        is_escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"':
+                    in_string = True
+                elif char == "{":
+                    depth += 1
+                elif char == "}":
+                    depth -= 1
+                    if depth == 0:
+                        object_text = buffer[object_start:position + 1]
+                        object_start = None
+                        try:
+                            decision = json.loads(object_text)
+                        except json.JSONDecodeError as e:
+                            logger.warning(f"Skipping malformed object in streamed response from OpenAI: {object_text} ({e})")
+                            errors.append(object_text)
+                        else:
+                            parsed_count += 1
+                            yield decision
+            elif not is_array_open:
+                # Text before the array (e.g. a ```json fence) is ignored
+                is_array_open = char == "["
+            elif char == "{":
+                object_start = position
+                depth = 1
+            elif char == "]":
+                is_array_closed = True
+            position += 1
+
+        # Drop parsed text, only an unfinished object has to be kept
+        keep_from = position if object_start is None else object_start
+        buffer = buffer[keep_from:]
+        position -= keep_from
+        if object_start is not None:
+            object_start = 0
+
+    if not is_array_open:
+        raise Exception("Invalid JSON response from OpenAI: no JSON array in the response")
+    if not is_array_closed:
+        raise Exception(f"Truncated JSON response from OpenAI after {parsed_count} object(s): {buffer.strip()[:200]}")
+    if len(errors) > 0:
+        raise Exception(f"Invalid JSON response from OpenAI: skipped {len(errors)} malformed object(s), parsed {parsed_count}")
@@ -1,36 +1,199 @@
 import robin_stocks.robinhood as rh
 import robin_stocks.urls as rh_urls
+import requests
+import asyncio
+import functools
+import json
+import os
+import re
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
-from pytz import timezone
-import pandas as pd
 
 from . import onepassword
 from ..utils import auth
+from ..utils import candles
+from ..utils import indicators
 from ..utils import logger
-from config import MODE, ROBINHOOD_USERNAME, ROBINHOOD_PASSWORD
+from ..utils import market_calendar
+from ..utils import metrics
+from ..utils import rate_limiter
+from config import MODE, ROBINHOOD_USERNAME, ROBINHOOD_PASSWORD, ROBINHOOD_MFA_SECRET
+from config import CANDLES_CACHE_DIR, CANDLES_CACHE_FULL_REFRESH_DAYS
+from config import RATINGS_CACHE_TTL_SECONDS, WATCHLIST_CACHE_TTL_SECONDS, INSTRUMENT_IDS_CACHE_FILE
+from config import RH_REQUESTS_PER_SECOND, RH_REQUESTS_BURST, RH_CALL_DEADLINE_SECONDS, SESSION_REFRESH_MARGIN_SECONDS
 from config import OP_SERVICE_ACCOUNT_NAME, OP_SERVICE_ACCOUNT_TOKEN, OP_VAULT_NAME, OP_ITEM_NAME
 
+# Account info per Robinhood account (username -> account URL)
 account_info_cache = {}
+cache_registry = {}
+
+# Robinhood accounts (username -> credentials), profiles can add accounts besides the one of the config
+accounts = {ROBINHOOD_USERNAME: {"password": ROBINHOOD_PASSWORD, "mfa_secret": ROBINHOOD_MFA_SECRET, "op_item_name": OP_ITEM_NAME, "pickle_name": ""}}
+
+# Account the shared robin_stocks session is authorized for (switched with session_lock held when several accounts are used)
+active_account = {"username": ROBINHOOD_USERNAME}
+
+# Robinhood sessions (username -> login response, token expiry time and authorization header), a session is replaced as a whole when it is renewed
+session_states = {}
+session_lock = asyncio.Lock()
+# Logins take turns (MFA and rh.login run under this lock only, cycles keep running on the current token meanwhile)
+login_lock = asyncio.Lock()
+endpoint_metrics = {}
+endpoint_metrics_lock = threading.Lock()
+
+# Max number of symbols per batched request
+HISTORICALS_BATCH_SIZE = 50
+QUOTES_BATCH_SIZE = 50
+RATINGS_BATCH_SIZE = 20
+
+# Time window covered by the year-span daily historical data
+YEAR_SPAN_SECONDS = 365 * 24 * 60 * 60
+
+# Ratings endpoint accepting a comma-separated list of instrument IDs
+RATINGS_BATCH_URL = "https://api.robinhood.com/midlands/ratings/"
+
+# Max number of entries per cached function
+CACHE_MAX_SIZE = 1024
+
+# Exponential backoff between retries of throttled or failed Robinhood calls
+RH_RETRY_BASE_DELAY_SECONDS = 2
+RH_RETRY_MAX_DELAY_SECONDS = 60
+
+
+# Make a cache key from function arguments
+def make_cache_key(*args, **kwargs):
+    return args, tuple(sorted(kwargs.items()))
+
+
+# Cache function results with time-to-live and least-recently-used eviction (None results are not cached)
+def ttl_cache(ttl_seconds=None, max_size=CACHE_MAX_SIZE):
+    def decorator(func):
+        entries = OrderedDict()
+        lock = threading.Lock()
+        stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+        def cache_get(key):
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and (ttl_seconds is None or time.monotonic() - entry[1] < ttl_seconds):
+                    entries.move_to_end(key)
+                    stats["hits"] += 1
+                    return True, entry[0]
+                if entry is not None:
+                    del entries[key]
+                stats["misses"] += 1
+                return False, None
+
+        def cache_put(key, value):
+            if value is None:
+                return
+            with lock:
+                entries[key] = (value, time.monotonic())
+                entries.move_to_end(key)
+                while len(entries) > max_size:
+                    entries.popitem(last=False)
+                    stats["evictions"] += 1
+
+        def cache_items():
+            with lock:
+                return [(key, entry[0]) for key, entry in entries.items()]
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_cache_key(*args, **kwargs)
+            found, value = cache_get(key)
+            if found:
+                return value
+            value = func(*args, **kwargs)
+            cache_put(key, value)
+            return value
+
+        wrapper.cache_get = cache_get
+        wrapper.cache_put = cache_put
+        wrapper.cache_items = cache_items
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_stats = stats
+        cache_registry[func.__name__] = wrapper
+        return wrapper
+    return decorator
+
+
+# Get hit/miss counters of all cached functions
+def get_cache_stats():
+    return {name: {**wrapper.cache_stats, "size": len(wrapper.cache_items())} for name, wrapper in cache_registry.items()}
+
+# Rate limit all requests made through the robin_stocks session
+rate_limiter.configure(RH_REQUESTS_PER_SECOND, RH_REQUESTS_BURST)
+rate_limiter.install(rh.helper.SESSION)
+
+
+# Add a Robinhood account (each account keeps its login in its own robin_stocks session file)
+def add_account(username, password, mfa_secret="", op_item_name=""):
+    if username not in accounts:
+        accounts[username] = {"password": password, "mfa_secret": mfa_secret, "op_item_name": op_item_name, "pickle_name": "_" + re.sub(r"[^A-Za-z0-9]+", "_", username)}
+    return username
+
+
+# Get robin_stocks session file of an account (the pickled token, written when a token is issued)
+def get_session_file(username):
+    return os.path.join(os.path.expanduser("~"), ".tokens", f"robinhood{accounts[username]['pickle_name']}.pickle")
+
+
+# Get session of a Robinhood account (of the active account by default)
+def get_session_state(username=None):
+    return session_states.get(username or active_account["username"], {"login_resp": None, "expires_at": 0, "authorization": None})
+
+
+# Authorize the shared robin_stocks session for an account (call with session_lock held when several accounts are used)
+def activate_account(username):
+    active_account["username"] = username
+    session_state = get_session_state(username)
+    if session_state["authorization"] and time.time() < session_state["expires_at"]:
+        rh.helper.update_session('Authorization', session_state["authorization"])
+        rh.helper.set_login_state(True)
+
+
+# Log in with robin_stocks without authorizing the shared session (blocking, call with login_lock held)
+# rh.login puts the new token straight into the shared session headers, which a cycle of another account may be using,
+# so its header updates are kept aside (the token is swapped in later with session_lock held)
+def login_without_session(*args, **kwargs):
+    update_session = rh.authentication.update_session
+    rh.authentication.update_session = lambda key, value: None
+    try:
+        return rh.login(*args, **kwargs)
+    finally:
+        rh.authentication.update_session = update_session
+
 
 # Main login function that orchestrates the login process
-async def login_to_robinhood():
+# With authorize_session=False the shared session is left untouched (the pickled token is not reused, it is checked through that session)
+async def login_to_robinhood(username=ROBINHOOD_USERNAME, authorize_session=True):
     try:
+        credentials = accounts[username]
+
         # Try to get MFA code from secret first
-        mfa_code = auth.get_mfa_code_from_secret()
+        mfa_code = auth.get_mfa_code_from_secret(credentials["mfa_secret"])
 
         # If no MFA secret, try 1Password
-        if not mfa_code and OP_SERVICE_ACCOUNT_NAME and OP_SERVICE_ACCOUNT_TOKEN and OP_VAULT_NAME and OP_ITEM_NAME:
-            mfa_code = await onepassword.get_mfa_code_from_1password()
+        if not mfa_code and OP_SERVICE_ACCOUNT_NAME and OP_SERVICE_ACCOUNT_TOKEN and OP_VAULT_NAME and credentials["op_item_name"]:
+            mfa_code = await onepassword.get_mfa_code_from_1password(credentials["op_item_name"])
 
         try:
+            # Login makes blocking network calls, so run it in a worker thread to keep the event loop free
+            login = rh.login if authorize_session else login_without_session
             if mfa_code:
                 logger.debug("Attempting to login to Robinhood with MFA...")
-                login_resp = rh.login(ROBINHOOD_USERNAME, ROBINHOOD_PASSWORD, mfa_code=mfa_code)
+                login_resp = await asyncio.to_thread(login, username, credentials["password"], mfa_code=mfa_code, pickle_name=credentials["pickle_name"])
                 logger.debug("Robinhood login successful with MFA.")
             else:
                 logger.debug("Attempting to login to Robinhood without MFA...")
-                login_resp = rh.login(ROBINHOOD_USERNAME, ROBINHOOD_PASSWORD)
+                login_resp = await asyncio.to_thread(login, username, credentials["password"], pickle_name=credentials["pickle_name"])
                 logger.debug("Robinhood login successful without MFA.")
             if not login_resp:
                 raise Exception("Login failed - no response received")
@@ -44,29 +207,160 @@ async def login_to_robinhood():
         return None
 
 
-# Run a Robinhood function with retries and delay between attempts (to handle rate limits)
-def rh_run_with_retries(func, *args, max_retries=3, delay=60, **kwargs):
+# Log in to a Robinhood account and swap in its new session (call with login_lock held)
+# Renewals remove the pickled token of robin_stocks so that rh.login issues a new one, and log in outside session_lock:
+# cycles keep running on the current token and wait only for the swap
+# The first login may reuse the pickled token, robin_stocks checks it through the shared session, so it holds session_lock
+# (no cycle of the account can run before it anyway)
+async def renew_session(username=None):
+    username = username or active_account["username"]
+    session_file = get_session_file(username)
+    is_renewal = username in session_states
+    if is_renewal and os.path.exists(session_file):
+        os.remove(session_file)
+
+    logger.info(f"Login to Robinhood{f' as {username}' if len(accounts) > 1 else ''}...")
+    with metrics.stage("login"):
+        if is_renewal:
+            login_resp = await login_to_robinhood(username, authorize_session=False)
+        else:
+            async with session_lock:
+                login_resp = await login_to_robinhood(username)
+                # robin_stocks authorized the shared session for this account, restore the active one (also after a failed login)
+                activate_account(active_account["username"])
+    is_logged_in = login_resp and 'expires_in' in login_resp
+    async with session_lock:
+        if is_logged_in:
+            # A reused pickled token was issued when its file was written, not now (robin_stocks reports the full lifetime for it)
+            issued_at = os.path.getmtime(session_file) if os.path.exists(session_file) else time.time()
+            authorization = f"{login_resp['token_type']} {login_resp['access_token']}" if 'access_token' in login_resp else None
+            session_states[username] = {"login_resp": login_resp, "expires_at": issued_at + login_resp['expires_in'], "authorization": authorization}
+        activate_account(active_account["username"])
+    if not is_logged_in:
+        raise Exception("Failed to login to Robinhood")
+    logger.info(f"Successfully logged in. Token expires in {int(session_states[username]['expires_at'] - time.time())} seconds")
+    return login_resp
+
+
+# Check if the Robinhood session of an account stays valid for a margin of time
+def is_session_valid(margin_seconds=0, username=None):
+    return time.time() < get_session_state(username)["expires_at"] - margin_seconds
+
+
+# Make sure the Robinhood session of an account stays valid for a margin of time (waits for a login in progress, logs in only if it failed)
+async def ensure_session(margin_seconds=300, username=None):
+    if is_session_valid(margin_seconds, username):
+        return
+    async with login_lock:
+        if not is_session_valid(margin_seconds, username):
+            await renew_session(username)
+
+
+# Renew the Robinhood session of an account in the background ahead of its expiry
+# Cycles wait only for the new token to be swapped in, never on MFA or the login itself
+async def run_session_refresher(retry_seconds=60, username=None):
+    username = username or active_account["username"]
+    while True:
+        wait_seconds = get_session_state(username)["expires_at"] - SESSION_REFRESH_MARGIN_SECONDS - time.time()
+        if wait_seconds > 0:
+            await asyncio.sleep(min(wait_seconds, 3600))
+            continue
+        try:
+            async with login_lock:
+                if not is_session_valid(SESSION_REFRESH_MARGIN_SECONDS, username):
+                    await renew_session(username)
+        except Exception as e:
+            logger.error(f"Error renewing Robinhood session, retrying in {retry_seconds} seconds: {e}")
+            await asyncio.sleep(retry_seconds)
+
+
+# Run a Robinhood function with retries and backoff between attempts (to handle rate limits)
+# Blocking: call it from worker threads (main loop runs trading_bot via asyncio.to_thread)
+# Empty results are retried only when the API throttled the call or failed, otherwise they mean "no data"
+def rh_run_with_retries(func, *args, max_retries=3, deadline_seconds=None, **kwargs):
+    with metrics.span("trading_bot_robinhood_call_duration_seconds", function=func.__name__):
+        return run_with_retries(func, *args, max_retries=max_retries, deadline_seconds=deadline_seconds, **kwargs)
+
+
+# Run a Robinhood function with retries (see rh_run_with_retries)
+def run_with_retries(func, *args, max_retries=3, deadline_seconds=None, **kwargs):
+    deadline_seconds = RH_CALL_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+    started_at = time.monotonic()
+    endpoint = get_endpoint_metrics(func.__name__)
+    result = None
     for attempt in range(max_retries):
-        result = func(*args, **kwargs)
-        msg = f"Function: {func.__name__}, Parameters: {args}, Attempt: {attempt + 1}/{max_retries}, Result: {result}"
-        msg = msg[:1000] + '...' if len(msg) > 1000 else msg
-        logger.debug(msg)
-        if result is not None:
+        error = None
+        rate_limiter.begin_call()
+        try:
+            result = func(*args, **kwargs)
+        except requests.exceptions.RequestException as e:
+            result = None
+            error = e
+        statuses, wait_seconds, retry_after = rate_limiter.end_call()
+        update_endpoint_metrics(endpoint, calls=1, retries=1 if attempt > 0 else 0, wait_seconds=wait_seconds)
+        if attempt > 0:
+            metrics.increment("trading_bot_robinhood_retries_total", function=func.__name__)
+
+        if logger.is_enabled("DEBUG"):
+            msg = f"Function: {func.__name__}, Parameters: {args}, Attempt: {attempt + 1}/{max_retries}, Result: {result}"
+            logger.debug(msg[:1000] + '...' if len(msg) > 1000 else msg)
+
+        is_throttled = 429 in statuses
+        is_failed = error is not None or any(status >= 500 for status in statuses)
+        if result is not None and result != [None]:
+            return result
+        if not is_throttled and not is_failed:
+            update_endpoint_metrics(endpoint, no_data=1)
             return result
-        logger.debug(f"Function: {func.__name__}, Parameters: {args}, Retrying in {delay} seconds...")
+        update_endpoint_metrics(endpoint, throttled=1 if is_throttled else 0, errors=1 if is_failed else 0)
+        if is_throttled:
+            metrics.increment("trading_bot_robinhood_throttled_total", function=func.__name__)
+        if is_failed:
+            metrics.increment("trading_bot_robinhood_errors_total", function=func.__name__)
+
+        if attempt + 1 >= max_retries:
+            break
+        delay = rate_limiter.get_backoff_delay(attempt, RH_RETRY_BASE_DELAY_SECONDS, RH_RETRY_MAX_DELAY_SECONDS, retry_after)
+        if time.monotonic() - started_at + delay > deadline_seconds:
+            logger.debug(f"Function: {func.__name__}, Parameters: {args}, Deadline of {deadline_seconds} seconds reached")
+            break
+        logger.debug(f"Function: {func.__name__}, Parameters: {args}, {'Throttled' if is_throttled else 'Failed'}, Retrying in {delay:.1f} seconds...")
         time.sleep(delay)
-    return None
+        update_endpoint_metrics(endpoint, wait_seconds=delay)
+
+    if error is not None:
+        raise error
+    return None if result == [None] else result
+
+
+# Get metrics of a Robinhood endpoint (created on first use)
+def get_endpoint_metrics(name):
+    with endpoint_metrics_lock:
+        return endpoint_metrics.setdefault(name, {"calls": 0, "retries": 0, "throttled": 0, "errors": 0, "no_data": 0, "wait_seconds": 0.0})
 
 
-# Check if the market is open
+# Update metrics of a Robinhood endpoint
+def update_endpoint_metrics(endpoint, **increments):
+    with endpoint_metrics_lock:
+        for key, value in increments.items():
+            endpoint[key] += value
+
+
+# Get metrics of all Robinhood endpoints (calls, retries, throttled calls, wait time, ...)
+def get_api_metrics():
+    with endpoint_metrics_lock:
+        return {name: dict(endpoint) for name, endpoint in endpoint_metrics.items()}
+
+
+# Check if the market is open (exchange holidays and early closes are taken into account)
 def is_market_open():
-    eastern = timezone('US/Eastern')
-    now = datetime.now(eastern)
-    if now.weekday() >= 5:
-        return False
-    market_open = now.replace(hour=9, minute=30, second=0, microsecond=0)
-    market_close = now.replace(hour=16, minute=0, second=0, microsecond=0)
-    return market_open <= now <= market_close
+    return market_calendar.is_market_open(datetime.now(market_calendar.MARKET_TIMEZONE))
+
+
+# Split items into chunks of a given size
+def chunk_list(items, size):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
 
 
 # Round money
@@ -119,21 +413,12 @@ def extract_buy_response_data(buy_resp):
 
 # Enrich stock data with Relative strength index (RSI)
 def enrich_with_rsi(stock_data, historical_data, symbol):
-    if len(historical_data) < 14:
+    if len(historical_data) < indicators.RSI_WINDOW:
         logger.debug(f"Not enough data to calculate RSI for {symbol}")
         return stock_data
 
-    prices = [round_money(day['close_price']) for day in historical_data]
-    delta = pd.Series(prices).diff()
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
-    avg_gain = gain.rolling(window=14).mean().iloc[-1]
-    avg_loss = loss.rolling(window=14).mean().iloc[-1]
-    if avg_loss == 0:
-        rs = 100
-    else:
-        rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
+    prices = indicators.historical_data_to_arrays(historical_data)["rounded_close"]
+    rsi = indicators.compute_rsi_batch([prices])[0]
     stock_data["rsi"] = round(float(rsi), 2)
     return stock_data
 
@@ -144,43 +429,44 @@ def enrich_with_vwap(stock_data, historical_data, symbol):
         logger.debug(f"Not enough data to calculate VWAP for {symbol}")
         return stock_data
 
-    stock_history_df = pd.DataFrame(historical_data)
-    stock_history_df["close_price"] = pd.to_numeric(stock_history_df["close_price"], errors="coerce")
-    stock_history_df["high_price"] = pd.to_numeric(stock_history_df["high_price"], errors="coerce")
-    stock_history_df["low_price"] = pd.to_numeric(stock_history_df["low_price"], errors="coerce")
-    stock_history_df["volume"] = pd.to_numeric(stock_history_df["volume"], errors="coerce")
-
-    # Drop rows where volume is zero or NaN
-    stock_history_df = stock_history_df[stock_history_df["volume"] > 0]
-
-    # Compute the Typical Price
-    stock_history_df["typical_price"] = (stock_history_df["high_price"] + stock_history_df["low_price"] + stock_history_df["close_price"]) / 3
-
-    # Compute VWAP
-    sum_of_volumes = stock_history_df["volume"].sum()
-    dot_product = stock_history_df["volume"].dot(stock_history_df["typical_price"])
-
-    if sum_of_volumes == 0:  # Prevent division by zero
+    vwaps, total_volumes = indicators.compute_vwap_batch([indicators.historical_data_to_arrays(historical_data)])
+    if total_volumes[0] == 0:  # Prevent division by zero
         logger.debug(f"Total volume is zero for {symbol}, cannot compute VWAP")
         return stock_data
 
-    vwap = dot_product / sum_of_volumes
-    stock_data["vwap"] = round_money(vwap)
-
+    stock_data["vwap"] = round_money(vwaps[0])
     return stock_data
 
 
 # Enrich stock data with Moving average (MA)
 def enrich_with_moving_averages(stock_data, historical_data, symbol):
-    if len(historical_data) < 200:
+    if len(historical_data) < indicators.LONG_MOVING_AVERAGE_WINDOW:
         logger.debug(f"Not enough data to calculate moving averages for {symbol}")
         return stock_data
 
-    prices = [round_money(day['close_price']) for day in historical_data]
-    moving_avg_50 = pd.Series(prices).rolling(window=50).mean().iloc[-1]
-    moving_avg_200 = pd.Series(prices).rolling(window=200).mean().iloc[-1]
-    stock_data["50_day_mavg_price"] = round_money(moving_avg_50)
-    stock_data["200_day_mavg_price"] = round_money(moving_avg_200)
+    prices = indicators.historical_data_to_arrays(historical_data)["rounded_close"]
+    stock_data["50_day_mavg_price"] = round_money(indicators.compute_moving_average_batch([prices], indicators.SHORT_MOVING_AVERAGE_WINDOW)[0])
+    stock_data["200_day_mavg_price"] = round_money(indicators.compute_moving_average_batch([prices], indicators.LONG_MOVING_AVERAGE_WINDOW)[0])
+    return stock_data
+
+
+# Enrich stock data with RSI, VWAP and moving averages precomputed by indicators.compute_indicators_batch
+def enrich_with_indicators(stock_data, stock_indicators, symbol):
+    if "rsi" in stock_indicators:
+        stock_data["rsi"] = round(stock_indicators["rsi"], 2)
+    else:
+        logger.debug(f"Not enough data to calculate RSI for {symbol}")
+
+    if "vwap" in stock_indicators:
+        stock_data["vwap"] = round_money(stock_indicators["vwap"])
+    else:
+        logger.debug(f"Not enough data to calculate VWAP for {symbol}")
+
+    if "short_moving_average" in stock_indicators:
+        stock_data["50_day_mavg_price"] = round_money(stock_indicators["short_moving_average"])
+        stock_data["200_day_mavg_price"] = round_money(stock_indicators["long_moving_average"])
+    else:
+        logger.debug(f"Not enough data to calculate moving averages for {symbol}")
     return stock_data
 
 
@@ -195,10 +481,53 @@ def enrich_with_analyst_ratings(stock_data, ratings_data):
     return stock_data
 
 
+# Get instrument ID for a stock by symbol (instrument IDs never change)
+@ttl_cache(ttl_seconds=None, max_size=CACHE_MAX_SIZE * 4)
+def get_instrument_id(symbol):
+    instrument_id = rh_run_with_retries(rh.helper.id_for_stock, symbol)
+    if instrument_id is not None:
+        save_instrument_ids({symbol: instrument_id})
+    return instrument_id
+
+
+# Load persisted instrument IDs into the cache
+def load_instrument_ids():
+    if not INSTRUMENT_IDS_CACHE_FILE or not os.path.exists(INSTRUMENT_IDS_CACHE_FILE):
+        return
+    try:
+        with open(INSTRUMENT_IDS_CACHE_FILE) as f:
+            instrument_ids = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Error loading instrument IDs from {INSTRUMENT_IDS_CACHE_FILE}: {e}")
+        return
+    for symbol, instrument_id in instrument_ids.items():
+        get_instrument_id.cache_put(make_cache_key(symbol), instrument_id)
+    logger.debug(f"Loaded {len(instrument_ids)} instrument ID(s) from {INSTRUMENT_IDS_CACHE_FILE}")
+
+
+# Persist instrument IDs (new IDs are added to the cache and merged into the file)
+def save_instrument_ids(instrument_ids):
+    for symbol, instrument_id in instrument_ids.items():
+        get_instrument_id.cache_put(make_cache_key(symbol), instrument_id)
+    if not INSTRUMENT_IDS_CACHE_FILE:
+        return
+    try:
+        cache_dir = os.path.dirname(INSTRUMENT_IDS_CACHE_FILE)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        all_instrument_ids = {key[0][0]: instrument_id for key, instrument_id in get_instrument_id.cache_items()}
+        tmp_path = f"{INSTRUMENT_IDS_CACHE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(all_instrument_ids, f)
+        os.replace(tmp_path, INSTRUMENT_IDS_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"Error saving instrument IDs to {INSTRUMENT_IDS_CACHE_FILE}: {e}")
+
+
 # Get PDT restrictions for a stock by symbol
 def get_stock_day_trade_checks(symbol):
-    stock_id = rh_run_with_retries(rh.helper.id_for_stock, symbol)
-    url = account_info_cache["url"] + 'day_trade_checks'
+    stock_id = get_instrument_id(symbol)
+    url = account_info_cache[active_account["username"]]["url"] + 'day_trade_checks'
     params = {
         "instrument": rh_urls.instruments() + stock_id + "/"
     }
@@ -206,14 +535,24 @@ def get_stock_day_trade_checks(symbol):
     return resp
 
 
-# Enrich stock data with PDT restrictions
-def enrich_with_pdt_restrictions(stock_data, symbol):
+# Get PDT restriction flags of a stock by symbol ((is_buy_pdt_restricted, is_sell_pdt_restricted), None if the check failed)
+def get_stock_pdt_flags(symbol):
     day_trade_checks = get_stock_day_trade_checks(symbol)
     if day_trade_checks is None:
+        return None
+    return (
+        day_trade_checks['buy'] is not None or day_trade_checks['buy_extended'] is not None,
+        day_trade_checks['sell'] is not None or day_trade_checks['sell_extended'] is not None,
+    )
+
+
+# Enrich stock data with PDT restrictions
+def enrich_with_pdt_restrictions(stock_data, symbol):
+    pdt_flags = get_stock_pdt_flags(symbol)
+    if pdt_flags is None:
         return stock_data
 
-    stock_data["is_buy_pdt_restricted"] = day_trade_checks['buy'] is not None or day_trade_checks['buy_extended'] is not None
-    stock_data["is_sell_pdt_restricted"] = day_trade_checks['sell'] is not None or day_trade_checks['sell_extended'] is not None
+    stock_data["is_buy_pdt_restricted"], stock_data["is_sell_pdt_restricted"] = pdt_flags
     return stock_data
 
 
@@ -224,7 +563,7 @@ def get_account_info():
         raise Exception("Error getting profile data: No response")
 
     resp["buying_power"] = round_money(resp["buying_power"])
-    account_info_cache["url"] = resp["url"]
+    account_info_cache.setdefault(active_account["username"], {})["url"] = resp["url"]
     return resp
 
 # Get portfolio stocks
@@ -235,8 +574,14 @@ def get_portfolio_stocks():
     return resp
 
 
-# Get watchlist stocks by name
+# Get watchlist stocks by name (watchlists of the active account)
 def get_watchlist_stocks(name):
+    return get_account_watchlist_stocks(active_account["username"], name)
+
+
+# Get watchlist stocks of an account by name
+@ttl_cache(ttl_seconds=WATCHLIST_CACHE_TTL_SECONDS)
+def get_account_watchlist_stocks(username, name):
     resp = rh_run_with_retries(rh.get_watchlist_by_name, name)
     if resp is None or 'results' not in resp:
         raise Exception(f"Error getting watchlist {name}: No response")
@@ -244,6 +589,7 @@ def get_watchlist_stocks(name):
 
 
 # Get analyst ratings for a stock by symbol
+@ttl_cache(ttl_seconds=RATINGS_CACHE_TTL_SECONDS)
 def get_ratings(symbol):
     resp = rh_run_with_retries(rh.stocks.get_ratings, symbol)
     if resp is None:
@@ -259,17 +605,142 @@ def get_historical_data(symbol, interval="day", span="year"):
     return resp
 
 
+# Get historical stock data for multiple symbols (symbol -> historical data)
+def get_historical_data_batch(symbols, interval="day", span="year"):
+    historical_data = {symbol: [] for symbol in symbols}
+    for symbols_chunk in chunk_list(historical_data.keys(), HISTORICALS_BATCH_SIZE):
+        resp = rh_run_with_retries(rh.stocks.get_stock_historicals, symbols_chunk, interval=interval, span=span)
+        if resp is None:
+            raise Exception(f"Error getting historical data for {', '.join(symbols_chunk)}: No response")
+        for item in resp:
+            if item is not None and item.get('symbol') in historical_data:
+                historical_data[item['symbol']].append(item)
+    return historical_data
+
+
+# Get year-span daily historical data for multiple symbols (symbol -> historical data)
+# Cached symbols are served from the local candle cache and only the missing tail is fetched
+def get_daily_historical_data_batch(symbols, force_refresh=False):
+    if not CANDLES_CACHE_DIR:
+        return get_historical_data_batch(symbols, interval="day", span="year")
+
+    index = candles.load_index(CANDLES_CACHE_DIR)
+    cached_candles = {}
+    if not force_refresh:
+        for symbol in symbols:
+            if candles.is_full_refresh_needed(index.get(symbol), CANDLES_CACHE_FULL_REFRESH_DAYS * 24 * 60 * 60):
+                continue
+            symbol_candles = candles.load_candles(CANDLES_CACHE_DIR, symbol)
+            if symbol_candles is not None and len(symbol_candles) > 0:
+                cached_candles[symbol] = symbol_candles
+
+    historical_data = {}
+    if len(cached_candles) > 0:
+        tail_data = get_historical_data_batch(cached_candles.keys(), interval="day", span="week")
+        for symbol, symbol_candles in cached_candles.items():
+            merged_candles = candles.merge_candles(symbol_candles, candles.historical_data_to_candles(tail_data[symbol]), YEAR_SPAN_SECONDS)
+            if merged_candles is None:
+                logger.debug(f"Cached daily candles for {symbol} do not overlap the latest data, full refresh needed")
+                continue
+            candles.save_candles(CANDLES_CACHE_DIR, symbol, merged_candles)
+            historical_data[symbol] = candles.candles_to_historical_data(merged_candles, symbol)
+
+    refresh_symbols = [symbol for symbol in symbols if symbol not in historical_data]
+    if len(refresh_symbols) > 0:
+        logger.debug(f"Full refresh of daily candles for {len(refresh_symbols)} stock(s)")
+        full_data = get_historical_data_batch(refresh_symbols, interval="day", span="year")
+        refreshed_at = time.time()
+        for symbol in refresh_symbols:
+            historical_data[symbol] = full_data[symbol]
+            if len(full_data[symbol]) > 0:
+                candles.save_candles(CANDLES_CACHE_DIR, symbol, candles.historical_data_to_candles(full_data[symbol]))
+                index[symbol] = {"full_refresh_at": refreshed_at}
+        candles.save_index(CANDLES_CACHE_DIR, index)
+
+    logger.debug(f"Daily candles served from cache for {len(symbols) - len(refresh_symbols)}/{len(symbols)} stock(s)")
+    return {symbol: historical_data[symbol] for symbol in symbols}
+
+
+# Get instrument IDs for multiple symbols (symbol -> instrument ID)
+def get_instrument_ids_batch(symbols):
+    instrument_ids = {}
+    for symbol in symbols:
+        found, instrument_id = get_instrument_id.cache_get(make_cache_key(symbol))
+        if found:
+            instrument_ids[symbol] = instrument_id
+
+    fetched_instrument_ids = {}
+    for symbols_chunk in chunk_list([symbol for symbol in symbols if symbol not in instrument_ids], QUOTES_BATCH_SIZE):
+        resp = rh_run_with_retries(rh.stocks.get_quotes, symbols_chunk)
+        if resp is None:
+            raise Exception(f"Error getting quotes for {', '.join(symbols_chunk)}: No response")
+        for quote in resp:
+            if quote is not None and quote.get('instrument'):
+                fetched_instrument_ids[quote['symbol']] = quote['instrument'].rstrip('/').split('/')[-1]
+
+    if len(fetched_instrument_ids) > 0:
+        save_instrument_ids(fetched_instrument_ids)
+    return {**instrument_ids, **fetched_instrument_ids}
+
+
+# Get latest prices for multiple symbols (symbol -> price)
+def get_latest_prices(symbols):
+    prices = {}
+    for symbols_chunk in chunk_list(symbols, QUOTES_BATCH_SIZE):
+        resp = rh_run_with_retries(rh.stocks.get_quotes, symbols_chunk)
+        if resp is None:
+            raise Exception(f"Error getting quotes for {', '.join(symbols_chunk)}: No response")
+        for quote in resp:
+            if quote is not None and quote.get('last_trade_price') is not None:
+                prices[quote['symbol']] = quote['last_trade_price']
+    return prices
+
+
+# Get analyst ratings for multiple symbols (symbol -> ratings)
+def get_ratings_batch(symbols):
+    ratings = {}
+    for symbol in symbols:
+        found, ratings_data = get_ratings.cache_get(make_cache_key(symbol))
+        if found:
+            ratings[symbol] = ratings_data
+
+    instrument_ids = get_instrument_ids_batch([symbol for symbol in symbols if symbol not in ratings])
+    symbols_by_instrument_id = {instrument_id: symbol for symbol, instrument_id in instrument_ids.items()}
+    for instrument_ids_chunk in chunk_list(symbols_by_instrument_id.keys(), RATINGS_BATCH_SIZE):
+        resp = rh_run_with_retries(rh.request_get, RATINGS_BATCH_URL, 'results', {"ids": ','.join(instrument_ids_chunk)})
+        for item in resp or []:
+            if item is None or item.get('instrument_id') not in symbols_by_instrument_id:
+                continue
+            # Keep the same format as rh.stocks.get_ratings (encoded rating texts)
+            for rating in item['ratings']:
+                rating['text'] = rating['text'].encode('UTF-8')
+            symbol = symbols_by_instrument_id[item['instrument_id']]
+            ratings[symbol] = item
+            get_ratings.cache_put(make_cache_key(symbol), item)
+
+    # Fall back to single-symbol requests for symbols missing from the batched response
+    for symbol in symbols:
+        if symbol not in ratings:
+            ratings[symbol] = get_ratings(symbol)
+    return ratings
+
+
 # Sell a stock by symbol and quantity
 def sell_stock(symbol, quantity):
     if MODE == "demo":
+        metrics.increment("trading_bot_orders_total", side="sell", result="demo")
         return {"id": "demo"}
 
     if MODE == "manual":
+        logger.flush()
         confirm = input(f"Confirm sell for {symbol} of {quantity}? (yes/no): ")
         if confirm.lower() != "yes":
+            metrics.increment("trading_bot_orders_total", side="sell", result="cancelled")
             return {"id": "cancelled"}
 
-    sell_resp = rh_run_with_retries(rh.orders.order_sell_market, symbol, quantity, timeInForce="gfd")
+    with metrics.span("trading_bot_order_duration_seconds", side="sell"):
+        sell_resp = rh_run_with_retries(rh.orders.order_sell_market, symbol, quantity, timeInForce="gfd")
+    metrics.increment("trading_bot_orders_total", side="sell", result="submitted" if sell_resp is not None else "error")
     if sell_resp is None:
         raise Exception(f"Error selling {symbol}: No response")
     return sell_resp
@@ -278,14 +749,19 @@ def sell_stock(symbol, quantity):
 # Buy a stock by symbol and quantity
 def buy_stock(symbol, quantity):
     if MODE == "demo":
+        metrics.increment("trading_bot_orders_total", side="buy", result="demo")
         return {"id": "demo"}
 
     if MODE == "manual":
+        logger.flush()
         confirm = input(f"Confirm buy for {symbol} of {quantity}? (yes/no): ")
         if confirm.lower() != "yes":
+            metrics.increment("trading_bot_orders_total", side="buy", result="cancelled")
             return {"id": "cancelled"}
 
-    buy_resp = rh_run_with_retries(rh.orders.order_buy_market, symbol, quantity, timeInForce="gfd")
+    with metrics.span("trading_bot_order_duration_seconds", side="buy"):
+        buy_resp = rh_run_with_retries(rh.orders.order_buy_market, symbol, quantity, timeInForce="gfd")
+    metrics.increment("trading_bot_orders_total", side="buy", result="submitted" if buy_resp is not None else "error")
     if buy_resp is None:
         raise Exception(f"Error buying {symbol}: No response")
     return buy_resp
@@ -0,0 +1 @@
+# This empty file marks backtest as a Python package
@@ -0,0 +1,177 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+from ..api import robinhood
+from ..utils import candles
+
+# Recorded dataset layout:
+#   candles/<SYMBOL>.5minute.npy - intraday candles (candles.CANDLE_DTYPE, memory-mapped on load)
+#   candles/<SYMBOL>.day.npy     - daily candles (including the history needed for the 200-day moving average)
+#   ratings.json                 - analyst ratings snapshot (symbol -> ratings, rating texts as strings)
+#   pdt.json                     - optional PDT flags (symbol -> date -> {"buy": bool, "sell": bool})
+CANDLES_DIR_NAME = "candles"
+RATINGS_FILE_NAME = "ratings.json"
+PDT_FILE_NAME = "pdt.json"
+
+INTRADAY_INTERVAL = "5minute"
+INTRADAY_INTERVAL_SECONDS = 5 * 60
+DAY_SECONDS = 24 * 60 * 60
+
+# Regular session of synthetic data (UTC, 78 five-minute candles)
+SYNTHETIC_SESSION_OPEN = timedelta(hours=14, minutes=30)
+SYNTHETIC_SESSION_CANDLES = 78
+
+# Daily history before the first synthetic session (enough for the 200-day moving average)
+SYNTHETIC_HISTORY_DAYS = 260
+
+
+# Read a JSON file (default if the file does not exist)
+def read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+# Write a JSON file atomically
+def write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+# Get symbols of a recorded dataset (symbols with intraday candles)
+def get_dataset_symbols(dataset_dir):
+    candles_dir = os.path.join(dataset_dir, CANDLES_DIR_NAME)
+    if not os.path.isdir(candles_dir):
+        return []
+    suffix = f".{INTRADAY_INTERVAL}.npy"
+    return sorted(file_name[:-len(suffix)] for file_name in os.listdir(candles_dir) if file_name.endswith(suffix))
+
+
+# Load a recorded dataset (candles are memory-mapped, so datasets larger than memory can be replayed)
+def load_dataset(dataset_dir, symbols=None):
+    candles_dir = os.path.join(dataset_dir, CANDLES_DIR_NAME)
+    dataset = {
+        "symbols": [],
+        "intraday": {},
+        "daily": {},
+        "ratings": read_json(os.path.join(dataset_dir, RATINGS_FILE_NAME), {}),
+        "pdt": read_json(os.path.join(dataset_dir, PDT_FILE_NAME), {}),
+    }
+    for symbol in symbols or get_dataset_symbols(dataset_dir):
+        intraday_candles = candles.load_candles(candles_dir, symbol, INTRADAY_INTERVAL)
+        if intraday_candles is None or len(intraday_candles) == 0:
+            continue
+        daily_candles = candles.load_candles(candles_dir, symbol, "day")
+        dataset["symbols"].append(symbol)
+        dataset["intraday"][symbol] = intraday_candles
+        dataset["daily"][symbol] = daily_candles if daily_candles is not None else np.empty(0, dtype=candles.CANDLE_DTYPE)
+
+    if len(dataset["symbols"]) == 0:
+        raise Exception(f"No recorded candles found in {dataset_dir}")
+    return dataset
+
+
+# Append newly recorded candles to already recorded ones (recordings may have gaps between them)
+def append_candles(recorded_candles, new_candles):
+    if recorded_candles is None or len(recorded_candles) == 0:
+        return new_candles
+    if len(new_candles) == 0:
+        return recorded_candles
+    merged_candles = candles.merge_candles(recorded_candles, new_candles)
+    if merged_candles is None:
+        merged_candles = np.concatenate([recorded_candles, new_candles])
+    return merged_candles
+
+
+# Record the latest market data from Robinhood into a dataset (requires login)
+# Robinhood serves 5-minute candles for the last week only, so run it regularly to build up months of data
+def record_dataset(dataset_dir, symbols):
+    candles_dir = os.path.join(dataset_dir, CANDLES_DIR_NAME)
+    os.makedirs(candles_dir, exist_ok=True)
+
+    intraday_data = robinhood.get_historical_data_batch(symbols, interval=INTRADAY_INTERVAL, span="week")
+    daily_data = robinhood.get_historical_data_batch(symbols, interval="day", span="5year")
+    for symbol in symbols:
+        intraday_candles = append_candles(candles.load_candles(candles_dir, symbol, INTRADAY_INTERVAL), candles.historical_data_to_candles(intraday_data[symbol]))
+        if len(intraday_candles) > 0:
+            candles.save_candles(candles_dir, symbol, intraday_candles, INTRADAY_INTERVAL)
+        if len(daily_data[symbol]) > 0:
+            candles.save_candles(candles_dir, symbol, candles.historical_data_to_candles(daily_data[symbol]), "day")
+
+    ratings_path = os.path.join(dataset_dir, RATINGS_FILE_NAME)
+    ratings = read_json(ratings_path, {})
+    for symbol, ratings_data in robinhood.get_ratings_batch(symbols).items():
+        ratings[symbol] = {
+            "summary": ratings_data['summary'],
+            "ratings": [{**rating, "text": rating['text'].decode('utf-8')} for rating in ratings_data['ratings']],
+        }
+    write_json(ratings_path, ratings)
+    return get_dataset_symbols(dataset_dir)
+
+
+# Generate random candles with a geometric random walk (returns opens, closes, highs, lows, volumes)
+def generate_candles(rng, start_price, count, volatility):
+    closes = start_price * np.exp(np.cumsum(rng.normal(0, volatility, count)))
+    opens = np.concatenate([[start_price], closes[:-1]])
+    highs = np.maximum(opens, closes) * (1 + np.abs(rng.normal(0, volatility / 3, count)))
+    lows = np.minimum(opens, closes) * (1 - np.abs(rng.normal(0, volatility / 3, count)))
+    volumes = rng.integers(0, 100000, count).astype(np.float64)
+    return opens, closes, highs, lows, volumes
+
+
+# Get weekdays starting from a date (market holidays are not skipped)
+def get_weekdays(start_date, count, backwards=False):
+    days = []
+    day = start_date
+    step = timedelta(days=-1 if backwards else 1)
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day += step
+    return sorted(days)
+
+
+# Generate a synthetic dataset with reproducible random walks (for benchmarks and smoke tests)
+def generate_dataset(dataset_dir, symbols_count, sessions_count, seed=42, start_date="2025-01-02"):
+    candles_dir = os.path.join(dataset_dir, CANDLES_DIR_NAME)
+    os.makedirs(candles_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    start_date = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    history_days = get_weekdays(start_date - timedelta(days=1), SYNTHETIC_HISTORY_DAYS, backwards=True)
+    session_days = get_weekdays(start_date, sessions_count)
+
+    symbols = [f"SYM{i:04d}" for i in range(symbols_count)]
+    ratings = {}
+    for symbol in symbols:
+        history = generate_candles(rng, rng.uniform(5, 500), len(history_days), 0.02)
+        daily_candles = np.empty(len(history_days) + len(session_days), dtype=candles.CANDLE_DTYPE)
+        daily_candles["begins_at"][:len(history_days)] = [int(day.timestamp()) for day in history_days]
+        for field, values in zip(["open_price", "close_price", "high_price", "low_price", "volume"], history):
+            daily_candles[field][:len(history_days)] = values
+
+        # Intraday candles continue the daily walk, and session candles are aggregated back into daily candles
+        intraday_candles = np.empty(len(session_days) * SYNTHETIC_SESSION_CANDLES, dtype=candles.CANDLE_DTYPE)
+        price = history[1][-1]
+        for i, day in enumerate(session_days):
+            opens, closes, highs, lows, volumes = generate_candles(rng, price, SYNTHETIC_SESSION_CANDLES, 0.002)
+            session = intraday_candles[i * SYNTHETIC_SESSION_CANDLES:(i + 1) * SYNTHETIC_SESSION_CANDLES]
+            session["begins_at"] = int((day + SYNTHETIC_SESSION_OPEN).timestamp()) + np.arange(SYNTHETIC_SESSION_CANDLES) * INTRADAY_INTERVAL_SECONDS
+            session["open_price"], session["close_price"], session["high_price"], session["low_price"], session["volume"] = opens, closes, highs, lows, volumes
+            daily_candles[len(history_days) + i] = (int(day.timestamp()), opens[0], closes[-1], highs.max(), lows.min(), volumes.sum())
+            price = closes[-1]
+
+        candles.save_candles(candles_dir, symbol, intraday_candles, INTRADAY_INTERVAL)
+        candles.save_candles(candles_dir, symbol, daily_candles, "day")
+        num_buy, num_hold, num_sell = (int(count) for count in rng.integers(0, 10, 3))
+        ratings[symbol] = {
+            "summary": {"num_buy_ratings": num_buy, "num_hold_ratings": num_hold, "num_sell_ratings": num_sell},
+            "ratings": [{"published_at": start_date.strftime("%Y-%m-%dT%H:%M:%SZ"), "type": "buy" if num_buy >= num_sell else "sell", "text": f"Synthetic rating for {symbol}"}],
+        }
+
+    write_json(os.path.join(dataset_dir, RATINGS_FILE_NAME), ratings)
+    return symbols
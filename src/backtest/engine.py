@@ -0,0 +1,433 @@
+import contextlib
+import hashlib
+import json
+import math
+import threading
+import time
+import types
+from datetime import datetime, timezone
+import numpy as np
+
+import main
+from ..api import openai
+from ..api import robinhood
+from ..utils import candles
+from ..utils import decision_cache
+from ..utils import indicator_state
+from ..utils import logger
+from . import data
+
+# Watchlist served by the simulated broker (all symbols of the dataset)
+BACKTEST_WATCHLIST_NAME = "Backtest"
+BACKTEST_ACCOUNT_URL = "https://api.robinhood.com/accounts/BACKTEST/"
+
+# Stub AI strategy (mean reversion on RSI and VWAP)
+STUB_RSI_OVERSOLD = 30
+STUB_RSI_OVERBOUGHT = 70
+
+# Overviews of the AI prompt being built in the current thread (read by the stub AI)
+prompt_context = threading.local()
+
+
+# Create a simulation (replayed market data, simulated clock and simulated broker)
+def new_simulation(dataset, initial_cash, run_interval_seconds, ai="stub", ai_responses=None, slippage_bps=0):
+    return {
+        "dataset": dataset,
+        "run_interval_seconds": run_interval_seconds,
+        "ai": ai,
+        "ai_responses": ai_responses if ai_responses is not None else {},
+        "recorded_ai_responses": {},
+        "slippage_bps": slippage_bps,
+        "initial_cash": float(initial_cash),
+        "cash": float(initial_cash),
+        "positions": {},
+        "now": None,
+        "session_date": None,
+        "session_data": {},
+        "daily_windows": {},
+        "historical_data_day": {},
+        "historical_data_year": {},
+        "prices": {},
+        "day_trades": {},
+        "trades": [],
+        "equity_curve": [],
+        "cycles": 0,
+        "sessions": 0,
+        "errors": 0,
+        "ai_requests": 0,
+        "ai_replay_misses": 0,
+    }
+
+
+# Get trading sessions of the dataset (date -> candle times), the simulated clock steps through them
+def get_sessions(dataset, start_date=None, end_date=None):
+    begins_at = np.unique(np.concatenate([dataset["intraday"][symbol]["begins_at"] for symbol in dataset["symbols"]]))
+    session_days = begins_at // data.DAY_SECONDS
+    sessions = []
+    for session_day in np.unique(session_days):
+        session_date = datetime.fromtimestamp(int(session_day) * data.DAY_SECONDS, timezone.utc).strftime("%Y-%m-%d")
+        if (start_date and session_date < start_date) or (end_date and session_date > end_date):
+            continue
+        sessions.append((session_date, begins_at[session_days == session_day]))
+    return sessions
+
+
+# Get times of trading cycles in a session (one cycle every run interval, at the close of a candle)
+def get_cycle_times(candle_times, run_interval_seconds):
+    step = max(1, round(run_interval_seconds / data.INTRADAY_INTERVAL_SECONDS))
+    return candle_times[step - 1::step]
+
+
+# Get historical data of the daily candles [start, end) of a symbol (windows move forward with the sessions)
+# Daily candles stay memory-mapped arrays, each candle is converted once when it enters the window and dropped when it leaves it
+def get_daily_window(simulation, symbol, start, end):
+    offset, historical_data = simulation["daily_windows"].get(symbol, (start, []))
+    if start < offset or start > offset + len(historical_data):
+        offset, historical_data = start, []
+    historical_data = historical_data[start - offset:]
+    converted_end = start + len(historical_data)
+    if end > converted_end:
+        historical_data += candles.candles_to_historical_data(np.asarray(simulation["dataset"]["daily"][symbol][converted_end:end]), symbol)
+    simulation["daily_windows"][symbol] = (start, historical_data)
+    return historical_data[:end - start]
+
+
+# Start a trading session: slice intraday candles of the day and daily candles of the past year
+def start_session(simulation, session_date):
+    dataset = simulation["dataset"]
+    session_start = candles.timestamp_to_epoch(f"{session_date}T00:00:00Z")
+    simulation["session_date"] = session_date
+    simulation["session_data"] = {}
+    simulation["historical_data_year"] = {}
+    simulation["day_trades"] = {}
+    simulation["sessions"] += 1
+
+    for symbol in dataset["symbols"]:
+        intraday_candles = dataset["intraday"][symbol]
+        start, end = np.searchsorted(intraday_candles["begins_at"], [session_start, session_start + data.DAY_SECONDS])
+        session_candles = np.asarray(intraday_candles[start:end])
+        simulation["session_data"][symbol] = (session_candles["begins_at"], candles.candles_to_historical_data(session_candles, symbol))
+
+        # Only completed days are known before the session
+        daily_begins_at = dataset["daily"][symbol]["begins_at"]
+        start, end = np.searchsorted(daily_begins_at, [session_start - robinhood.YEAR_SPAN_SECONDS, session_start])
+        simulation["historical_data_year"][symbol] = get_daily_window(simulation, symbol, int(start), int(end))
+        if end > 0 and symbol not in simulation["prices"]:
+            simulation["prices"][symbol] = float(dataset["daily"][symbol]["close_price"][end - 1])
+
+
+# Advance the simulated clock to the close of a candle (intraday candles up to that candle become visible)
+def advance_clock(simulation, candle_time):
+    simulation["now"] = int(candle_time) + data.INTRADAY_INTERVAL_SECONDS
+    simulation["historical_data_day"] = {}
+    for symbol, (begins_at, historical_data) in simulation["session_data"].items():
+        count = int(np.searchsorted(begins_at, candle_time, side="right"))
+        simulation["historical_data_day"][symbol] = historical_data[:count]
+        if count > 0:
+            simulation["prices"][symbol] = historical_data[count - 1]["close_price"]
+
+
+# Get simulated datetime class for main (its now() returns the simulated clock)
+def get_simulated_datetime(simulation):
+    class SimulatedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            now = datetime.fromtimestamp(simulation["now"], tz or timezone.utc)
+            return now if tz else now.replace(tzinfo=None)
+    return SimulatedDatetime
+
+
+# Get total value of cash and positions at the latest prices
+def get_equity(simulation):
+    return simulation["cash"] + sum(position["quantity"] * simulation["prices"][symbol] for symbol, position in simulation["positions"].items())
+
+
+# Simulated robinhood.get_account_info
+def get_account_info(simulation):
+    robinhood.account_info_cache.setdefault(robinhood.active_account["username"], {})["url"] = BACKTEST_ACCOUNT_URL
+    return {"buying_power": math.floor(simulation["cash"] * 100) / 100, "url": BACKTEST_ACCOUNT_URL}
+
+
+# Simulated robinhood.get_portfolio_stocks (same format as rh.build_holdings)
+def get_portfolio_stocks(simulation):
+    return {symbol: {
+        "price": str(simulation["prices"][symbol]),
+        "quantity": str(position["quantity"]),
+        "average_buy_price": str(position["average_buy_price"]),
+        "equity": str(position["quantity"] * simulation["prices"][symbol]),
+    } for symbol, position in simulation["positions"].items()}
+
+
+# Simulated robinhood.get_watchlist_stocks (all dataset symbols with a known price)
+def get_watchlist_stocks(simulation, name):
+    return [{"symbol": symbol, "price": str(simulation["prices"][symbol]), "name": symbol} for symbol in simulation["dataset"]["symbols"] if symbol in simulation["prices"]]
+
+
+# Simulated robinhood.get_latest_prices
+def get_latest_prices(simulation, symbols):
+    return {symbol: str(simulation["prices"][symbol]) for symbol in symbols if symbol in simulation["prices"]}
+
+
+# Simulated robinhood.get_ratings_batch (same format as rh.stocks.get_ratings, encoded rating texts)
+def get_ratings_batch(simulation, symbols):
+    ratings = {}
+    for symbol in symbols:
+        ratings_data = simulation["dataset"]["ratings"].get(symbol) or {"summary": None, "ratings": []}
+        ratings[symbol] = {
+            "summary": ratings_data['summary'],
+            "ratings": [{**rating, "text": rating['text'].encode('utf-8')} for rating in ratings_data['ratings']],
+        }
+    return ratings
+
+
+# Simulated robinhood.get_stock_day_trade_checks
+# Recorded PDT flags are used when available, otherwise a day trade is flagged for stocks traded the other way today
+def get_stock_day_trade_checks(simulation, symbol):
+    recorded_flags = simulation["dataset"]["pdt"].get(symbol, {}).get(simulation["session_date"])
+    if recorded_flags is not None:
+        is_buy_restricted, is_sell_restricted = recorded_flags.get("buy", False), recorded_flags.get("sell", False)
+    else:
+        day_trades = simulation["day_trades"].get(symbol, set())
+        is_buy_restricted, is_sell_restricted = "sell" in day_trades, "buy" in day_trades
+    return {
+        "buy": "day_trade" if is_buy_restricted else None,
+        "buy_extended": None,
+        "sell": "day_trade" if is_sell_restricted else None,
+        "sell_extended": None,
+    }
+
+
+# Record a simulated fill
+def record_trade(simulation, symbol, side, quantity, price):
+    simulation["day_trades"].setdefault(symbol, set()).add(side)
+    simulation["trades"].append({
+        "time": candles.epoch_to_timestamp(simulation["now"]),
+        "symbol": symbol,
+        "side": side,
+        "quantity": quantity,
+        "price": price,
+    })
+    return {"id": f"backtest-{len(simulation['trades'])}", "quantity": quantity, "price": price}
+
+
+# Simulated robinhood.buy_stock (market order filled at the latest close plus slippage)
+def buy_stock(simulation, symbol, quantity):
+    quantity = float(quantity)
+    if symbol not in simulation["prices"]:
+        return {"detail": f"No price for {symbol}"}
+    price = simulation["prices"][symbol] * (1 + simulation["slippage_bps"] / 10000)
+    if quantity <= 0 or quantity * price > simulation["cash"]:
+        return {"detail": "Not enough buying power"}
+
+    position = simulation["positions"].setdefault(symbol, {"quantity": 0.0, "average_buy_price": 0.0})
+    position["average_buy_price"] = (position["quantity"] * position["average_buy_price"] + quantity * price) / (position["quantity"] + quantity)
+    position["quantity"] += quantity
+    simulation["cash"] -= quantity * price
+    return record_trade(simulation, symbol, "buy", quantity, price)
+
+
+# Simulated robinhood.sell_stock (market order filled at the latest close minus slippage)
+def sell_stock(simulation, symbol, quantity):
+    quantity = float(quantity)
+    position = simulation["positions"].get(symbol)
+    if position is None or quantity <= 0 or quantity > position["quantity"] + 1e-9:
+        return {"detail": "Not enough shares to sell"}
+    price = simulation["prices"][symbol] * (1 - simulation["slippage_bps"] / 10000)
+
+    position["quantity"] -= min(quantity, position["quantity"])
+    if position["quantity"] <= 1e-9:
+        del simulation["positions"][symbol]
+    simulation["cash"] += quantity * price
+    return record_trade(simulation, symbol, "sell", quantity, price)
+
+
+# Get quantity of a stub AI decision for an amount in USD (rounded down, so the cost never exceeds the amount)
+def get_stub_quantity(amount, price):
+    return math.floor(amount / price * 10 ** 6) / 10 ** 6
+
+
+# Make stub AI decisions (mean reversion: buy oversold stocks below VWAP, sell overbought stocks)
+def make_stub_decisions(account_info, portfolio_overview, watchlist_overview):
+    decisions = []
+    for symbol, stock_data in portfolio_overview.items():
+        if stock_data.get("rsi") is not None and stock_data["rsi"] >= STUB_RSI_OVERBOUGHT:
+            quantity = stock_data["my_quantity"]
+            if main.MAX_SELLING_AMOUNT_USD is not False:
+                quantity = min(quantity, get_stub_quantity(main.MAX_SELLING_AMOUNT_USD, stock_data["current_price"]))
+            decisions.append({"symbol": symbol, "decision": "sell", "quantity": quantity})
+
+    # Buys stay within the budget and the portfolio limit
+    budget = account_info["buying_power"]
+    portfolio_size = len(portfolio_overview)
+    buy_amount = main.MAX_BUYING_AMOUNT_USD if main.MAX_BUYING_AMOUNT_USD is not False else budget / max(1, main.PORTFOLIO_LIMIT)
+    for symbol, stock_data in {**portfolio_overview, **watchlist_overview}.items():
+        rsi, vwap, price = stock_data.get("rsi"), stock_data.get("vwap"), stock_data["current_price"]
+        if rsi is None or rsi > STUB_RSI_OVERSOLD or (vwap is not None and price >= vwap) or not price > 0:
+            continue
+        if buy_amount > budget or (symbol not in portfolio_overview and portfolio_size >= main.PORTFOLIO_LIMIT):
+            continue
+        decisions.append({"symbol": symbol, "decision": "buy", "quantity": get_stub_quantity(buy_amount, price)})
+        budget -= buy_amount
+        portfolio_size += 0 if symbol in portfolio_overview else 1
+    return decisions
+
+
+# Make AI response object with the given content (same shape as chat completions)
+def make_ai_response(content):
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+
+# Get key of a recorded AI response (prompts are reproducible, the simulated clock is part of them)
+def get_prompt_key(ai_prompt):
+    return hashlib.sha256(ai_prompt.encode("utf-8")).hexdigest()
+
+
+# Simulated openai.make_ai_request (stub strategy, recorded responses or the live model)
+def make_ai_request(simulation, make_live_ai_request, ai_prompt):
+    simulation["ai_requests"] += 1
+    if simulation["ai"] == "stub":
+        return make_ai_response(json.dumps(make_stub_decisions(*prompt_context.args)))
+
+    prompt_key = get_prompt_key(ai_prompt)
+    if simulation["ai"] == "replay":
+        if prompt_key not in simulation["ai_responses"]:
+            simulation["ai_replay_misses"] += 1
+            logger.debug(f"No recorded AI response for prompt {prompt_key}, no decisions made")
+            return make_ai_response("[]")
+        return make_ai_response(simulation["ai_responses"][prompt_key])
+
+    ai_response = make_live_ai_request(ai_prompt)
+    simulation["recorded_ai_responses"][prompt_key] = ai_response.choices[0].message.content
+    return ai_response
+
+
+# Build AI prompt and remember its overviews for the stub AI
+def build_ai_prompt(build_prompt, account_info, portfolio_overview, watchlist_overview, dropped_symbols=None):
+    prompt_context.args = (account_info, portfolio_overview, watchlist_overview)
+    return build_prompt(account_info, portfolio_overview, watchlist_overview, dropped_symbols)
+
+
+# Load recorded AI responses (JSON lines of prompt key and response content)
+def load_ai_responses(path):
+    ai_responses = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                ai_responses[record["prompt_key"]] = record["content"]
+    return ai_responses
+
+
+# Save AI responses recorded during a backtest against the live model
+def save_ai_responses(path, ai_responses):
+    with open(path, "a") as f:
+        for prompt_key, content in ai_responses.items():
+            f.write(json.dumps({"prompt_key": prompt_key, "content": content}) + "\n")
+
+
+# Temporarily replace module attributes (originals are restored on exit)
+@contextlib.contextmanager
+def patch_attributes(patches):
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    try:
+        for module, name, value in patches:
+            setattr(module, name, value)
+        yield
+    finally:
+        for module, name, value in originals:
+            setattr(module, name, value)
+
+
+# Get patches routing the trading bot's market data, orders and AI requests to the simulation
+def get_simulation_patches(simulation):
+    make_live_ai_request = openai.make_ai_request
+    build_prompt = main.build_ai_prompt
+    return [
+        (robinhood, "get_account_info", lambda: get_account_info(simulation)),
+        (robinhood, "get_portfolio_stocks", lambda: get_portfolio_stocks(simulation)),
+        (robinhood, "get_watchlist_stocks", lambda name: get_watchlist_stocks(simulation, name)),
+        (robinhood, "get_latest_prices", lambda symbols: get_latest_prices(simulation, symbols)),
+        (robinhood, "get_historical_data_batch", lambda symbols, interval="day", span="year": {symbol: simulation["historical_data_day"].get(symbol, []) for symbol in symbols}),
+        (robinhood, "get_daily_historical_data_batch", lambda symbols, force_refresh=False: {symbol: simulation["historical_data_year"].get(symbol, []) for symbol in symbols}),
+        (robinhood, "get_ratings_batch", lambda symbols: get_ratings_batch(simulation, symbols)),
+        (robinhood, "get_stock_day_trade_checks", lambda symbol: get_stock_day_trade_checks(simulation, symbol)),
+        (robinhood, "buy_stock", lambda symbol, quantity: buy_stock(simulation, symbol, quantity)),
+        (robinhood, "sell_stock", lambda symbol, quantity: sell_stock(simulation, symbol, quantity)),
+        (openai, "make_ai_request", lambda ai_prompt: make_ai_request(simulation, make_live_ai_request, ai_prompt)),
+        (main, "build_ai_prompt", lambda *args: build_ai_prompt(build_prompt, *args)),
+        (main, "datetime", get_simulated_datetime(simulation)),
+        (main, "WATCHLIST_NAMES", [BACKTEST_WATCHLIST_NAME]),
+        (main, "RUN_INTERVAL_SECONDS", simulation["run_interval_seconds"]),
+        (main, "INDICATOR_STATE_FILE", ""),
+        # Account state comes from the simulation every cycle
+        (main, "LEDGER_RECONCILE_SECONDS", False),
+        # Recorded PDT flags are checked for every stock, as they may not follow from the simulated orders
+        (main, "PDT_LOCAL_TRACKING", False),
+        # Simulated AI responses are not streamed
+        (main, "AI_STREAMING", False),
+        # Orders are filled one by one, so simulated fills are deterministic
+        (main, "ORDER_MAX_WORKERS", 1),
+    ]
+
+
+# Get max drawdown of an equity curve (fraction of the peak equity)
+def get_max_drawdown(equity_curve):
+    if len(equity_curve) == 0:
+        return 0.0
+    equity = np.array([equity for _, equity in equity_curve])
+    peaks = np.maximum.accumulate(equity)
+    return float(np.max((peaks - equity) / peaks))
+
+
+# Get backtest results (PnL, trades, turnover and throughput)
+def get_backtest_results(simulation, wall_seconds):
+    final_equity = get_equity(simulation)
+    return {
+        "sessions": simulation["sessions"],
+        "cycles": simulation["cycles"],
+        "initial_equity": round(simulation["initial_cash"], 2),
+        "final_equity": round(final_equity, 2),
+        "pnl": round(final_equity - simulation["initial_cash"], 2),
+        "pnl_percent": round((final_equity / simulation["initial_cash"] - 1) * 100, 4) if simulation["initial_cash"] > 0 else 0.0,
+        "max_drawdown_percent": round(get_max_drawdown(simulation["equity_curve"]) * 100, 4),
+        "trades": len(simulation["trades"]),
+        "buys": len([trade for trade in simulation["trades"] if trade["side"] == "buy"]),
+        "sells": len([trade for trade in simulation["trades"] if trade["side"] == "sell"]),
+        "turnover": round(sum(trade["quantity"] * trade["price"] for trade in simulation["trades"]), 2),
+        "open_positions": len(simulation["positions"]),
+        "errors": simulation["errors"],
+        "ai_requests": simulation["ai_requests"],
+        "ai_replay_misses": simulation["ai_replay_misses"],
+        "wall_seconds": round(wall_seconds, 3),
+        "cycles_per_second": round(simulation["cycles"] / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+    }
+
+
+# Replay a recorded dataset through the trading bot pipeline as fast as possible
+# Market data, orders and AI requests are simulated, everything else (enrichment, prompt, filters) is the live code
+def run_backtest(dataset, initial_cash, run_interval_seconds=None, ai="stub", ai_responses=None, slippage_bps=0, start_date=None, end_date=None):
+    run_interval_seconds = main.RUN_INTERVAL_SECONDS if run_interval_seconds is None else run_interval_seconds
+    simulation = new_simulation(dataset, initial_cash, run_interval_seconds, ai, ai_responses, slippage_bps)
+    sessions = get_sessions(dataset, start_date, end_date)
+    indicator_state.reset_indicator_states()
+    decision_cache.reset()
+
+    started_at = time.perf_counter()
+    with patch_attributes(get_simulation_patches(simulation)):
+        for session_date, candle_times in sessions:
+            start_session(simulation, session_date)
+            for candle_time in get_cycle_times(candle_times, run_interval_seconds):
+                advance_clock(simulation, candle_time)
+                try:
+                    main.trading_bot()
+                except Exception as e:
+                    simulation["errors"] += 1
+                    logger.error(f"Backtest cycle error at {candles.epoch_to_timestamp(simulation['now'])}: {e}")
+                simulation["cycles"] += 1
+                simulation["equity_curve"].append((simulation["now"], get_equity(simulation)))
+            logger.info(f"Backtest session {session_date} done, equity {round(get_equity(simulation), 2)} USD")
+        decision_cache.log_session_summary()
+    indicator_state.reset_indicator_states()
+    decision_cache.reset()
+
+    return simulation, get_backtest_results(simulation, time.perf_counter() - started_at)
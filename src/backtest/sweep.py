@@ -0,0 +1,109 @@
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+from ..utils import logger
+from . import data
+from . import engine
+
+# Config parameters that can be swept
+SWEEP_PARAMETERS = [
+    "RUN_INTERVAL_SECONDS",
+    "MIN_SELLING_AMOUNT_USD",
+    "MAX_SELLING_AMOUNT_USD",
+    "MIN_BUYING_AMOUNT_USD",
+    "MAX_BUYING_AMOUNT_USD",
+    "PORTFOLIO_LIMIT",
+    "WATCHLIST_OVERVIEW_LIMIT",
+]
+
+# Result columns of the comparison table (result key -> column title)
+RESULT_COLUMNS = {
+    "pnl": "PnL USD",
+    "pnl_percent": "PnL %",
+    "max_drawdown_percent": "Drawdown %",
+    "trades": "Trades",
+    "turnover": "Turnover USD",
+    "cycles": "Cycles",
+    "wall_seconds": "Wall s",
+}
+
+# Dataset of the worker process (memory-mapped once per worker, pages are shared between all workers)
+worker_dataset = None
+
+
+# Parse a config value of a sweep grid (JSON values, e.g. 10, 2.5, false)
+def parse_value(value):
+    value = value.strip()
+    if value in ("False", "True"):
+        return value == "True"
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+# Parse sweep grid specs (e.g. ["PORTFOLIO_LIMIT=5,10", "MAX_BUYING_AMOUNT_USD=10,50"]) into config name -> values
+def parse_grid(specs):
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        name = name.strip()
+        if name not in SWEEP_PARAMETERS:
+            raise Exception(f"Unknown sweep parameter: {name} (available: {', '.join(SWEEP_PARAMETERS)})")
+        grid[name] = [parse_value(value) for value in values.split(",") if value.strip()]
+        if len(grid[name]) == 0:
+            raise Exception(f"No values given for sweep parameter {name}")
+    return grid
+
+
+# Expand a sweep grid into all combinations of config overrides
+def expand_grid(grid):
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+# Load the dataset once per worker process
+def init_worker(dataset_dir, symbols, log_level):
+    global worker_dataset
+    logger.LOG_LEVEL = log_level
+    worker_dataset = data.load_dataset(dataset_dir, symbols)
+
+
+# Run a backtest with config overrides (in a worker process)
+def run_sweep_point(overrides, initial_cash, ai, ai_responses, slippage_bps, start_date, end_date):
+    with engine.patch_attributes([(main, name, value) for name, value in overrides.items()]):
+        _, results = engine.run_backtest(
+            worker_dataset,
+            initial_cash,
+            ai=ai,
+            ai_responses=ai_responses,
+            slippage_bps=slippage_bps,
+            start_date=start_date,
+            end_date=end_date,
+        )
+    return {"config": overrides, "results": results}
+
+
+# Run backtests for all combinations of a sweep grid across a process pool (results keep the grid order)
+def run_sweep(dataset_dir, grid, initial_cash, symbols=None, max_workers=None, ai="stub", ai_responses=None, slippage_bps=0, start_date=None, end_date=None, log_level="ERROR"):
+    sweep_points = expand_grid(grid)
+    max_workers = min(max_workers or os.cpu_count() or 1, len(sweep_points))
+    logger.info(f"Running {len(sweep_points)} backtest(s) on {max_workers} worker(s)...")
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(dataset_dir, symbols, log_level)) as executor:
+        futures = [executor.submit(run_sweep_point, overrides, initial_cash, ai, ai_responses, slippage_bps, start_date, end_date) for overrides in sweep_points]
+        return [future.result() for future in futures]
+
+
+# Format sweep results as a comparison table (best PnL first)
+def format_results_table(sweep_results):
+    names = list(sweep_results[0]["config"].keys()) if len(sweep_results) > 0 else []
+    rows = [[*[str(result["config"][name]) for name in names], *[str(result["results"][key]) for key in RESULT_COLUMNS]] for result in sorted(sweep_results, key=lambda result: -result["results"]["pnl"])]
+    header = [*names, *RESULT_COLUMNS.values()]
+    widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+    lines = ["  ".join(value.rjust(width) for value, width in zip(row, widths)) for row in [header, *rows]]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
@@ -0,0 +1,135 @@
+import json
+import os
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+# Columnar candle format stored per symbol (memory-mapped on load)
+CANDLE_DTYPE = np.dtype([
+    ("begins_at", "i8"),
+    ("open_price", "f8"),
+    ("close_price", "f8"),
+    ("high_price", "f8"),
+    ("low_price", "f8"),
+    ("volume", "f8"),
+])
+
+INDEX_FILE_NAME = "index.json"
+
+
+# Get candle file path for a symbol
+def get_candles_path(cache_dir, symbol, interval="day"):
+    return os.path.join(cache_dir, f"{symbol}.{interval}.npy")
+
+
+# Convert a timestamp string (e.g. 2025-01-02T00:00:00Z) to epoch seconds
+def timestamp_to_epoch(timestamp):
+    return int(datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp())
+
+
+# Convert epoch seconds to a timestamp string (e.g. 2025-01-02T00:00:00Z)
+def epoch_to_timestamp(epoch):
+    return datetime.fromtimestamp(int(epoch), timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+# Convert historical data (list of dicts) to a candle array
+def historical_data_to_candles(historical_data):
+    candles = np.empty(len(historical_data), dtype=CANDLE_DTYPE)
+    for i, item in enumerate(historical_data):
+        candles[i] = (
+            timestamp_to_epoch(item['begins_at']),
+            float(item['open_price']),
+            float(item['close_price']),
+            float(item['high_price']),
+            float(item['low_price']),
+            float(item['volume']),
+        )
+    return candles
+
+
+# Convert a candle array to historical data (list of dicts)
+def candles_to_historical_data(candles, symbol):
+    return [{
+        "begins_at": epoch_to_timestamp(candle["begins_at"]),
+        "open_price": float(candle["open_price"]),
+        "close_price": float(candle["close_price"]),
+        "high_price": float(candle["high_price"]),
+        "low_price": float(candle["low_price"]),
+        "volume": int(candle["volume"]),
+        "symbol": symbol,
+    } for candle in candles]
+
+
+# Load candles for a symbol (None if not cached)
+def load_candles(cache_dir, symbol, interval="day"):
+    path = get_candles_path(cache_dir, symbol, interval)
+    if not os.path.exists(path):
+        return None
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+
+# Save candles for a symbol (atomically replaces the previous file)
+def save_candles(cache_dir, symbol, candles, interval="day"):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = get_candles_path(cache_dir, symbol, interval)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(candles, dtype=CANDLE_DTYPE))
+    os.replace(tmp_path, path)
+
+
+# Merge newly fetched tail candles into cached candles (None if the tail does not overlap the cache)
+def merge_candles(cached_candles, tail_candles, window_seconds=None):
+    if len(tail_candles) == 0:
+        return None
+    if len(cached_candles) > 0 and tail_candles["begins_at"][0] > cached_candles["begins_at"][-1]:
+        return None
+
+    # Tail candles replace cached candles starting from the first tail candle (last bar may be partial)
+    head = cached_candles[cached_candles["begins_at"] < tail_candles["begins_at"][0]]
+    candles = np.concatenate([head, tail_candles])
+    if window_seconds is not None:
+        candles = candles[candles["begins_at"] > candles["begins_at"][-1] - window_seconds]
+    return candles
+
+
+# Load cache index (symbol -> metadata)
+def load_index(cache_dir):
+    path = os.path.join(cache_dir, INDEX_FILE_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Save cache index (symbol -> metadata)
+def save_index(cache_dir, index):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, INDEX_FILE_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+
+
+# Check if cached candles need a full refresh
+def is_full_refresh_needed(index_entry, max_age_seconds, now=None):
+    if not index_entry or "full_refresh_at" not in index_entry:
+        return True
+    now = time.time() if now is None else now
+    return now - index_entry["full_refresh_at"] >= max_age_seconds
+
+
+# Remove all cached candles (forces a full refresh on the next fetch)
+def clear_candles(cache_dir):
+    if not os.path.isdir(cache_dir):
+        return
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(".npy") or file_name == INDEX_FILE_NAME:
+            os.remove(os.path.join(cache_dir, file_name))
@@ -0,0 +1,134 @@
+import json
+
+from . import logger
+from . import metrics
+
+# Account fields that reach the AI prompt (other account changes, e.g. unsettled funds or timestamps, do not change decisions)
+# The portfolio size of scoped runs is left out, the account is snapshot in full runs only
+ACCOUNT_PROMPT_FIELDS = ["buying_power"]
+
+
+# Create empty cache of AI decisions: stock snapshots and decisions of the last AI request per symbol, account snapshot
+# and hit rate of the current session (trading day)
+def new_cache():
+    return {"stocks": {}, "account": None, "session": None, "stats": None}
+
+
+# Get account data of the AI prompt for change detection
+def get_account_prompt_data(account_info):
+    return {field: account_info[field] for field in ACCOUNT_PROMPT_FIELDS if field in account_info}
+
+
+# Cached AI decisions in use, and caches of all profiles (profile name -> cache, None - bot without profiles)
+decision_cache = new_cache()
+profile_caches = {None: decision_cache}
+
+
+# Switch to the cached AI decisions of a profile (None - bot without profiles)
+def activate(profile_name):
+    global decision_cache
+    decision_cache = profile_caches.setdefault(profile_name, new_cache())
+
+
+# Create empty hit rate stats of a session
+def new_session_stats():
+    return {"cycles": 0, "skipped_requests": 0, "stocks": 0, "reused_stocks": 0}
+
+
+# Parse a tolerance band ("0.5%" - relative to the snapshot value, 2 - absolute)
+def parse_tolerance(tolerance):
+    if isinstance(tolerance, str) and tolerance.endswith("%"):
+        return float(tolerance[:-1]) / 100, True
+    return float(tolerance), False
+
+
+# Make a snapshot of data for change detection: values of fields with tolerance bands and a fingerprint of all other fields
+def make_snapshot(data, tolerances, now=None):
+    values = {field: data[field] for field in tolerances if isinstance(data.get(field), (int, float))}
+    fingerprint = json.dumps({field: value for field, value in data.items() if field not in values}, sort_keys=True, default=str)
+    return {"values": values, "fingerprint": fingerprint, "created_at": now}
+
+
+# Check if data changed materially since a snapshot (any value out of its tolerance band, or any other field changed)
+def has_changed(snapshot, data, tolerances):
+    current_snapshot = make_snapshot(data, tolerances)
+    if current_snapshot["fingerprint"] != snapshot["fingerprint"] or current_snapshot["values"].keys() != snapshot["values"].keys():
+        return True
+    for field, value in current_snapshot["values"].items():
+        tolerance, is_relative = parse_tolerance(tolerances[field])
+        snapshot_value = snapshot["values"][field]
+        if abs(value - snapshot_value) > (tolerance * abs(snapshot_value) if is_relative else tolerance):
+            return True
+    return False
+
+
+# Check if a cached decision can be reused (holds only: stock data changes only when an order fills, so a reused buy or sell
+# that failed, was declined or was skipped would be placed again every cycle)
+def is_reusable(decision):
+    return decision is None or decision.get('decision') == "hold"
+
+
+# Get symbols whose data changed materially since their last AI request, or whose last decision was a buy or sell
+# (all symbols if account data of the prompt changed)
+def get_changed_symbols(account_info, stocks_overview, tolerances, max_age_seconds, now):
+    account = decision_cache["account"]
+    if account is None or has_changed(account, get_account_prompt_data(account_info), tolerances):
+        return list(stocks_overview.keys())
+
+    changed_symbols = []
+    for symbol, stock_overview in stocks_overview.items():
+        cached = decision_cache["stocks"].get(symbol)
+        if cached is None or not is_reusable(cached["decision"]) or (max_age_seconds and now - cached["snapshot"]["created_at"] > max_age_seconds) or has_changed(cached["snapshot"], stock_overview, tolerances):
+            changed_symbols.append(symbol)
+    return changed_symbols
+
+
+# Get cached hold decisions of symbols (symbols without a decision were held)
+def get_cached_decisions(symbols):
+    return [decision_cache["stocks"][symbol]["decision"] for symbol in symbols if decision_cache["stocks"][symbol]["decision"] is not None]
+
+
+# Cache decisions of an AI request with snapshots of the requested stocks (and of the account, if all stocks were requested)
+def update(account_info, requested_overview, decisions, tolerances, now, is_full_request):
+    decisions_by_symbol = {}
+    for decision in decisions:
+        decisions_by_symbol.setdefault(decision.get('symbol'), decision)
+    for symbol, stock_overview in requested_overview.items():
+        decision_cache["stocks"][symbol] = {"snapshot": make_snapshot(stock_overview, tolerances, now), "decision": decisions_by_symbol.get(symbol)}
+    if is_full_request:
+        decision_cache["account"] = make_snapshot(get_account_prompt_data(account_info), tolerances, now)
+
+
+# Record reused decisions of a trading cycle and log the hit rate of the session (summary of the previous session when a new one starts)
+def record_cycle(session, reused_count, total_count):
+    if decision_cache["session"] != session:
+        log_session_summary()
+        decision_cache["session"] = session
+        decision_cache["stats"] = new_session_stats()
+
+    stats = decision_cache["stats"]
+    stats["cycles"] += 1
+    stats["skipped_requests"] += 1 if reused_count == total_count else 0
+    stats["stocks"] += total_count
+    stats["reused_stocks"] += reused_count
+    metrics.increment("trading_bot_ai_decision_cache_stocks_total", reused_count, result="reused")
+    metrics.increment("trading_bot_ai_decision_cache_stocks_total", total_count - reused_count, result="requested")
+    logger.info(f"AI decisions reused for {reused_count}/{total_count} stock(s), session hit rate {get_hit_rate(stats)}% ({stats['skipped_requests']}/{stats['cycles']} cycle(s) without AI request)")
+
+
+# Get hit rate of session stats (percent of stock decisions reused)
+def get_hit_rate(stats):
+    return round(stats["reused_stocks"] / stats["stocks"] * 100, 1) if stats["stocks"] > 0 else 0.0
+
+
+# Log hit rate summary of the current session
+def log_session_summary():
+    stats = decision_cache["stats"]
+    if stats is None or stats["cycles"] == 0:
+        return
+    logger.info(f"AI decision cache summary for session {decision_cache['session']}: hit rate {get_hit_rate(stats)}% ({stats['reused_stocks']}/{stats['stocks']} stock decision(s) reused, {stats['skipped_requests']}/{stats['cycles']} cycle(s) without AI request)")
+
+
+# Clear cached decisions and session stats
+def reset():
+    decision_cache.update(new_cache())
@@ -0,0 +1,286 @@
+import json
+import math
+import os
+
+from . import indicators
+
+# Incremental indicator state per symbol (symbol -> state)
+# Prices are kept in whole cents, so the running RSI and moving average sums stay exact
+indicator_states = {}
+
+
+# Create empty intraday state (RSI and VWAP of the current session)
+def new_intraday_state(session_date=None):
+    return {
+        "session_date": session_date,
+        "last_begins_at": None,
+        "count": 0,
+        "closes": [],
+        "gain": 0.0,
+        "loss": 0.0,
+        "price_volume": 0.0,
+        "volume": 0.0,
+        "last_price_volume": 0.0,
+        "last_volume": 0.0,
+    }
+
+
+# Create empty daily state (50-day and 200-day moving averages)
+def new_daily_state():
+    return {
+        "last_begins_at": None,
+        "count": 0,
+        "begins_at": [],
+        "closes": [],
+        "short_sum": 0.0,
+        "short_nan_count": 0,
+        "long_sum": 0.0,
+        "long_nan_count": 0,
+    }
+
+
+# Split a price delta into gain and loss (missing prices count as no change)
+def split_delta(previous_close, close):
+    delta = close - previous_close
+    if math.isnan(delta):
+        return 0.0, 0.0
+    return max(delta, 0.0), max(-delta, 0.0)
+
+
+# Add (sign=1) or remove (sign=-1) a price delta from the RSI sums
+def update_rsi_sums(state, previous_close, close, sign):
+    gain, loss = split_delta(previous_close, close)
+    state["gain"] += sign * gain
+    state["loss"] += sign * loss
+
+
+# Get price and volume contribution of a candle to VWAP (candles without volume are skipped)
+def get_vwap_contribution(item):
+    volume = indicators.to_float(item['volume'])
+    if not volume > 0:
+        return 0.0, 0.0
+    typical_price = (indicators.to_float(item['high_price']) + indicators.to_float(item['low_price']) + indicators.to_float(item['close_price'])) / 3
+    return volume * typical_price, volume
+
+
+# Append an intraday candle (the RSI window keeps one extra close to allow replacing the last candle)
+def append_intraday_candle(state, item):
+    closes = state["closes"]
+    close = float(indicators.to_cents(indicators.round_price(item['close_price'])))
+    if len(closes) >= indicators.RSI_WINDOW + 1:
+        update_rsi_sums(state, closes[-(indicators.RSI_WINDOW + 1)], closes[-indicators.RSI_WINDOW], -1)
+    if len(closes) >= 1:
+        update_rsi_sums(state, closes[-1], close, 1)
+    closes.append(close)
+    if len(closes) > indicators.RSI_WINDOW + 2:
+        closes.pop(0)
+
+    price_volume, volume = get_vwap_contribution(item)
+    state["price_volume"] += price_volume
+    state["volume"] += volume
+    state["last_price_volume"] = price_volume
+    state["last_volume"] = volume
+    state["last_begins_at"] = item['begins_at']
+    state["count"] += 1
+
+
+# Remove the last intraday candle (it is replaced when the candle was still in progress)
+def remove_last_intraday_candle(state):
+    closes = state["closes"]
+    if len(closes) >= 2:
+        update_rsi_sums(state, closes[-2], closes[-1], -1)
+    closes.pop()
+    if len(closes) >= indicators.RSI_WINDOW + 1:
+        update_rsi_sums(state, closes[-(indicators.RSI_WINDOW + 1)], closes[-indicators.RSI_WINDOW], 1)
+
+    state["price_volume"] -= state["last_price_volume"]
+    state["volume"] -= state["last_volume"]
+    state["last_price_volume"] = 0.0
+    state["last_volume"] = 0.0
+    state["count"] -= 1
+
+
+# Add (sign=1) or remove (sign=-1) a close from a moving average sum
+def update_moving_average_sum(state, name, close, sign):
+    if math.isnan(close):
+        state[f"{name}_nan_count"] += sign
+    else:
+        state[f"{name}_sum"] += sign * close
+
+
+# Append a daily candle (the closes keep one extra value to allow replacing the last candle)
+def append_daily_candle(state, item):
+    closes = state["closes"]
+    close = float(indicators.to_cents(indicators.round_price(item['close_price'])))
+    if len(closes) >= indicators.LONG_MOVING_AVERAGE_WINDOW:
+        update_moving_average_sum(state, "long", closes[-indicators.LONG_MOVING_AVERAGE_WINDOW], -1)
+    if len(closes) >= indicators.SHORT_MOVING_AVERAGE_WINDOW:
+        update_moving_average_sum(state, "short", closes[-indicators.SHORT_MOVING_AVERAGE_WINDOW], -1)
+    update_moving_average_sum(state, "long", close, 1)
+    update_moving_average_sum(state, "short", close, 1)
+    closes.append(close)
+    state["begins_at"].append(item['begins_at'])
+    if len(closes) > indicators.LONG_MOVING_AVERAGE_WINDOW + 1:
+        closes.pop(0)
+        state["begins_at"].pop(0)
+    state["last_begins_at"] = item['begins_at']
+    state["count"] += 1
+
+
+# Remove the last daily candle (it is replaced when the day is still in progress)
+def remove_last_daily_candle(state):
+    closes = state["closes"]
+    update_moving_average_sum(state, "long", closes[-1], -1)
+    update_moving_average_sum(state, "short", closes[-1], -1)
+    closes.pop()
+    state["begins_at"].pop()
+    if len(closes) >= indicators.LONG_MOVING_AVERAGE_WINDOW:
+        update_moving_average_sum(state, "long", closes[-indicators.LONG_MOVING_AVERAGE_WINDOW], 1)
+    if len(closes) >= indicators.SHORT_MOVING_AVERAGE_WINDOW:
+        update_moving_average_sum(state, "short", closes[-indicators.SHORT_MOVING_AVERAGE_WINDOW], 1)
+    state["count"] -= 1
+
+
+# Get candles that were not applied to the state yet, walking back from the latest candle
+# Returns the new candles and the latest already applied candle (None if the data does not overlap the state)
+def get_new_candles(state, historical_data):
+    new_candles = []
+    applied_candle = None
+    for item in reversed(historical_data):
+        if state["last_begins_at"] is not None and item['begins_at'] < state["last_begins_at"]:
+            applied_candle = item
+            break
+        new_candles.append(item)
+    new_candles.reverse()
+    return new_candles, applied_candle
+
+
+# Apply intraday candles to the state (O(new candles), resets the state when a new session starts)
+def apply_intraday_candles(state, historical_data):
+    if len(historical_data) == 0:
+        return state
+
+    session_date = historical_data[0]['begins_at'][:10]
+    if state["session_date"] != session_date:
+        state = new_intraday_state(session_date)
+
+    new_candles, applied_candle = get_new_candles(state, historical_data)
+    if state["last_begins_at"] is not None and applied_candle is None and new_candles[0]['begins_at'] != state["last_begins_at"]:
+        # No overlap with the state, rebuild it from the full data
+        state = new_intraday_state(session_date)
+        new_candles = historical_data
+
+    for item in new_candles:
+        if item['begins_at'] == state["last_begins_at"]:
+            remove_last_intraday_candle(state)
+        append_intraday_candle(state, item)
+    return state
+
+
+# Apply daily candles to the state (O(new candles), rebuilds the state when the history no longer matches)
+def apply_daily_candles(state, historical_data):
+    if len(historical_data) == 0:
+        return state
+
+    new_candles, applied_candle = get_new_candles(state, historical_data)
+    if state["last_begins_at"] is not None:
+        # Rebuild the state when the data does not overlap it or the history changed (e.g. split adjustments)
+        is_overlapping = applied_candle is not None or new_candles[0]['begins_at'] == state["last_begins_at"]
+        is_history_matching = applied_candle is None or (
+            len(state["begins_at"]) >= 2
+            and applied_candle['begins_at'] == state["begins_at"][-2]
+            and float(indicators.to_cents(indicators.round_price(applied_candle['close_price']))) == state["closes"][-2]
+        )
+        if not is_overlapping or not is_history_matching:
+            state = new_daily_state()
+            new_candles = historical_data
+
+    for item in new_candles:
+        if item['begins_at'] == state["last_begins_at"]:
+            remove_last_daily_candle(state)
+        append_daily_candle(state, item)
+    return state
+
+
+# Get indicators from the state (same format as indicators.compute_indicators_batch)
+def get_indicators(state):
+    symbol_indicators = {}
+
+    intraday_state = state["intraday"]
+    if intraday_state["count"] >= indicators.RSI_WINDOW:
+        rs = 100.0 if intraday_state["loss"] == 0 else intraday_state["gain"] / intraday_state["loss"]
+        symbol_indicators["rsi"] = 100 - (100 / (1 + rs))
+    if intraday_state["count"] >= 1 and intraday_state["volume"] != 0:
+        symbol_indicators["vwap"] = intraday_state["price_volume"] / intraday_state["volume"]
+
+    daily_state = state["daily"]
+    if daily_state["count"] >= indicators.LONG_MOVING_AVERAGE_WINDOW:
+        symbol_indicators["short_moving_average"] = math.nan if daily_state["short_nan_count"] > 0 else daily_state["short_sum"] / (indicators.SHORT_MOVING_AVERAGE_WINDOW * 100)
+        symbol_indicators["long_moving_average"] = math.nan if daily_state["long_nan_count"] > 0 else daily_state["long_sum"] / (indicators.LONG_MOVING_AVERAGE_WINDOW * 100)
+    return symbol_indicators
+
+
+# Get RSI and VWAP of a symbol with a live price as the close of the next candle (e.g. from quotes between trading cycles)
+# VWAP does not change, quotes have no volume
+def get_live_indicators(symbol, price):
+    live_indicators = {}
+    state = indicator_states.get(symbol)
+    if state is None:
+        return live_indicators
+
+    intraday_state = state["intraday"]
+    closes = [*intraday_state["closes"], float(indicators.to_cents(indicators.round_price(price)))][-(indicators.RSI_WINDOW + 1):]
+    if intraday_state["count"] + 1 >= indicators.RSI_WINDOW:
+        gain, loss = 0.0, 0.0
+        for previous_close, close in zip(closes, closes[1:]):
+            delta_gain, delta_loss = split_delta(previous_close, close)
+            gain += delta_gain
+            loss += delta_loss
+        rs = 100.0 if loss == 0 else gain / loss
+        live_indicators["rsi"] = 100 - (100 / (1 + rs))
+    if intraday_state["count"] >= 1 and intraday_state["volume"] != 0:
+        live_indicators["vwap"] = intraday_state["price_volume"] / intraday_state["volume"]
+    return live_indicators
+
+
+# Update indicator states with the latest candles and get indicators for all symbols (symbol -> indicators)
+def update_indicators(historical_data_day, historical_data_year):
+    symbols_indicators = {}
+    for symbol in [*historical_data_day.keys(), *historical_data_year.keys()]:
+        state = indicator_states.get(symbol) or {"intraday": new_intraday_state(), "daily": new_daily_state()}
+        state["intraday"] = apply_intraday_candles(state["intraday"], historical_data_day.get(symbol, []))
+        state["daily"] = apply_daily_candles(state["daily"], historical_data_year.get(symbol, []))
+        indicator_states[symbol] = state
+        symbols_indicators[symbol] = get_indicators(state)
+    return symbols_indicators
+
+
+# Reset intraday states (RSI and VWAP), e.g. at session open
+def reset_intraday_states():
+    for state in indicator_states.values():
+        state["intraday"] = new_intraday_state()
+
+
+# Reset all indicator states (forces a full recompute)
+def reset_indicator_states():
+    indicator_states.clear()
+
+
+# Save indicator states to a checkpoint file
+def save_indicator_states(path):
+    state_dir = os.path.dirname(path)
+    if state_dir:
+        os.makedirs(state_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(indicator_states, f)
+    os.replace(tmp_path, path)
+
+
+# Load indicator states from a checkpoint file (returns the number of loaded symbols)
+def load_indicator_states(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        indicator_states.update(json.load(f))
+    return len(indicator_states)
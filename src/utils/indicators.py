@@ -0,0 +1,126 @@
+import math
+import numpy as np
+
+RSI_WINDOW = 14
+SHORT_MOVING_AVERAGE_WINDOW = 50
+LONG_MOVING_AVERAGE_WINDOW = 200
+
+
+# Convert a value to float (NaN if the value is missing or invalid)
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+# Round a price the same way as round_money does (NaN if the price is missing)
+def round_price(price, decimals=2):
+    price = to_float(price)
+    return price if math.isnan(price) else round(price, decimals)
+
+
+# Parse historical data (list of dicts) once into contiguous float64 arrays
+def historical_data_to_arrays(historical_data):
+    count = len(historical_data)
+    return {
+        "close": np.fromiter((to_float(item['close_price']) for item in historical_data), dtype=np.float64, count=count),
+        "rounded_close": np.fromiter((round_price(item['close_price']) for item in historical_data), dtype=np.float64, count=count),
+        "high": np.fromiter((to_float(item['high_price']) for item in historical_data), dtype=np.float64, count=count),
+        "low": np.fromiter((to_float(item['low_price']) for item in historical_data), dtype=np.float64, count=count),
+        "volume": np.fromiter((to_float(item['volume']) for item in historical_data), dtype=np.float64, count=count),
+    }
+
+
+# Convert rounded prices to whole cents (sums of cents are exact in float64)
+def to_cents(prices):
+    return np.rint(np.asarray(prices, dtype=np.float64) * 100)
+
+
+# Build a 2-D array with the last `window` values of each row (rows shorter than the window are left-padded with NaN)
+def tail_matrix(rows, window):
+    matrix = np.full((len(rows), window), np.nan)
+    for i, row in enumerate(rows):
+        tail = row[-window:]
+        matrix[i, window - len(tail):] = tail
+    return matrix
+
+
+# Calculate RSI for multiple price series at once (rounded closes, at least RSI_WINDOW values each)
+def compute_rsi_batch(closes_list, window=RSI_WINDOW):
+    if len(closes_list) == 0:
+        return np.empty(0)
+
+    # The first price of a series has no delta, which counts as zero gain and zero loss
+    delta = np.diff(to_cents(tail_matrix(closes_list, window + 1)), axis=1)
+    with np.errstate(invalid="ignore"):
+        gain = np.where(delta > 0, delta, 0.0).sum(axis=1)
+        loss = -np.where(delta < 0, delta, 0.0).sum(axis=1)
+
+    # Average gain/loss ratio is computed from exact sums (the window size cancels out)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.where(loss == 0, 100.0, gain / loss)
+    return 100 - (100 / (1 + rs))
+
+
+# Calculate VWAP and total volume for multiple candle series at once (VWAP is NaN if total volume is zero)
+def compute_vwap_batch(arrays_list):
+    vwaps = np.full(len(arrays_list), np.nan)
+    total_volumes = np.zeros(len(arrays_list))
+    if len(arrays_list) == 0:
+        return vwaps, total_volumes
+
+    lengths = np.array([len(arrays["volume"]) for arrays in arrays_list])
+    volume = np.concatenate([arrays["volume"] for arrays in arrays_list])
+    typical_price = (np.concatenate([arrays["high"] for arrays in arrays_list]) + np.concatenate([arrays["low"] for arrays in arrays_list]) + np.concatenate([arrays["close"] for arrays in arrays_list])) / 3
+
+    # Skip candles where volume is zero or NaN
+    with np.errstate(invalid="ignore"):
+        is_traded = volume > 0
+    volume = np.where(is_traded, volume, 0.0)
+    price_volume = np.where(is_traded, volume * typical_price, 0.0)
+
+    non_empty = lengths > 0
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])[non_empty]
+    sum_of_volumes = np.add.reduceat(volume, starts)
+    dot_product = np.add.reduceat(price_volume, starts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vwaps[non_empty] = np.where(sum_of_volumes == 0, np.nan, dot_product / sum_of_volumes)
+    total_volumes[non_empty] = sum_of_volumes
+    return vwaps, total_volumes
+
+
+# Calculate moving average for multiple price series at once (rounded closes, only the last window is summed)
+def compute_moving_average_batch(closes_list, window):
+    if len(closes_list) == 0:
+        return np.empty(0)
+    return to_cents(tail_matrix(closes_list, window)).sum(axis=1) / (window * 100)
+
+
+# Calculate RSI, VWAP and moving averages for all symbols in one pass (symbol -> indicators)
+# Indicators without enough data are left out, same as in the enrich_with_* functions
+def compute_indicators_batch(historical_data_day, historical_data_year):
+    indicators = {symbol: {} for symbol in [*historical_data_day.keys(), *historical_data_year.keys()]}
+    arrays_day = {symbol: historical_data_to_arrays(historical_data) for symbol, historical_data in historical_data_day.items()}
+    arrays_year = {symbol: historical_data_to_arrays(historical_data) for symbol, historical_data in historical_data_year.items()}
+
+    rsi_symbols = [symbol for symbol, arrays in arrays_day.items() if len(arrays["rounded_close"]) >= RSI_WINDOW]
+    rsi_values = compute_rsi_batch([arrays_day[symbol]["rounded_close"] for symbol in rsi_symbols])
+    for symbol, rsi in zip(rsi_symbols, rsi_values):
+        indicators[symbol]["rsi"] = float(rsi)
+
+    vwap_symbols = [symbol for symbol, arrays in arrays_day.items() if len(arrays["volume"]) >= 1]
+    vwap_values, total_volumes = compute_vwap_batch([arrays_day[symbol] for symbol in vwap_symbols])
+    for symbol, vwap, total_volume in zip(vwap_symbols, vwap_values, total_volumes):
+        if total_volume != 0:
+            indicators[symbol]["vwap"] = float(vwap)
+
+    ma_symbols = [symbol for symbol, arrays in arrays_year.items() if len(arrays["rounded_close"]) >= LONG_MOVING_AVERAGE_WINDOW]
+    ma_closes = [arrays_year[symbol]["rounded_close"] for symbol in ma_symbols]
+    short_ma_values = compute_moving_average_batch(ma_closes, SHORT_MOVING_AVERAGE_WINDOW)
+    long_ma_values = compute_moving_average_batch(ma_closes, LONG_MOVING_AVERAGE_WINDOW)
+    for symbol, short_ma, long_ma in zip(ma_symbols, short_ma_values, long_ma_values):
+        indicators[symbol]["short_moving_average"] = float(short_ma)
+        indicators[symbol]["long_moving_average"] = float(long_ma)
+
+    return indicators
@@ -0,0 +1,219 @@
+import atexit
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from . import logger
+
+# Journal of trading cycles (SQLite in WAL mode): stock overviews, AI decisions and orders of every cycle
+# Cycles are written in batches by a background thread, so trading cycles never wait on the disk
+journal = {"path": None, "queue": None, "thread": None}
+
+# Tables and indexes (stocks, decisions and orders are indexed by symbol and time for queries over months of history)
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS cycles (id TEXT PRIMARY KEY, created_at REAL NOT NULL, profile TEXT, mode TEXT, buying_power REAL, prompt_hashes TEXT)",
+    "CREATE TABLE IF NOT EXISTS stocks (cycle_id TEXT NOT NULL, created_at REAL NOT NULL, symbol TEXT NOT NULL, list TEXT NOT NULL, current_price REAL, overview TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS decisions (cycle_id TEXT NOT NULL, created_at REAL NOT NULL, profile TEXT, symbol TEXT, decision TEXT, quantity REAL, is_filtered INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS orders (cycle_id TEXT NOT NULL, created_at REAL NOT NULL, profile TEXT, symbol TEXT NOT NULL, side TEXT NOT NULL, quantity REAL, result TEXT NOT NULL, price REAL, filled_quantity REAL, details TEXT)",
+    "CREATE INDEX IF NOT EXISTS cycles_created_at ON cycles (created_at)",
+    "CREATE INDEX IF NOT EXISTS stocks_symbol_created_at ON stocks (symbol, created_at)",
+    "CREATE INDEX IF NOT EXISTS decisions_symbol_created_at ON decisions (symbol, created_at)",
+    "CREATE INDEX IF NOT EXISTS decisions_created_at ON decisions (created_at)",
+    "CREATE INDEX IF NOT EXISTS orders_symbol_created_at ON orders (symbol, created_at)",
+    "CREATE INDEX IF NOT EXISTS orders_created_at ON orders (created_at)",
+]
+
+
+# Connect to a journal database (WAL mode lets queries read while cycles are written)
+def connect(path):
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+# Open the journal (creates the database and its tables) and start the background writer
+def open_journal(path):
+    journal_dir = os.path.dirname(path)
+    if journal_dir:
+        os.makedirs(journal_dir, exist_ok=True)
+    connection = connect(path)
+    try:
+        with connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+    finally:
+        connection.close()
+
+    journal["path"] = path
+    journal["queue"] = queue.Queue()
+    journal["thread"] = threading.Thread(target=run_writer, args=(path, journal["queue"]), name="journal-writer", daemon=True)
+    journal["thread"].start()
+
+
+# Get hash of an AI prompt (prompts are not journaled, the hash tells which cycles sent the same prompt)
+def get_prompt_hash(ai_prompt):
+    return hashlib.sha256(ai_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+# Convert a value to a float (None if it is not a number)
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Journal a trading cycle (no-op if the journal is not open), rows are built and written by the background writer
+# Decisions filtered out as AI hallucinations are journaled with is_filtered = 1
+def record_cycle(profile, mode, account_info, portfolio_overview, watchlist_overview, prompt_hashes, ai_decisions, filtered_decisions, trading_results):
+    if journal["queue"] is None:
+        return
+    journal["queue"].put({
+        "created_at": time.time(),
+        "profile": profile,
+        "mode": mode,
+        "buying_power": to_float(account_info.get("buying_power")),
+        "portfolio_overview": portfolio_overview,
+        "watchlist_overview": watchlist_overview,
+        "prompt_hashes": list(prompt_hashes),
+        "ai_decisions": list(ai_decisions),
+        "filtered_decisions": list(filtered_decisions),
+        "trading_results": list(trading_results.values()),
+    })
+
+
+# Build table rows of a journaled cycle
+def get_cycle_rows(cycle):
+    created_at = cycle["created_at"]
+    cycle_id = f"{int(created_at * 1000)}-{cycle['profile'] or ''}"
+    rows = {
+        "cycles": [(cycle_id, created_at, cycle["profile"], cycle["mode"], cycle["buying_power"], json.dumps(cycle["prompt_hashes"]))],
+        "stocks": [],
+        "decisions": [],
+        "orders": [],
+    }
+    for stocks_list, overview in [("portfolio", cycle["portfolio_overview"]), ("watchlist", cycle["watchlist_overview"])]:
+        for symbol, stock_overview in overview.items():
+            rows["stocks"].append((cycle_id, created_at, symbol, stocks_list, to_float(stock_overview.get("current_price")), json.dumps(stock_overview, separators=(",", ":"), default=str)))
+
+    kept_decisions = {id(decision) for decision in cycle["filtered_decisions"]}
+    for decision in cycle["ai_decisions"]:
+        if not isinstance(decision, dict):
+            continue
+        rows["decisions"].append((cycle_id, created_at, cycle["profile"], decision.get("symbol"), decision.get("decision"), to_float(decision.get("quantity")), 0 if id(decision) in kept_decisions else 1))
+
+    for trading_result in cycle["trading_results"]:
+        details = trading_result["details"]
+        order_data = details if isinstance(details, dict) else {}
+        rows["orders"].append((cycle_id, created_at, cycle["profile"], trading_result["symbol"], trading_result["decision"], to_float(trading_result["quantity"]), trading_result["result"], to_float(order_data.get("price")), to_float(order_data.get("quantity")), json.dumps(details, default=str)))
+    return rows
+
+
+# Write journaled cycles until the process exits (cycles queued together are written in one transaction)
+def run_writer(path, cycles_queue):
+    connection = connect(path)
+    while True:
+        cycles = [cycles_queue.get()]
+        while True:
+            try:
+                cycles.append(cycles_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            with connection:
+                for cycle in cycles:
+                    for table, rows in get_cycle_rows(cycle).items():
+                        if len(rows) > 0:
+                            connection.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+        except Exception as e:
+            logger.error(f"Error writing {len(cycles)} cycle(s) to journal {path}: {e}")
+        finally:
+            for _ in cycles:
+                cycles_queue.task_done()
+
+
+# Wait until all journaled cycles are written
+def flush():
+    if journal["queue"] is not None:
+        journal["queue"].join()
+
+
+# Run a read query on a journal (the journal of the bot by default)
+def query(sql, params=(), path=None):
+    connection = connect(path or journal["path"])
+    try:
+        return connection.execute(sql, params).fetchall()
+    finally:
+        connection.close()
+
+
+# Build a WHERE clause of journal queries by symbol, profile and time range
+def get_filters(symbol=None, profile=None, since=None, until=None, table=""):
+    prefix = f"{table}." if table else ""
+    conditions, params = [], []
+    for condition, value in [(f"{prefix}symbol = ?", symbol), (f"{prefix}profile = ?", profile), (f"{prefix}created_at >= ?", since), (f"{prefix}created_at < ?", until)]:
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    return " AND ".join(conditions) or "1", params
+
+
+# Get journaled orders (oldest first), filtered by symbol, profile and time range (epoch seconds)
+def get_orders(symbol=None, profile=None, since=None, until=None, path=None):
+    where, params = get_filters(symbol, profile, since, until)
+    rows = query(f"SELECT created_at, profile, symbol, side, quantity, result, price, filled_quantity FROM orders WHERE {where} ORDER BY created_at", params, path)
+    return [dict(zip(["created_at", "profile", "symbol", "side", "quantity", "result", "price", "filled_quantity"], row)) for row in rows]
+
+
+# Get realized PnL of filled orders per symbol (average cost method), sells before since only build up the cost basis
+def get_realized_pnl(symbol=None, profile=None, since=None, until=None, path=None):
+    where, params = get_filters(symbol, profile, None, until)
+    rows = query(f"SELECT created_at, profile, symbol, side, price, filled_quantity FROM orders WHERE {where} AND result = 'success' AND price IS NOT NULL AND filled_quantity > 0 ORDER BY created_at", params, path)
+    positions = {}
+    realized_pnl = {}
+    for created_at, order_profile, order_symbol, side, price, quantity in rows:
+        position = positions.setdefault((order_profile, order_symbol), {"quantity": 0.0, "cost": 0.0})
+        if side == "buy":
+            position["quantity"] += quantity
+            position["cost"] += quantity * price
+            continue
+        sold_quantity = min(quantity, position["quantity"])
+        if sold_quantity <= 0:
+            continue
+        average_price = position["cost"] / position["quantity"]
+        position["quantity"] -= sold_quantity
+        position["cost"] -= sold_quantity * average_price
+        if since is None or created_at >= since:
+            realized_pnl[order_symbol] = realized_pnl.get(order_symbol, 0.0) + sold_quantity * (price - average_price)
+    return {order_symbol: round(pnl, 2) for order_symbol, pnl in realized_pnl.items()}
+
+
+# Get hit rate of executed buy and sell decisions (successful orders): the price moved in the order's favor after a horizon
+# (first journaled price at least horizon_seconds after the order, orders without a later price are left out)
+# Decisions that were reconciled out, skipped by the amount limits or failed to execute have no successful order and do not count
+def get_hit_rate(horizon_seconds=3600, symbol=None, profile=None, since=None, until=None, path=None):
+    where, params = get_filters(symbol, profile, since, until, table="o")
+    rows = query(
+        "SELECT o.side, s.current_price, ("
+        "SELECT l.current_price FROM stocks l WHERE l.symbol = o.symbol AND l.created_at >= o.created_at + ? ORDER BY l.created_at LIMIT 1"
+        f") FROM orders o JOIN stocks s ON s.symbol = o.symbol AND s.created_at = o.created_at AND s.cycle_id = o.cycle_id "
+        f"WHERE {where} AND o.result = 'success' AND o.side IN ('buy', 'sell')",
+        [horizon_seconds, *params],
+        path,
+    )
+    hits, decisions = 0, 0
+    for decision, price, later_price in rows:
+        if price is None or later_price is None:
+            continue
+        decisions += 1
+        if (decision == "buy" and later_price > price) or (decision == "sell" and later_price < price):
+            hits += 1
+    return {"decisions": decisions, "hits": hits, "hit_rate": round(hits / decisions * 100, 1) if decisions > 0 else 0.0}
+
+
+atexit.register(flush)
@@ -0,0 +1,156 @@
+import copy
+import threading
+from datetime import datetime
+
+from . import logger
+from . import market_calendar
+
+# Local ledger of each Robinhood account (username -> account info, holdings in rh.build_holdings format, last full sync time,
+# the discrepancy that forces the next reconciliation and the number of orders applied since the last one)
+# Seeded from a full fetch, then kept up to date with batched price refreshes between cycles without orders
+# Orders are applied as acknowledged, the next cycle reconciles them (partial fills and rejections show up only in a full fetch)
+ledgers = {}
+ledger_lock = threading.Lock()
+
+# Quantities below this are treated as zero (fractional shares)
+QUANTITY_EPSILON = 1e-6
+
+
+# Get reason to reconcile the ledger of an account with a full fetch (None if the ledger can be used)
+def get_reconcile_reason(username, max_age_seconds, now):
+    with ledger_lock:
+        account_ledger = ledgers.get(username)
+        if account_ledger is None:
+            return "initial"
+        if account_ledger["discrepancy"] is not None:
+            return "discrepancy"
+        if account_ledger["unconfirmed_orders"] > 0:
+            return "orders"
+        # Trading days are compared in the exchange time zone, not in the time zone of the host
+        if datetime.fromtimestamp(account_ledger["synced_at"], market_calendar.MARKET_TIMEZONE).date() != datetime.fromtimestamp(now, market_calendar.MARKET_TIMEZONE).date():
+            return "session"
+        if now - account_ledger["synced_at"] >= max_age_seconds:
+            return "scheduled"
+        return None
+
+
+# Get differences between the ledger of an account and a full fetch (quantities and buying power)
+def get_differences(username, account_info, holdings):
+    with ledger_lock:
+        account_ledger = ledgers.get(username)
+        if account_ledger is None:
+            return []
+        differences = []
+        ledger_buying_power = float(account_ledger["account_info"]["buying_power"])
+        if abs(ledger_buying_power - float(account_info["buying_power"])) >= 0.01:
+            differences.append(f"buying power {round(ledger_buying_power, 2)} != {account_info['buying_power']}")
+        for symbol in sorted({*account_ledger["holdings"].keys(), *holdings.keys()}):
+            ledger_quantity = float(account_ledger["holdings"].get(symbol, {}).get("quantity", 0))
+            quantity = float(holdings.get(symbol, {}).get("quantity", 0))
+            if abs(ledger_quantity - quantity) >= QUANTITY_EPSILON:
+                differences.append(f"{symbol} quantity {round(ledger_quantity, 6)} != {round(quantity, 6)}")
+        return differences
+
+
+# Seed the ledger of an account from a full fetch
+def seed(username, account_info, holdings, now):
+    with ledger_lock:
+        ledgers[username] = {
+            "account_info": copy.deepcopy(account_info),
+            "holdings": copy.deepcopy(holdings),
+            "synced_at": now,
+            "discrepancy": None,
+            "unconfirmed_orders": 0,
+        }
+
+
+# Get symbols held in the ledger of an account
+def get_symbols(username):
+    with ledger_lock:
+        return list(ledgers[username]["holdings"].keys())
+
+
+# Get account info and holdings of an account from the ledger (copies, callers may change them)
+def get_state(username):
+    with ledger_lock:
+        account_ledger = ledgers[username]
+        return copy.deepcopy(account_ledger["account_info"]), copy.deepcopy(account_ledger["holdings"])
+
+
+# Refresh prices of the holdings of an account (symbol -> latest price), missing prices force a reconciliation
+def update_prices(username, prices):
+    with ledger_lock:
+        account_ledger = ledgers[username]
+        for symbol, holding in account_ledger["holdings"].items():
+            if symbol not in prices:
+                set_discrepancy(account_ledger, f"no latest price for {symbol}")
+                continue
+            holding["price"] = str(prices[symbol])
+            holding["equity"] = str(round(float(prices[symbol]) * float(holding["quantity"]), 2))
+
+
+# Apply an acknowledged order to the ledger of an account (assumed to fill at the acknowledged price until the next reconciliation)
+def apply_order(username, symbol, side, quantity, price):
+    with ledger_lock:
+        account_ledger = ledgers.get(username)
+        if account_ledger is None:
+            return
+        account_ledger["unconfirmed_orders"] += 1
+        holdings = account_ledger["holdings"]
+        holding = holdings.get(symbol)
+        held_quantity = float(holding["quantity"]) if holding else 0.0
+        buying_power = float(account_ledger["account_info"]["buying_power"])
+
+        if side == "buy":
+            average_buy_price = float(holding["average_buy_price"]) if holding else 0.0
+            new_quantity = held_quantity + quantity
+            holdings[symbol] = {
+                **(holding or {}),
+                "price": str(price),
+                "quantity": str(new_quantity),
+                "average_buy_price": str((held_quantity * average_buy_price + quantity * price) / new_quantity),
+                "equity": str(round(new_quantity * price, 2)),
+            }
+            buying_power -= quantity * price
+        else:
+            if quantity > held_quantity + QUANTITY_EPSILON:
+                set_discrepancy(account_ledger, f"sold {quantity} of {symbol}, ledger holds {held_quantity}")
+                return
+            new_quantity = held_quantity - quantity
+            if new_quantity < QUANTITY_EPSILON:
+                del holdings[symbol]
+            else:
+                holdings[symbol] = {**holding, "price": str(price), "quantity": str(new_quantity), "equity": str(round(new_quantity * price, 2))}
+            buying_power += quantity * price
+
+        account_ledger["account_info"]["buying_power"] = round(buying_power, 2)
+        if buying_power < 0:
+            set_discrepancy(account_ledger, f"negative buying power {round(buying_power, 2)}")
+
+
+# Record a discrepancy of a ledger (call with ledger_lock held, the first one is kept)
+def set_discrepancy(account_ledger, reason):
+    logger.debug(f"Ledger discrepancy: {reason}")
+    if account_ledger["discrepancy"] is None:
+        account_ledger["discrepancy"] = reason
+
+
+# Flag a discrepancy of the ledger of an account (e.g. an order with unknown outcome), the next cycle reconciles it
+def flag_discrepancy(username, reason):
+    with ledger_lock:
+        account_ledger = ledgers.get(username)
+        if account_ledger is not None:
+            set_discrepancy(account_ledger, reason)
+
+
+# Get the discrepancy that forces the next reconciliation of an account (None if there is none)
+def get_discrepancy(username):
+    with ledger_lock:
+        account_ledger = ledgers.get(username)
+        return None if account_ledger is None else account_ledger["discrepancy"]
+
+
+# Clear ledgers of all accounts
+def reset():
+    with ledger_lock:
+        ledgers.clear()
@@ -1,38 +1,168 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
-from config import LOG_LEVEL
+from config import LOG_LEVEL, LOG_FORMAT, LOG_FILE, LOG_FILE_MAX_BYTES, LOG_FILE_BACKUP_COUNT, LOG_ASYNC
+
+# Log levels (level -> severity) and their colored prefixes, built once instead of on every call
+LOG_LEVELS = {"DEBUG": 1, "INFO": 2, "WARNING": 3, "ERROR": 4}
+LEVEL_COLOR_CODES = {
+    "DEBUG": "\033[94m",
+    "INFO": "\033[92m",
+    "WARNING": "\033[93m",
+    "ERROR": "\033[91m"
+}
+TIMESTAMP_COLOR_CODE = "\033[96m"
+RESET_COLOR_CODE = "\033[0m"
+LEVEL_PREFIXES = {level: f"{LEVEL_COLOR_CODES[level]}[{level}]{RESET_COLOR_CODE}{' ' * (8 - len(level))}" for level in LOG_LEVELS}
+PLAIN_LEVEL_PREFIXES = {level: f"[{level}]{' ' * (8 - len(level))}" for level in LOG_LEVELS}
+
+# Background writer of log records (records are formatted and written off the caller's thread)
+writer = {"queue": None, "thread": None, "pid": None}
+writer_lock = threading.Lock()
+
+# Log file sink (opened on first write, rotated by size)
+log_file = {"file": None, "size": 0}
+
+# Last formatted timestamp (second -> text), log lines of the same second reuse it
+timestamp_cache = {"second": None, "text": ""}
+
+
+# Check if messages of a log level are printed (e.g. to skip building expensive debug data)
+def is_enabled(level):
+    return LOG_LEVELS.get(level, 2) >= LOG_LEVELS.get(LOG_LEVEL, 2)
+
+
+# Format a timestamp of a log record
+def format_timestamp(created_at):
+    second = int(created_at)
+    if timestamp_cache["second"] != second:
+        timestamp_cache["second"] = second
+        timestamp_cache["text"] = datetime.fromtimestamp(second).strftime('%Y-%m-%d %H:%M:%S')
+    return timestamp_cache["text"]
+
+
+# Format a log record as a line of text or JSON (colored prefixes only on the console)
+def format_record(record, colored):
+    level, created_at, msg, fields = record
+    if LOG_FORMAT == "json":
+        return json.dumps({"time": datetime.fromtimestamp(created_at).isoformat(timespec="milliseconds"), "level": level, "message": msg, **fields}, default=str)
+    timestamp = format_timestamp(created_at)
+    if fields:
+        msg = f"{msg} {' '.join(f'{key}={value}' for key, value in fields.items())}"
+    if colored:
+        return f"{TIMESTAMP_COLOR_CODE}[{timestamp}] {LEVEL_PREFIXES[level]}{msg}"
+    return f"[{timestamp}] {PLAIN_LEVEL_PREFIXES[level]}{msg}"
+
+
+# Write a line to the log file, rotating it when it exceeds LOG_FILE_MAX_BYTES (LOG_FILE.1 is the newest backup)
+def write_to_file(line):
+    if log_file["file"] is None:
+        log_dir = os.path.dirname(LOG_FILE)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        log_file["file"] = open(LOG_FILE, "a", encoding="utf-8")
+        log_file["size"] = log_file["file"].tell()
+    data = line + "\n"
+    if LOG_FILE_MAX_BYTES and log_file["size"] > 0 and log_file["size"] + len(data) > LOG_FILE_MAX_BYTES:
+        log_file["file"].close()
+        for index in range(LOG_FILE_BACKUP_COUNT - 1, 0, -1):
+            if os.path.exists(f"{LOG_FILE}.{index}"):
+                os.replace(f"{LOG_FILE}.{index}", f"{LOG_FILE}.{index + 1}")
+        if LOG_FILE_BACKUP_COUNT > 0:
+            os.replace(LOG_FILE, f"{LOG_FILE}.1")
+        else:
+            os.remove(LOG_FILE)
+        log_file["file"] = open(LOG_FILE, "a", encoding="utf-8")
+        log_file["size"] = 0
+    log_file["file"].write(data)
+    log_file["size"] += len(data)
+
+
+# Write log records to the console and the log file
+def write_records(records):
+    sys.stdout.write("".join(format_record(record, True) + "\n" for record in records))
+    sys.stdout.flush()
+    if LOG_FILE:
+        for record in records:
+            write_to_file(format_record(record, False))
+        log_file["file"].flush()
+
+
+# Write queued log records until the process exits (records queued together are written together)
+def run_writer(records_queue):
+    while True:
+        records = [records_queue.get()]
+        while True:
+            try:
+                records.append(records_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            write_records(records)
+        except Exception as e:
+            sys.stderr.write(f"Failed to write log records: {e}\n")
+        finally:
+            for _ in records:
+                records_queue.task_done()
+
+
+# Get the queue of the background writer (started on first use, and again in forked processes)
+def get_writer_queue():
+    if writer["pid"] == os.getpid():
+        return writer["queue"]
+    with writer_lock:
+        if writer["pid"] != os.getpid():
+            writer["queue"] = queue.Queue()
+            writer["thread"] = threading.Thread(target=run_writer, args=(writer["queue"],), name="log-writer", daemon=True)
+            writer["thread"].start()
+            writer["pid"] = os.getpid()
+    return writer["queue"]
+
+
+# Wait until all queued log records are written (e.g. before printing to stdout directly)
+def flush():
+    if writer["pid"] == os.getpid():
+        writer["queue"].join()
+
 
 # Print log message
-def log(level, msg):
-    log_levels = {"DEBUG": 1, "INFO": 2, "WARNING": 3, "ERROR": 4}
-    level_color_codes = {
-        "DEBUG": "\033[94m",
-        "INFO": "\033[92m",
-        "WARNING": "\033[93m",
-        "ERROR": "\033[91m"
-    }
-    timestamp_color_code = "\033[96m"
-    reset_color_code = "\033[0m"
-    if log_levels.get(level, 2) >= log_levels.get(LOG_LEVEL, 2):
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        level_space = " " * (8 - len(level))
-        print(f"{timestamp_color_code}[{timestamp}] {level_color_codes[level]}[{level}]{reset_color_code}{level_space}{msg}")
+# The message can be a callable that returns it, so expensive messages are only built if the level is enabled
+def log(level, msg, **fields):
+    if LOG_LEVELS.get(level, 2) < LOG_LEVELS.get(LOG_LEVEL, 2):
+        return
+    if callable(msg):
+        msg = msg()
+    record = (level, time.time(), msg, fields)
+    if LOG_ASYNC:
+        get_writer_queue().put(record)
+    else:
+        with writer_lock:
+            write_records([record])
 
 
 # Print debug log message
-def debug(msg):
-    log("DEBUG", msg)
+def debug(msg, **fields):
+    log("DEBUG", msg, **fields)
 
 
 # Print info log message
-def info(msg):
-    log("INFO", msg)
+def info(msg, **fields):
+    log("INFO", msg, **fields)
 
 
 # Print warning log message
-def warning(msg):
-    log("WARNING", msg)
+def warning(msg, **fields):
+    log("WARNING", msg, **fields)
 
 
 # Print error log message
-def error(msg):
-    log("ERROR", msg)
+def error(msg, **fields):
+    log("ERROR", msg, **fields)
+
+
+atexit.register(flush)
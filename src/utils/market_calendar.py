@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+from pytz import timezone
+
+from . import logger
+
+# Exchange time zone and regular trading hours (hour, minute)
+MARKET_TIMEZONE = timezone('US/Eastern')
+MARKET_OPEN_TIME = (9, 30)
+MARKET_CLOSE_TIME = (16, 0)
+EARLY_CLOSE_TIME = (13, 0)
+
+# NYSE full-day holidays (date -> holiday)
+MARKET_HOLIDAYS = {
+    "2024-01-01": "New Year's Day",
+    "2024-01-15": "Martin Luther King, Jr. Day",
+    "2024-02-19": "Washington's Birthday",
+    "2024-03-29": "Good Friday",
+    "2024-05-27": "Memorial Day",
+    "2024-06-19": "Juneteenth National Independence Day",
+    "2024-07-04": "Independence Day",
+    "2024-09-02": "Labor Day",
+    "2024-11-28": "Thanksgiving Day",
+    "2024-12-25": "Christmas Day",
+    "2025-01-01": "New Year's Day",
+    "2025-01-09": "National Day of Mourning for President Jimmy Carter",
+    "2025-01-20": "Martin Luther King, Jr. Day",
+    "2025-02-17": "Washington's Birthday",
+    "2025-04-18": "Good Friday",
+    "2025-05-26": "Memorial Day",
+    "2025-06-19": "Juneteenth National Independence Day",
+    "2025-07-04": "Independence Day",
+    "2025-09-01": "Labor Day",
+    "2025-11-27": "Thanksgiving Day",
+    "2025-12-25": "Christmas Day",
+    "2026-01-01": "New Year's Day",
+    "2026-01-19": "Martin Luther King, Jr. Day",
+    "2026-02-16": "Washington's Birthday",
+    "2026-04-03": "Good Friday",
+    "2026-05-25": "Memorial Day",
+    "2026-06-19": "Juneteenth National Independence Day",
+    "2026-07-03": "Independence Day (observed)",
+    "2026-09-07": "Labor Day",
+    "2026-11-26": "Thanksgiving Day",
+    "2026-12-25": "Christmas Day",
+    "2027-01-01": "New Year's Day",
+    "2027-01-18": "Martin Luther King, Jr. Day",
+    "2027-02-15": "Washington's Birthday",
+    "2027-03-26": "Good Friday",
+    "2027-05-31": "Memorial Day",
+    "2027-06-18": "Juneteenth National Independence Day (observed)",
+    "2027-07-05": "Independence Day (observed)",
+    "2027-09-06": "Labor Day",
+    "2027-11-25": "Thanksgiving Day",
+    "2027-12-24": "Christmas Day (observed)",
+}
+
+# NYSE early closes at 1:00 p.m. Eastern (date -> reason)
+MARKET_EARLY_CLOSES = {
+    "2024-07-03": "Day before Independence Day",
+    "2024-11-29": "Day after Thanksgiving",
+    "2024-12-24": "Christmas Eve",
+    "2025-07-03": "Day before Independence Day",
+    "2025-11-28": "Day after Thanksgiving",
+    "2025-12-24": "Christmas Eve",
+    "2026-11-27": "Day after Thanksgiving",
+    "2026-12-24": "Christmas Eve",
+    "2027-11-26": "Day after Thanksgiving",
+}
+
+# Years covered by the calendar (other years only have weekday sessions with regular hours)
+CALENDAR_YEARS = range(2024, 2028)
+
+# Years outside of the calendar that were already warned about
+warned_years = set()
+
+
+# Get open and close time of the trading session on a day (None if the market is closed all day)
+def get_session(day):
+    if day.weekday() >= 5:
+        return None
+    if day.year not in CALENDAR_YEARS and day.year not in warned_years:
+        warned_years.add(day.year)
+        logger.warning(f"No market holidays known for {day.year}, assuming regular weekday sessions")
+    day_key = day.strftime("%Y-%m-%d")
+    if day_key in MARKET_HOLIDAYS:
+        return None
+    close_time = EARLY_CLOSE_TIME if day_key in MARKET_EARLY_CLOSES else MARKET_CLOSE_TIME
+    session_open = MARKET_TIMEZONE.localize(datetime(day.year, day.month, day.day, *MARKET_OPEN_TIME))
+    session_close = MARKET_TIMEZONE.localize(datetime(day.year, day.month, day.day, *close_time))
+    return session_open, session_close
+
+
+# Get the trading session in progress or the next one (open and close time)
+def get_next_session(now):
+    now = now.astimezone(MARKET_TIMEZONE)
+    day = now.date()
+    while True:
+        session = get_session(day)
+        if session is not None and now < session[1]:
+            return session
+        day += timedelta(days=1)
+
+
+# Check if the market is open (regular hours of trading days, holidays and early closes excluded)
+def is_market_open(now=None):
+    now = now or datetime.now(MARKET_TIMEZONE)
+    session_open, session_close = get_next_session(now)
+    return session_open <= now < session_close
+
+
+# Check if a time is the open of a trading session
+def is_session_open(now):
+    session = get_session(now.astimezone(MARKET_TIMEZONE).date())
+    return session is not None and session[0] == now
+
+
+# Get time of the next trading cycle after a cycle started at a given time
+# Aligned cycles start on wall-clock multiples of the interval (e.g. :00, :10, :20 for 10 minutes), cycles that would start
+# after the session close move to the open of the next session
+def get_next_cycle_time(started_at, interval_seconds, align=True):
+    started_at = started_at.astimezone(MARKET_TIMEZONE)
+    if align:
+        midnight = MARKET_TIMEZONE.localize(datetime.combine(started_at.date(), datetime.min.time()))
+        intervals = int((started_at - midnight).total_seconds() // interval_seconds) + 1
+        next_cycle_at = MARKET_TIMEZONE.normalize(midnight + timedelta(seconds=intervals * interval_seconds))
+    else:
+        next_cycle_at = started_at + timedelta(seconds=interval_seconds)
+    session_open, session_close = get_next_session(started_at)
+    if next_cycle_at < session_open:
+        return session_open
+    if next_cycle_at < session_close:
+        return next_cycle_at
+    return get_next_session(session_close)[0]
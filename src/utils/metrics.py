@@ -0,0 +1,154 @@
+import bisect
+import contextlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram buckets for durations (seconds) and prompt sizes (tokens)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+# Metric definitions (name -> type, help text, histogram buckets)
+METRICS = {
+    "trading_bot_stage_duration_seconds": ("histogram", "Duration of trading cycle stages", DURATION_BUCKETS),
+    "trading_bot_cycles_total": ("counter", "Trading cycles by result", None),
+    "trading_bot_last_cycle_duration_seconds": ("gauge", "Duration of the last trading cycle", None),
+    "trading_bot_last_cycle_timestamp_seconds": ("gauge", "Unix time of the last trading cycle end", None),
+    "trading_bot_stocks": ("gauge", "Stocks analyzed in the last trading cycle", None),
+    "trading_bot_decisions_total": ("counter", "AI decisions after filtering by decision type", None),
+    "trading_bot_triggered_stocks_total": ("counter", "Stocks that crossed a trigger in trigger mode", None),
+    "trading_bot_ledger_reconciliations_total": ("counter", "Full account fetches reconciling the local ledger by reason", None),
+    "trading_bot_robinhood_call_duration_seconds": ("histogram", "Duration of Robinhood calls including retries", DURATION_BUCKETS),
+    "trading_bot_robinhood_retries_total": ("counter", "Retried Robinhood calls", None),
+    "trading_bot_robinhood_throttled_total": ("counter", "Robinhood calls throttled by the API", None),
+    "trading_bot_robinhood_errors_total": ("counter", "Failed Robinhood calls", None),
+    "trading_bot_ai_request_duration_seconds": ("histogram", "Duration of AI requests", DURATION_BUCKETS),
+    "trading_bot_ai_prompt_tokens": ("histogram", "Estimated AI prompt size in tokens", TOKEN_BUCKETS),
+    "trading_bot_ai_tokens_total": ("counter", "AI tokens reported by the API by kind", None),
+    "trading_bot_ai_decision_cache_stocks_total": ("counter", "Stock decisions reused from the last AI request or requested again", None),
+    "trading_bot_order_duration_seconds": ("histogram", "Duration of order submissions", DURATION_BUCKETS),
+    "trading_bot_orders_total": ("counter", "Submitted orders by side and result", None),
+}
+
+# Metric values (name -> labels -> value, histograms keep bucket counts, sum and count)
+metric_values = {name: {} for name in METRICS}
+metrics_lock = threading.Lock()
+
+
+# Make a labels key (sorted label items)
+def make_labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+# Increase a counter
+def increment(name, value=1, **labels):
+    key = make_labels(labels)
+    with metrics_lock:
+        metric_values[name][key] = metric_values[name].get(key, 0) + value
+
+
+# Set a gauge
+def set_gauge(name, value, **labels):
+    with metrics_lock:
+        metric_values[name][make_labels(labels)] = value
+
+
+# Add a value to a histogram
+def observe(name, value, **labels):
+    buckets = METRICS[name][2]
+    key = make_labels(labels)
+    bucket_index = bisect.bisect_left(buckets, value)
+    with metrics_lock:
+        histogram = metric_values[name].get(key)
+        if histogram is None:
+            histogram = metric_values[name][key] = {"buckets": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+        histogram["buckets"][bucket_index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+# Time a block of code into a duration histogram
+@contextlib.contextmanager
+def span(name, **labels):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started_at, **labels)
+
+
+# Time a trading cycle stage
+def stage(stage_name):
+    return span("trading_bot_stage_duration_seconds", stage=stage_name)
+
+
+# Format labels in Prometheus text format
+def format_labels(key, extra_labels=()):
+    items = [*key, *extra_labels]
+    if len(items) == 0:
+        return ""
+    return "{" + ",".join(f'{label}="{value}"' for label, value in items) + "}"
+
+
+# Render all metrics in Prometheus text exposition format
+def render():
+    lines = []
+    with metrics_lock:
+        for name, (metric_type, help_text, buckets) in METRICS.items():
+            values = metric_values[name]
+            if len(values) == 0:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for key, value in sorted(values.items()):
+                if metric_type != "histogram":
+                    lines.append(f"{name}{format_labels(key)} {value}")
+                    continue
+                cumulative_count = 0
+                for bucket, count in zip([*buckets, "+Inf"], value["buckets"]):
+                    cumulative_count += count
+                    lines.append(f"{name}_bucket{format_labels(key, [('le', bucket)])} {cumulative_count}")
+                lines.append(f"{name}_sum{format_labels(key)} {value['sum']}")
+                lines.append(f"{name}_count{format_labels(key)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+# Write metrics to a file atomically (e.g. for the node_exporter textfile collector)
+def write_metrics_file(path):
+    metrics_dir = os.path.dirname(path)
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+# Serve metrics over HTTP in a background thread (GET /metrics)
+def start_http_server(port, host="0.0.0.0"):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http-server", daemon=True).start()
+    return server
+
+
+# Reset all metric values
+def reset():
+    with metrics_lock:
+        for values in metric_values.values():
+            values.clear()
@@ -0,0 +1,103 @@
+import threading
+from datetime import datetime, timedelta
+
+from . import logger
+
+# Local day trade record of each Robinhood account (username -> day, sides traded today per symbol, day trades of past days
+# and when Robinhood last confirmed each symbol unrestricted)
+# PDT restrictions only change when the account trades, so stocks not traded today are not restricted once Robinhood confirmed it
+# Confirmations expire, so trades made outside the bot are caught even without the ledger noticing them
+pdt_records = {}
+pdt_lock = threading.Lock()
+
+# Day trades are counted over this many business days (PDT rule: 4 or more day trades in 5 business days)
+DAY_TRADE_WINDOW_DAYS = 5
+
+
+# Get record of an account for a day (call with pdt_lock held), no symbol is confirmed in the first record of a process
+def get_record(username, day):
+    record = pdt_records.get(username)
+    if record is None:
+        record = pdt_records[username] = {"day": day, "traded": {}, "day_trades": [], "checked": {}}
+    elif record["day"] != day:
+        record["day"] = day
+        record["traded"] = {}
+    return record
+
+
+# Get symbols whose restrictions must be requested from Robinhood: symbols traded today and symbols without a confirmation
+# from the last max_age_seconds
+def get_symbols_to_check(username, symbols, day, now, max_age_seconds):
+    with pdt_lock:
+        record = get_record(username, day)
+        return [symbol for symbol in symbols if symbol in record["traded"] or now - record["checked"].get(symbol, float("-inf")) >= max_age_seconds]
+
+
+# Get PDT restrictions of symbols (symbol -> (is_buy_pdt_restricted, is_sell_pdt_restricted))
+# checked_flags has restrictions requested from Robinhood (None if the request failed, the symbol is left out and requested again next cycle)
+def get_restrictions(username, symbols, checked_flags, day, now):
+    with pdt_lock:
+        record = get_record(username, day)
+        restrictions = {}
+        for symbol in symbols:
+            if symbol not in checked_flags:
+                restrictions[symbol] = (False, False)
+                continue
+            flags = checked_flags[symbol]
+            if flags is None:
+                record["checked"].pop(symbol, None)
+                continue
+            if any(flags):
+                # Restricted by trades we did not record (e.g. placed before the bot started), keep requesting it today
+                record["traded"].setdefault(symbol, set())
+            else:
+                record["checked"][symbol] = now
+            restrictions[symbol] = flags
+        return restrictions
+
+
+# Record an executed order of an account (a sell of a stock bought the same day is a day trade)
+def record_order(username, symbol, side, day):
+    with pdt_lock:
+        record = get_record(username, day)
+        sides = record["traded"].setdefault(symbol, set())
+        if side == "sell" and "buy" in sides:
+            record["day_trades"].append((day, symbol))
+            logger.debug(f"{symbol} > Day trade recorded")
+        sides.add(side)
+
+
+# Flag restrictions of an account as uncertain (of a symbol, e.g. an order with unknown outcome, or of all symbols)
+def flag_uncertain(username, day, symbol=None):
+    with pdt_lock:
+        record = get_record(username, day)
+        if symbol is None:
+            record["checked"].clear()
+        else:
+            record["traded"].setdefault(symbol, set())
+
+
+# Get first day of the day trade window ending on a day (weekends are skipped, holidays are not)
+def get_window_start(day):
+    window_start = datetime.strptime(day, "%Y-%m-%d")
+    business_days = 1
+    while business_days < DAY_TRADE_WINDOW_DAYS:
+        window_start -= timedelta(days=1)
+        if window_start.weekday() < 5:
+            business_days += 1
+    return window_start.strftime("%Y-%m-%d")
+
+
+# Get number of day trades of an account in the day trade window (older day trades are dropped)
+def get_day_trade_count(username, day):
+    window_start = get_window_start(day)
+    with pdt_lock:
+        record = get_record(username, day)
+        record["day_trades"] = [day_trade for day_trade in record["day_trades"] if day_trade[0] >= window_start]
+        return len(record["day_trades"])
+
+
+# Clear records of all accounts
+def reset():
+    with pdt_lock:
+        pdt_records.clear()
@@ -0,0 +1,156 @@
+import csv
+import io
+import json
+
+# Numeric/flag fields of the stock data, in table column order
+TABLE_FIELDS = [
+    "current_price",
+    "my_quantity",
+    "my_average_buy_price",
+    "rsi",
+    "vwap",
+    "50_day_mavg_price",
+    "200_day_mavg_price",
+    "is_buy_pdt_restricted",
+    "is_sell_pdt_restricted",
+]
+
+# Analyst summary fields in table column order (column name -> summary key)
+TABLE_SUMMARY_FIELDS = {
+    "analyst_buy": "num_buy_ratings",
+    "analyst_hold": "num_hold_ratings",
+    "analyst_sell": "num_sell_ratings",
+}
+
+
+# Estimate number of LLM tokens in a text (about 4 characters per token for English text and JSON)
+def estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+# Truncate analyst rating texts to a max number of characters (False - keep full texts)
+def truncate_ratings_text(stocks_data, limit):
+    if limit is False or limit is None:
+        return stocks_data
+    truncated_stocks_data = {}
+    for symbol, stock_data in stocks_data.items():
+        stock_data = dict(stock_data)
+        if "analyst_ratings" in stock_data:
+            stock_data["analyst_ratings"] = [
+                {**rating, "text": rating["text"] if len(rating["text"]) <= limit else rating["text"][:limit].rstrip() + "..."}
+                for rating in stock_data["analyst_ratings"]
+            ]
+        truncated_stocks_data[symbol] = stock_data
+    return truncated_stocks_data
+
+
+# Remove fields from stock data
+def drop_fields(stocks_data, fields):
+    return {symbol: {key: value for key, value in stock_data.items() if key not in fields} for symbol, stock_data in stocks_data.items()}
+
+
+# Encode stock data as indented JSON
+def encode_json(stocks_data):
+    return f"```json\n{json.dumps(stocks_data, indent=1)}\n```"
+
+
+# Encode stock data as JSON without whitespace
+def encode_compact(stocks_data):
+    return f"```json\n{json.dumps(stocks_data, separators=(',', ':'))}\n```"
+
+
+# Format a table cell value
+def format_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+# Encode numeric fields as a CSV table and analyst ratings as separate lines
+def encode_table(stocks_data):
+    fields = [field for field in TABLE_FIELDS if any(field in stock_data for stock_data in stocks_data.values())]
+    summary_fields = {column: key for column, key in TABLE_SUMMARY_FIELDS.items() if any(key in (stock_data.get("analyst_summary") or {}) for stock_data in stocks_data.values())}
+
+    table = io.StringIO()
+    writer = csv.writer(table, lineterminator="\n")
+    writer.writerow(["symbol", *fields, *summary_fields.keys()])
+    for symbol, stock_data in stocks_data.items():
+        summary = stock_data.get("analyst_summary") or {}
+        writer.writerow([symbol, *[format_cell(stock_data.get(field)) for field in fields], *[format_cell(summary.get(key)) for key in summary_fields.values()]])
+
+    ratings = io.StringIO()
+    ratings_writer = csv.writer(ratings, delimiter="|", lineterminator="\n")
+    for symbol, stock_data in stocks_data.items():
+        for rating in stock_data.get("analyst_ratings", []):
+            ratings_writer.writerow([symbol, rating["published_at"][:10], rating["type"], rating["text"].replace("\n", " ")])
+
+    encoded = f"```csv\n{table.getvalue()}```"
+    if ratings.getvalue():
+        encoded += f"\nAnalyst ratings (symbol|published_at|type|text):\n```\n{ratings.getvalue()}```"
+    return encoded
+
+
+# Available stock data encoders
+ENCODERS = {
+    "json": encode_json,
+    "compact": encode_compact,
+    "table": encode_table,
+}
+
+# Steps to shrink stock data when over the token budget (lowest-priority fields go first)
+TRIM_STEPS = [
+    ("ratings text truncated to 100 characters", lambda stocks_data: truncate_ratings_text(stocks_data, 100)),
+    ("ratings text truncated to 40 characters", lambda stocks_data: truncate_ratings_text(stocks_data, 40)),
+    ("analyst ratings removed", lambda stocks_data: drop_fields(stocks_data, ["analyst_ratings"])),
+    ("analyst summary removed", lambda stocks_data: drop_fields(stocks_data, ["analyst_summary"])),
+    ("moving averages removed", lambda stocks_data: drop_fields(stocks_data, ["50_day_mavg_price", "200_day_mavg_price"])),
+    ("VWAP removed", lambda stocks_data: drop_fields(stocks_data, ["vwap"])),
+]
+
+
+# Keep the highest-priority stocks whose encoding fits into a token budget (stocks are in priority order, portfolio first)
+def drop_lowest_priority_stocks(stocks_data, encoder, token_budget):
+    symbols = list(stocks_data.keys())
+    low, high = 0, len(symbols)
+    while low < high:
+        count = (low + high + 1) // 2
+        if estimate_tokens(encoder({symbol: stocks_data[symbol] for symbol in symbols[:count]})) <= token_budget:
+            low = count
+        else:
+            high = count - 1
+    return {symbol: stocks_data[symbol] for symbol in symbols[:low]}
+
+
+# Encode stock data for the AI prompt
+# Returns the encoded text and the list of applied trim steps (to fit into the token budget, False - no budget)
+# When trimming fields is not enough, the lowest-priority stocks are removed and added to dropped_symbols (if given)
+def encode_stocks_data(stocks_data, encoding="json", ratings_text_limit=False, token_budget=False, reserved_tokens=0, dropped_symbols=None):
+    if encoding not in ENCODERS:
+        raise Exception(f"Unknown prompt encoding: {encoding} (available: {', '.join(ENCODERS.keys())})")
+    encoder = ENCODERS[encoding]
+
+    stocks_data = truncate_ratings_text(stocks_data, ratings_text_limit)
+    encoded = encoder(stocks_data)
+    applied_trim_steps = []
+    if token_budget is False or token_budget is None:
+        return encoded, applied_trim_steps
+
+    for trim_step_name, trim_step in TRIM_STEPS:
+        if reserved_tokens + estimate_tokens(encoded) <= token_budget:
+            break
+        stocks_data = trim_step(stocks_data)
+        encoded = encoder(stocks_data)
+        applied_trim_steps.append(trim_step_name)
+
+    if reserved_tokens + estimate_tokens(encoded) > token_budget:
+        kept_stocks_data = drop_lowest_priority_stocks(stocks_data, encoder, token_budget - reserved_tokens)
+        encoded = encoder(kept_stocks_data)
+        if reserved_tokens + estimate_tokens(encoded) > token_budget:
+            raise Exception(f"AI prompt does not fit token budget of {token_budget} even without stock data (~{reserved_tokens + estimate_tokens(encoded)} tokens)")
+        removed_symbols = [symbol for symbol in stocks_data if symbol not in kept_stocks_data]
+        applied_trim_steps.append(f"{len(removed_symbols)} lowest-priority stock(s) removed ({', '.join(removed_symbols)})")
+        if dropped_symbols is not None:
+            dropped_symbols.extend(removed_symbols)
+    return encoded, applied_trim_steps
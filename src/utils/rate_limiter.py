@@ -0,0 +1,131 @@
+import random
+import threading
+import time
+
+# Shared token bucket for all requests made through the installed session
+# The rate is adaptive: halved when the API throttles us, then slowly restored on successful requests
+bucket = {
+    "max_rate": 5.0,
+    "min_rate": 0.2,
+    "rate": 5.0,
+    "capacity": 10.0,
+    "tokens": 10.0,
+    "updated_at": time.monotonic(),
+}
+bucket_lock = threading.Lock()
+
+# Per-thread context of the current call (status codes and wait time of the requests it made)
+call_context = threading.local()
+
+
+# Configure the token bucket (requests per second and burst size)
+def configure(rate, burst):
+    with bucket_lock:
+        bucket["max_rate"] = float(rate)
+        bucket["min_rate"] = min(bucket["min_rate"], float(rate))
+        bucket["rate"] = float(rate)
+        bucket["capacity"] = float(max(1, burst))
+        bucket["tokens"] = bucket["capacity"]
+        bucket["updated_at"] = time.monotonic()
+
+
+# Refill tokens based on the elapsed time (call with bucket_lock held)
+def refill(now):
+    bucket["tokens"] = min(bucket["capacity"], bucket["tokens"] + (now - bucket["updated_at"]) * bucket["rate"])
+    bucket["updated_at"] = now
+
+
+# Wait for a token (returns the number of seconds waited)
+def acquire():
+    waited = 0.0
+    while True:
+        with bucket_lock:
+            now = time.monotonic()
+            refill(now)
+            if bucket["tokens"] >= 1:
+                bucket["tokens"] -= 1
+                return waited
+            wait_seconds = (1 - bucket["tokens"]) / bucket["rate"]
+        time.sleep(wait_seconds)
+        waited += wait_seconds
+
+
+# Slow down after the API throttled a request (multiplicative decrease)
+def on_throttled():
+    with bucket_lock:
+        bucket["rate"] = max(bucket["min_rate"], bucket["rate"] / 2)
+        bucket["tokens"] = 0.0
+        bucket["updated_at"] = time.monotonic()
+
+
+# Speed up after a successful request (additive increase up to the configured rate)
+def on_success():
+    with bucket_lock:
+        bucket["rate"] = min(bucket["max_rate"], bucket["rate"] + bucket["max_rate"] * 0.05)
+
+
+# Get current request rate (requests per second)
+def get_rate():
+    with bucket_lock:
+        return bucket["rate"]
+
+
+# Get exponential backoff delay with full jitter (Retry-After takes precedence when provided)
+def get_backoff_delay(attempt, base_delay, max_delay, retry_after=None):
+    if retry_after is not None:
+        return min(max_delay, retry_after)
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+# Parse Retry-After header in seconds (None if missing or not a number)
+def parse_retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+# Start tracking requests of a call in the current thread
+def begin_call():
+    call_context.statuses = []
+    call_context.wait_seconds = 0.0
+    call_context.retry_after = None
+
+
+# Stop tracking requests of a call in the current thread (returns status codes, wait time and Retry-After)
+def end_call():
+    statuses = getattr(call_context, "statuses", None) or []
+    wait_seconds = getattr(call_context, "wait_seconds", 0.0)
+    retry_after = getattr(call_context, "retry_after", None)
+    call_context.statuses = None
+    return statuses, wait_seconds, retry_after
+
+
+# Adapt the rate to a response and track it in the current call (wait time is the time spent waiting for a token)
+def track_response(status_code, wait_seconds, retry_after=None):
+    if status_code == 429:
+        on_throttled()
+    else:
+        on_success()
+    statuses = getattr(call_context, "statuses", None)
+    if statuses is not None:
+        statuses.append(status_code)
+        call_context.wait_seconds += wait_seconds
+        if status_code == 429:
+            call_context.retry_after = retry_after
+
+
+# Rate limit all requests of a requests.Session and track their status codes
+def install(session):
+    if getattr(session, "is_rate_limited", False):
+        return
+    send_request = session.request
+
+    def request(method, url, *args, **kwargs):
+        wait_seconds = acquire()
+        response = send_request(method, url, *args, **kwargs)
+        track_response(response.status_code, wait_seconds, parse_retry_after(response) if response.status_code == 429 else None)
+        return response
+
+    session.request = request
+    session.is_rate_limited = True
@@ -0,0 +1,78 @@
+from . import indicator_state
+
+# Trigger state per symbol (symbol -> price of the last analysis, RSI band and VWAP side at the last check)
+trigger_states = {}
+
+
+# Get RSI band of a value (-1 - below the lower bound, 1 - above the upper bound, 0 - in between)
+def get_rsi_band(rsi, rsi_bands):
+    if rsi is None:
+        return None
+    if rsi <= rsi_bands[0]:
+        return -1
+    if rsi >= rsi_bands[1]:
+        return 1
+    return 0
+
+
+# Get side of a price relative to VWAP (-1 - below, 1 - above)
+def get_vwap_side(price, vwap):
+    if vwap is None or price == vwap:
+        return None
+    return 1 if price > vwap else -1
+
+
+# Set reference of an analyzed stock (triggers compare the latest prices with the price of the last analysis)
+def set_reference(symbol, price, rsi_bands):
+    live_indicators = indicator_state.get_live_indicators(symbol, price)
+    trigger_states[symbol] = {
+        "price": price,
+        "rsi_band": get_rsi_band(live_indicators.get("rsi"), rsi_bands),
+        "vwap_side": get_vwap_side(price, live_indicators.get("vwap")),
+    }
+
+
+# Get symbols with trigger references (stocks analyzed in earlier trading cycles)
+def get_symbols():
+    return list(trigger_states.keys())
+
+
+# Check latest prices against triggers (symbol -> reasons)
+# - Price move since the last analysis of at least price_change_percent
+# - RSI (with the latest price as the next close) entering the oversold or overbought band
+# - Price crossing VWAP
+def check_triggers(prices, price_change_percent, rsi_bands, vwap_cross):
+    triggered = {}
+    for symbol, price in prices.items():
+        trigger_state = trigger_states.get(symbol)
+        if trigger_state is None:
+            continue
+        reasons = []
+
+        if price_change_percent and trigger_state["price"] > 0:
+            change_percent = (price / trigger_state["price"] - 1) * 100
+            if abs(change_percent) >= price_change_percent:
+                reasons.append(f"price moved {change_percent:+.2f}% since the last analysis")
+
+        live_indicators = indicator_state.get_live_indicators(symbol, price)
+        if rsi_bands:
+            rsi_band = get_rsi_band(live_indicators.get("rsi"), rsi_bands)
+            if rsi_band and trigger_state["rsi_band"] is not None and rsi_band != trigger_state["rsi_band"]:
+                reasons.append(f"RSI {round(live_indicators['rsi'], 2)} entered the {'oversold' if rsi_band < 0 else 'overbought'} band")
+            trigger_state["rsi_band"] = rsi_band
+
+        if vwap_cross:
+            vwap_side = get_vwap_side(price, live_indicators.get("vwap"))
+            if vwap_side and trigger_state["vwap_side"] and vwap_side != trigger_state["vwap_side"]:
+                reasons.append(f"price crossed {'above' if vwap_side > 0 else 'below'} VWAP {round(live_indicators['vwap'], 2)}")
+            if vwap_side:
+                trigger_state["vwap_side"] = vwap_side
+
+        if len(reasons) > 0:
+            triggered[symbol] = reasons
+    return triggered
+
+
+# Clear trigger references (e.g. at the start of a session)
+def reset():
+    trigger_states.clear()
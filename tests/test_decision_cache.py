@@ -0,0 +1,31 @@
+from src.utils import decision_cache
+
+TOLERANCES = {"current_price": "0.5%", "buying_power": "1%"}
+ACCOUNT_INFO = {"buying_power": 100.0}
+STOCKS_OVERVIEW = {
+    "AAPL": {"current_price": 200.0, "my_quantity": 0},
+    "MSFT": {"current_price": 400.0, "my_quantity": 1},
+}
+
+
+# A buy that failed leaves the stock data unchanged, the next cycle must ask AI again instead of placing the cached buy
+def test_failed_buy_is_not_reused():
+    decision_cache.reset()
+    decisions = [{"symbol": "AAPL", "decision": "buy", "quantity": 0.1}, {"symbol": "MSFT", "decision": "hold", "quantity": 0}]
+    decision_cache.update(ACCOUNT_INFO, STOCKS_OVERVIEW, decisions, TOLERANCES, 0, True)
+
+    changed_symbols = decision_cache.get_changed_symbols(ACCOUNT_INFO, STOCKS_OVERVIEW, TOLERANCES, 3600, 60)
+    reused_symbols = [symbol for symbol in STOCKS_OVERVIEW if symbol not in changed_symbols]
+
+    assert changed_symbols == ["AAPL"]
+    assert decision_cache.get_cached_decisions(reused_symbols) == [{"symbol": "MSFT", "decision": "hold", "quantity": 0}]
+
+
+# Hold decisions of unchanged stocks are reused until they expire
+def test_hold_is_reused_until_max_age():
+    decision_cache.reset()
+    decision_cache.update(ACCOUNT_INFO, STOCKS_OVERVIEW, [], TOLERANCES, 0, True)
+    moved_overview = {**STOCKS_OVERVIEW, "AAPL": {"current_price": 200.5, "my_quantity": 0}}
+
+    assert decision_cache.get_changed_symbols(ACCOUNT_INFO, moved_overview, TOLERANCES, 3600, 60) == []
+    assert decision_cache.get_changed_symbols(ACCOUNT_INFO, moved_overview, TOLERANCES, 3600, 3601) == ["AAPL", "MSFT"]
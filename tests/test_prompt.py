@@ -0,0 +1,36 @@
+import pytest
+
+from src.utils import prompt
+
+STOCKS_DATA = {
+    f"S{index}": {
+        "current_price": 10.0 + index,
+        "my_quantity": 0,
+        "rsi": 50.0,
+        "vwap": 10.5,
+        "analyst_ratings": [{"published_at": "2024-11-01T00:00:00Z", "type": "buy", "text": "Strong balance sheet and growing cash flow. " * 5}],
+    }
+    for index in range(20)
+}
+
+
+# A budget below what trimming fields can reach drops the lowest-priority (last) stocks until the prompt fits
+@pytest.mark.parametrize("encoding", ["json", "compact", "table"])
+def test_budget_drops_lowest_priority_stocks(encoding):
+    dropped_symbols = []
+    fully_trimmed_tokens = prompt.estimate_tokens(prompt.ENCODERS[encoding](prompt.drop_fields(STOCKS_DATA, ["analyst_ratings", "vwap"])))
+    token_budget = fully_trimmed_tokens // 2
+
+    encoded, trim_steps = prompt.encode_stocks_data(STOCKS_DATA, encoding=encoding, token_budget=token_budget, reserved_tokens=10, dropped_symbols=dropped_symbols)
+
+    assert 10 + prompt.estimate_tokens(encoded) <= token_budget
+    assert 0 < len(dropped_symbols) < len(STOCKS_DATA)
+    assert dropped_symbols == list(STOCKS_DATA.keys())[-len(dropped_symbols):]
+    assert "S0" in encoded and dropped_symbols[0] not in encoded
+    assert trim_steps[-1].startswith(f"{len(dropped_symbols)} lowest-priority stock(s) removed")
+
+
+# A budget too small for the prompt without any stock data is an error
+def test_budget_below_reserved_tokens_raises():
+    with pytest.raises(Exception, match="does not fit token budget"):
+        prompt.encode_stocks_data(STOCKS_DATA, encoding="compact", token_budget=50, reserved_tokens=100)